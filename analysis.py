@@ -1,61 +1,561 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
+import os
+import time
+import pickle
+import hashlib
+import argparse
 import sqlite3
 from datetime import datetime
 import numpy as np
 
+import storage
+from rate import DEFAULT_THRESHOLDS
+from retention import archived_segments, read_archive
+
 # Set style
 plt.style.use('dark_background')
 sns.set_palette("husl")
 
 DB_FILE = "locshield.db"
+ARCHIVE_DIR = "archive"
+LOCAL_TZ = datetime.now().astimezone().tzinfo
+
+# Loader: baca per chunk, cache kolom di file .npz (key: max id DB + index archive)
+CACHE_DIR = ".locshield_cache"
+CHUNK_SIZE = 200000
+# Skema minimal yang dibaca analysis (events.ts + archive_segments). Migrasi tetap tugas engine
+MIN_SCHEMA_VERSION = 3
+
+# Kolom numerik yang di-cache, dtype sudah di-downcast. Risk dari bridge tidak dibatasi
+# 0-10, jadi int16 (bukan int8) seperti DREAD
+LOAD_COLUMNS = [("id", np.int64), ("session", np.int32), ("ts", np.int64), ("event_id", np.int32),
+                ("source_id", np.int32), ("risk", np.int16), ("dread_score", np.int16), ("count", np.int32)]
+LOAD_SQL = """
+    SELECT id, session, ts, event_id, source_id, COALESCE(risk, 0), COALESCE(dread_score, 0), COALESCE(count, 1)
+    FROM events
+"""
+
+# ==============================================================================
+# LOADER
+# ==============================================================================
+def _connect():
+    """
+    Koneksi read-only ke DB engine: analysis tidak pernah migrate atau set pragma
+    (auto_vacuum / WAL) di file milik engine. Skema terlalu lama / baru -> RuntimeError.
+    """
+    conn = storage.connect_readonly(DB_FILE)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if MIN_SCHEMA_VERSION <= version <= storage.SCHEMA_VERSION:
+        return conn
+    conn.close()
+    if version > storage.SCHEMA_VERSION:
+        raise RuntimeError(f"schema v{version} lebih baru dari analysis (v{storage.SCHEMA_VERSION})")
+    raise RuntimeError(f"schema v{version} terlalu lama (butuh v{MIN_SCHEMA_VERSION}+), "
+                       f"jalankan engine.py sekali untuk migrasi")
+
+
+def _to_ms(value):
+    """datetime / string / pd.Timestamp (jam lokal) atau epoch ms -> epoch ms."""
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize(LOCAL_TZ)
+    return int(ts.timestamp() * 1000)
+
+
+def _empty_columns():
+    return {name: np.empty(0, dtype=dtype) for name, dtype in LOAD_COLUMNS}
+
+
+def _concat_columns(parts):
+    if not parts:
+        return _empty_columns()
+    return {name: np.concatenate([part[name] for part in parts]) for name, _ in LOAD_COLUMNS}
+
+
+def _read_columns(conn, where="", params=(), chunksize=CHUNK_SIZE):
+    """SELECT events per chunk langsung ke array numpy ber-dtype kecil (tanpa DataFrame object)."""
+    cursor = conn.execute(LOAD_SQL + where + " ORDER BY id", params)
+    parts = []
+    while True:
+        rows = cursor.fetchmany(chunksize)
+        if not rows:
+            break
+        columns = list(zip(*rows))
+        parts.append({name: np.array(columns[i], dtype=dtype) for i, (name, dtype) in enumerate(LOAD_COLUMNS)})
+    return _concat_columns(parts)
+
+
+def _read_archive_columns(paths, event_ids, source_ids, start_ms=None, end_ms=None):
+    """Segment archive (nama event / source) -> kolom yang sama dengan _read_columns."""
+    parts, rows = [], []
+    for event in read_archive(paths, start_ms, end_ms):
+        rows.append((event["id"], event["session"], event["ts"], event_ids.get(event["event"], -1),
+                     source_ids.get(event["source"], -1), event["risk"] or 0, event["dread_score"] or 0,
+                     event["count"] or 1))
+        if len(rows) >= CHUNK_SIZE:
+            parts.append(rows)
+            rows = []
+    if rows:
+        parts.append(rows)
+    return _concat_columns([
+        {name: np.array(column, dtype=dtype) for (name, dtype), column in zip(LOAD_COLUMNS, zip(*part))}
+        for part in parts])
+
+
+def _merge(base, extra):
+    """Gabung dua set kolom, buang id dobel (archive vs hot), urut per id."""
+    if not len(extra["id"]):
+        return base
+    keep = ~np.isin(extra["id"], base["id"])
+    merged = {name: np.concatenate([base[name], extra[name][keep]]) for name, _ in LOAD_COLUMNS}
+    order = np.argsort(merged["id"], kind="stable")
+    return {name: column[order] for name, column in merged.items()}
+
+
+def _cache_path():
+    return os.path.join(CACHE_DIR, os.path.basename(os.path.abspath(DB_FILE)) + ".npz")
+
+
+def _db_identity(conn):
+    """Waktu mulai sesi pertama: beda berarti file DB sudah diganti, cache tidak berlaku."""
+    row = conn.execute("SELECT started_ms FROM sessions ORDER BY id LIMIT 1").fetchone()
+    return row[0] if row else 0
+
+
+def _cached_columns(conn, include_archive):
+    """
+    Kolom lengkap (tanpa filter) dari cache + baris baru sejak cache terakhir.
+    Yang dibaca ulang dari DB hanya id > max_id cache dan segment archive yang baru diindex.
+    """
+    identity = _db_identity(conn)
+    # sqlite_sequence, bukan MAX(id): tetap naik walau baris lama sudah dipindah ke archive
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'events'").fetchone()
+    max_id = row[0] if row else 0
+    segments = conn.execute("SELECT COALESCE(MAX(id), 0) FROM archive_segments").fetchone()[0] \
+        if include_archive else 0
+
+    columns, cached_max, cached_segments = None, 0, 0
+    path = _cache_path()
+    if os.path.exists(path):
+        try:
+            with np.load(path) as cache:
+                meta = cache["meta"]
+                if int(meta[0]) == identity and int(meta[1]) <= max_id and int(meta[2]) <= segments \
+                        and bool(meta[3]) == include_archive:
+                    columns = {name: cache[name].astype(dtype, copy=False) for name, dtype in LOAD_COLUMNS}
+                    cached_max, cached_segments = int(meta[1]), int(meta[2])
+        except Exception as e:
+            print(f"Cache ignored ({e})")
+    if columns is None:
+        columns = _empty_columns()
+
+    if cached_max == max_id and cached_segments == segments:
+        return columns
 
-def load_data():
-    """Load data from SQLite database"""
+    columns = _merge(columns, _read_columns(conn, " WHERE id > ?", (cached_max,)))
+    if segments > cached_segments:
+        paths = [os.path.join(ARCHIVE_DIR, p) for p, in conn.execute(
+            "SELECT DISTINCT path FROM archive_segments WHERE id > ? ORDER BY hour_ms", (cached_segments,))]
+        event_ids, source_ids = _dictionaries(conn, by_name=True)
+        columns = _merge(columns, _read_archive_columns(paths, event_ids, source_ids))
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    meta = np.array([identity, max_id, segments, int(include_archive)], dtype=np.int64)
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, meta=meta, **columns)
+    os.replace(tmp, path)
+    return columns
+
+
+def _dictionaries(conn, by_name=False):
+    events = dict(conn.execute("SELECT id, name FROM event_types"))
+    sources = dict(conn.execute("SELECT id, name FROM sources"))
+    if by_name:
+        return {v: k for k, v in events.items()}, {v: k for k, v in sources.items()}
+    return events, sources
+
+
+def _categorical(codes, names):
+    """id kamus -> pandas Categorical (kategori = semua nama di kamus)."""
+    ids = np.array(sorted(names), dtype=np.int32)
+    categories = [names[i] for i in ids]
+    positions = np.searchsorted(ids, codes)
+    positions[(positions >= len(ids)) | (ids[np.minimum(positions, len(ids) - 1)] != codes)] = -1
+    return pd.Categorical.from_codes(positions, categories=categories)
+
+
+def load_data(start=None, end=None, min_risk=None, include_archive=True, use_cache=True):
+    """
+    Load events (hot DB + archive retention.py) sebagai DataFrame kecil:
+    risk / dread_score int16, event / source categorical, datetime dari ts.
+
+    start / end (jam lokal atau epoch ms) dan min_risk difilter di SQL kalau tanpa cache.
+    Dengan cache, kolom lengkap disimpan di CACHE_DIR (.npz) dan hanya baris baru
+    yang dibaca dari DB; filter lalu dijalankan vektor di numpy.
+    Kolom msg tidak dibaca (string, paling boros memori dan tidak dipakai chart).
+    DB dibuka read-only; skema yang tidak cocok -> RuntimeError (lihat _connect).
+    """
+    start_ms, end_ms = _to_ms(start), _to_ms(end)
+    conn = _connect()
     try:
-        conn = sqlite3.connect(DB_FILE)
-        df = pd.read_sql_query("""
-            SELECT id, timestamp, event, source, risk, msg, dread_score 
-            FROM logs 
-            ORDER BY id ASC
-        """, conn)
-        conn.close()
+        if use_cache:
+            columns = _cached_columns(conn, include_archive)
+            mask = np.ones(len(columns["id"]), dtype=bool)
+            if start_ms is not None:
+                mask &= columns["ts"] >= start_ms
+            if end_ms is not None:
+                mask &= columns["ts"] < end_ms
+            if min_risk is not None:
+                mask &= columns["risk"] >= min_risk
+            if not mask.all():
+                columns = {name: column[mask] for name, column in columns.items()}
+        else:
+            where, params = [], []
+            if start_ms is not None:
+                where.append("ts >= ?")
+                params.append(start_ms)
+            if end_ms is not None:
+                where.append("ts < ?")
+                params.append(end_ms)
+            if min_risk is not None:
+                where.append("risk >= ?")
+                params.append(min_risk)
+            columns = _read_columns(conn, (" WHERE " + " AND ".join(where)) if where else "", params)
+            if include_archive:
+                paths = archived_segments(conn, ARCHIVE_DIR, start_ms, end_ms)
+                if paths:
+                    event_ids, source_ids = _dictionaries(conn, by_name=True)
+                    archived = _read_archive_columns(paths, event_ids, source_ids, start_ms,
+                                                     end_ms - 1 if end_ms is not None else None)
+                    if min_risk is not None:
+                        archived = {name: c[archived["risk"] >= min_risk] for name, c in archived.items()}
+                    columns = _merge(columns, archived)
+
+        events, sources = _dictionaries(conn)
+        df = pd.DataFrame({
+            "id": columns["id"],
+            "session": columns["session"],
+            "ts": columns["ts"],
+            "event": _categorical(columns["event_id"], events),
+            "source": _categorical(columns["source_id"], sources),
+            "risk": columns["risk"],
+            "dread_score": columns["dread_score"],
+            "count": columns["count"],
+        })
         
-        # Convert timestamp to datetime
-        df['datetime'] = pd.to_datetime(df['timestamp'], format='%H:%M:%S', errors='coerce')
+        # ts = epoch ms (lengkap dengan tanggal), tampilkan di jam lokal
+        df['datetime'] = pd.to_datetime(df['ts'], unit='ms', utc=True).dt.tz_convert(LOCAL_TZ).dt.tz_localize(None)
         return df
     except Exception as e:
         print(f"Error loading data: {e}")
         return pd.DataFrame()
+    finally:
+        conn.close()
+
+# ==============================================================================
+# METRICS ENGINE (SATU PASS, MERGEABLE)
+# ==============================================================================
+MAX_RISK = 10
+
+
+class MetricState:
+    """
+    Agregat satu grup baris: histogram risk (baris dan berbobot count), jumlah DREAD
+    berbobot, dan jumlah per kode event. Semua metric (total, band, avg, max, FAKE /
+    ATTACK / AMAN) diturunkan dari sini, dan dua state bisa di-merge (jumlah array),
+    jadi before / during / after / per sesi cukup dari satu scan.
+
+    Histogram risk di-clip ke 0..MAX_RISK (hanya untuk band); avg / max risk pakai
+    risk_sum (berbobot count) dan risk_max yang tidak di-clip, karena risk bridge
+    tidak dibatasi.
+    """
+
+    __slots__ = ("rows", "risk_rows", "risk_weighted", "dread_sum", "event_rows", "event_weighted",
+                 "risk_sum", "risk_max")
+
+    def __init__(self, n_events, rows=0, risk_rows=None, risk_weighted=None, dread_sum=0,
+                 event_rows=None, event_weighted=None, risk_sum=0, risk_max=None):
+        self.rows = rows
+        self.risk_sum = risk_sum
+        self.risk_max = risk_max    # None = belum ada baris
+        self.risk_rows = risk_rows if risk_rows is not None else np.zeros(MAX_RISK + 1, dtype=np.int64)
+        self.risk_weighted = risk_weighted if risk_weighted is not None else np.zeros(MAX_RISK + 1, dtype=np.int64)
+        self.dread_sum = dread_sum
+        # Slot terakhir = event di luar kamus (kode categorical -1)
+        self.event_rows = event_rows if event_rows is not None else np.zeros(n_events + 1, dtype=np.int64)
+        self.event_weighted = event_weighted if event_weighted is not None else np.zeros(n_events + 1, dtype=np.int64)
+
+    def merge(self, other):
+        if self.risk_max is None or other.risk_max is None:
+            risk_max = other.risk_max if self.risk_max is None else self.risk_max
+        else:
+            risk_max = max(self.risk_max, other.risk_max)
+        return MetricState(len(self.event_rows) - 1, self.rows + other.rows, self.risk_rows + other.risk_rows,
+                           self.risk_weighted + other.risk_weighted, self.dread_sum + other.dread_sum,
+                           self.event_rows + other.event_rows, self.event_weighted + other.event_weighted,
+                           self.risk_sum + other.risk_sum, risk_max)
+
+    @staticmethod
+    def merge_all(states, n_events):
+        merged = MetricState(n_events)
+        for state in states:
+            merged = merged.merge(state)
+        return merged
+
+    def to_metrics(self, event_names, label="Overall"):
+        """Dict metric yang sama dengan calculate_metrics (berbobot `count`)."""
+        total = int(self.risk_weighted.sum())
+        names = pd.Index(event_names)
+        per_event = self.event_weighted[:len(names)]
+        return {
+            'label': label,
+            'total_events': total,
+            'critical_threats': int(self.risk_weighted[8:].sum()),
+            'medium_threats': int(self.risk_weighted[5:8].sum()),
+            'low_threats': int(self.risk_weighted[:5].sum()),
+            'avg_risk': self.risk_sum / total if total > 0 else 0,
+            'max_risk': int(self.risk_max) if self.risk_max is not None else 0,
+            'avg_dread': self.dread_sum / total if total > 0 else 0,
+            # str.contains di kategori (beberapa nama), bukan di 10M baris
+            'fake_gps_count': int(per_event[np.asarray(names.str.contains('FAKE', na=False), dtype=bool)].sum()),
+            'attack_count': int(per_event[np.asarray(names.str.contains('ATTACK', na=False), dtype=bool)].sum()),
+            'safe_events': int(per_event[np.asarray(names == 'AMAN', dtype=bool)].sum()),
+        }
+
+    def resize(self, n_events):
+        """Tambah slot untuk event type baru (kategori baru selalu di belakang, slot tak dikenal tetap terakhir)."""
+        extra = n_events + 1 - len(self.event_rows)
+        if extra > 0:
+            pad = np.zeros(extra, dtype=np.int64)
+            self.event_rows = np.concatenate([self.event_rows[:-1], pad, self.event_rows[-1:]])
+            self.event_weighted = np.concatenate([self.event_weighted[:-1], pad, self.event_weighted[-1:]])
+        return self
+
+    def risk_bands(self):
+        """Jumlah baris per band chart (0-3], (3-5], (5-8], (8-10] seperti pd.cut lama."""
+        r = self.risk_rows
+        return np.array([r[1:4].sum(), r[4:6].sum(), r[6:9].sum(), r[9:].sum()])
+
+
+def _event_categorical(df):
+    """Kolom event sebagai categorical (load_data sudah categorical; frame lain dikonversi)."""
+    event = df['event']
+    return event if isinstance(event.dtype, pd.CategoricalDtype) else event.astype('category')
+
+
+def metric_states(df, keys=None, n_groups=1):
+    """
+    Satu pass grouped di kolom numpy df -> list MetricState per grup.
+    keys: array int posisi grup per baris (None = satu grup).
+
+    Tiap baris dipetakan ke satu sel (grup, risk, kode event) lalu dua np.bincount
+    (jumlah baris dan jumlah `count`) mengisi histogram 3D kecil; histogram risk dan
+    event per grup adalah marginal dari histogram itu. Tanpa mask / copy frame.
+    Risk di luar 0..MAX_RISK (jarang) di-clip untuk histogram; risk_sum / risk_max
+    dikoreksi dari subset baris itu saja.
+    """
+    event = _event_categorical(df)
+    codes = event.cat.codes.to_numpy()
+    n_events = len(event.cat.categories)
+    risk = df['risk'].to_numpy()
+    count = df['count'].to_numpy() if 'count' in df else np.ones(len(df), dtype=np.int32)
+    dread = df['dread_score'].to_numpy()
+    outside = None
+    if len(risk) and (risk.min() < 0 or risk.max() > MAX_RISK):
+        outside = np.flatnonzero((risk < 0) | (risk > MAX_RISK))
+        raw = risk[outside].astype(np.int64)
+        risk = np.clip(risk, 0, MAX_RISK)
+
+    # sel = (grup * 11 + risk) * (n_events + 1) + kode; kode -1 (tak dikenal) -> slot n_events
+    cell = np.zeros(len(df), dtype=np.intp) if keys is None else keys.astype(np.intp, copy=True)
+    cell *= MAX_RISK + 1
+    cell += risk
+    cell *= n_events + 1
+    cell += codes
+    if len(codes) and codes.min() < 0:
+        cell[codes < 0] += n_events + 1
+    shape = (n_groups, MAX_RISK + 1, n_events + 1)
+    size = n_groups * (MAX_RISK + 1) * (n_events + 1)
+
+    rows = np.bincount(cell, minlength=size).reshape(shape)
+    weighted = np.rint(np.bincount(cell, weights=count, minlength=size)).astype(np.int64).reshape(shape)
+    dread_weighted = dread * count.astype(np.float64)
+    if keys is None:
+        dread_sum = np.array([dread_weighted.sum()])
+    else:
+        dread_sum = np.bincount(keys, weights=dread_weighted, minlength=n_groups)
+
+    # risk_sum / risk_max dari histogram (baris dalam rentang), lalu koreksi baris di luar rentang
+    risk_weighted = weighted.sum(axis=2)
+    risk_sum = (risk_weighted * np.arange(MAX_RISK + 1)).sum(axis=1).astype(np.float64)
+    in_range = rows.sum(axis=2)
+    risk_max = np.full(n_groups, np.iinfo(np.int64).min, dtype=np.int64)
+    if outside is not None:
+        group = np.zeros(len(outside), dtype=np.intp) if keys is None else keys[outside]
+        clipped = risk[outside].astype(np.int64)
+        risk_sum += np.bincount(group, weights=(raw - clipped) * count[outside].astype(np.float64),
+                                minlength=n_groups)
+        in_range = in_range.copy()
+        np.subtract.at(in_range, (group, clipped), 1)
+        np.maximum.at(risk_max, group, raw)
+    has_rows = in_range > 0
+    hist_max = np.where(has_rows.any(axis=1), MAX_RISK - np.argmax(has_rows[:, ::-1], axis=1), risk_max)
+    risk_max = np.maximum(risk_max, hist_max)
+    return [MetricState(n_events, int(rows[g].sum()), rows[g].sum(axis=1), weighted[g].sum(axis=1),
+                        float(dread_sum[g]), rows[g].sum(axis=0), weighted[g].sum(axis=0),
+                        int(round(risk_sum[g])), int(risk_max[g]) if rows[g].any() else None)
+            for g in range(n_groups)]
+
 
 def calculate_metrics(df, label="Overall"):
-    """Calculate key metrics for comparison"""
-    metrics = {
-        'label': label,
-        'total_events': len(df),
-        'critical_threats': len(df[df['risk'] >= 8]),
-        'medium_threats': len(df[(df['risk'] >= 5) & (df['risk'] < 8)]),
-        'low_threats': len(df[df['risk'] < 5]),
-        'avg_risk': df['risk'].mean() if len(df) > 0 else 0,
-        'max_risk': df['risk'].max() if len(df) > 0 else 0,
-        'avg_dread': df['dread_score'].mean() if len(df) > 0 else 0,
-        'fake_gps_count': len(df[df['event'].str.contains('FAKE', na=False)]),
-        'attack_count': len(df[df['event'].str.contains('ATTACK', na=False)]),
-        'safe_events': len(df[df['event'] == 'AMAN']),
+    """Calculate key metrics for comparison (rows weighted by coalesced `count`)"""
+    if len(df) == 0:
+        return MetricState(0).to_metrics([], label)
+    return metric_states(df)[0].to_metrics(_event_categorical(df).cat.categories, label)
+
+
+def _dense_codes(values):
+    """np.unique(..., return_inverse=True) tanpa sort untuk id integer yang rapat (session)."""
+    if len(values) == 0:
+        return values, np.zeros(0, dtype=np.intp)
+    low = int(values.min())
+    span = int(values.max()) - low + 1
+    if span > 1 << 20:
+        return np.unique(values, return_inverse=True)
+    offset = values - low
+    present = np.flatnonzero(np.bincount(offset, minlength=span))
+    lookup = np.zeros(span, dtype=np.intp)
+    lookup[present] = np.arange(len(present))
+    return present + low, lookup[offset]
+
+
+def segment_states(df, ranges):
+    """
+    State untuk beberapa rentang posisi (boleh overlap) + per sesi, dari satu scan:
+    baris dibagi ke segmen antar batas rentang x sesi, lalu segmen di-merge per rentang.
+    Return (list state per rentang, {session: state}).
+    """
+    n = len(df)
+    n_events = len(_event_categorical(df).cat.categories)
+    points = sorted({0, n} | {p for r in ranges for p in r})
+    sessions, keys = _dense_codes(df['session'].to_numpy())
+    n_sessions = max(len(sessions), 1)
+    for i in range(1, len(points) - 1):
+        keys[points[i]:points[i + 1]] += i * n_sessions  # key = segmen * n_sessions + sesi
+    states = metric_states(df, keys, (len(points) - 1) * n_sessions)
+
+    per_range = []
+    for start, end in ranges:
+        inside = [i for i in range(len(points) - 1) if points[i] >= start and points[i + 1] <= end]
+        per_range.append(MetricState.merge_all((states[i * n_sessions + j] for i in inside
+                                                for j in range(n_sessions)), n_events))
+    per_session = {int(session): MetricState.merge_all((states[i * n_sessions + j]
+                                                        for i in range(len(points) - 1)), n_events)
+                   for j, session in enumerate(sessions)}
+    return per_range, per_session
+
+# ==============================================================================
+# CHARTS (AGREGASI -> RENDER DI PROCESS POOL)
+# ==============================================================================
+# Data chart diagregasi dulu di proses utama (histogram, grid risk x DREAD,
+# timeline min/max per bin) jadi payload kecil yang di-pickle ke worker; worker
+# hanya menggambar. Preview = dpi rendah untuk cek cepat, publication = 300 dpi.
+PREVIEW_DPI = 80
+PUBLICATION_DPI = 300
+TIMELINE_BINS = 2000   # >= lebar axes dalam pixel di 300 dpi, decimation tidak terlihat
+RENDER_WORKERS = 3
+RATE_THRESHOLD_PER_MIN = 50  # sama dengan engine.RATE_THRESHOLD (event HIGH_FREQ)
+
+
+def decimate_minmax(x, y, bins=TIMELINE_BINS):
+    """
+    Timeline min/max: (x, low, high) per bin. Garis zig-zag low -> high per bin
+    menghasilkan pixel yang sama dengan menggambar semua titik.
+    """
+    y = np.asarray(y)
+    x = np.asarray(x)
+    if len(y) <= bins:
+        return x, y, y
+    starts = np.linspace(0, len(y), bins, endpoint=False).astype(np.int64)
+    return x[starts], np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts)
+
+
+def _timeline(df):
+    if len(df) == 0:
+        return None
+    return decimate_minmax(df.index.to_numpy(), df['risk'].to_numpy())
+
+
+def _draw_timeline(ax, timeline, color, label=None):
+    x, low, high = timeline
+    if low is high:
+        ax.plot(x, high, color=color, linewidth=2, alpha=0.7, label=label)
+    else:
+        ax.plot(np.repeat(x, 2), np.column_stack([low, high]).ravel(), color=color, linewidth=2, alpha=0.7,
+                label=label)
+    ax.fill_between(x, high, alpha=0.3, color=color)
+
+
+def print_summary(before_metrics, after_metrics):
+    print("\n" + "="*70)
+    print("METRICS SUMMARY")
+    print("="*70)
+    print(f"\n{'Metric':<30} {'Before':>15} {'After':>15} {'Change':>15}")
+    print("-"*70)
+    
+    for key in ['total_events', 'critical_threats', 'medium_threats', 'avg_risk', 'avg_dread']:
+        before_val = before_metrics[key]
+        after_val = after_metrics[key]
+        change = after_val - before_val
+        change_pct = (change / before_val * 100) if before_val != 0 else 0
+        
+        if 'avg' in key:
+            print(f"{key:<30} {before_val:>15.2f} {after_val:>15.2f} {change:>+10.2f} ({change_pct:+.1f}%)")
+        else:
+            print(f"{key:<30} {before_val:>15.0f} {after_val:>15.0f} {change:>+10.0f} ({change_pct:+.1f}%)")
+    
+    print("="*70 + "\n")
+
+
+def comparison_data(before_df, after_df, before_state=None, after_state=None, event_names=None):
+    """
+    Payload chart before vs after.
+    before_state / after_state: MetricState dari segment_states (kalau None dihitung dari frame).
+    """
+    if before_state is None or after_state is None:
+        event_names = _event_categorical(before_df).cat.categories.union(_event_categorical(after_df).cat.categories)
+        before_state, after_state = (MetricState(len(event_names)) if len(frame) == 0 else
+                                     metric_states(frame.assign(event=pd.Categorical(frame['event'], event_names)))[0]
+                                     for frame in (before_df, after_df))
+    # value_counts() dari histogram state (slot event tak dikenal dibuang seperti NaN)
+    before_events = pd.Series(before_state.event_rows[:-1], index=event_names).sort_values(ascending=False, kind='stable').head(5)
+    after_events = pd.Series(after_state.event_rows[:-1], index=event_names).sort_values(ascending=False, kind='stable').head(5)
+    return {
+        'before_metrics': before_state.to_metrics(event_names, "Before Mitigation"),
+        'after_metrics': after_state.to_metrics(event_names, "After Mitigation"),
+        # Sama dengan pd.cut(risk, [0, 3, 5, 8, 10]) -> value_counts, dari histogram state
+        'before_risk': before_state.risk_bands(),
+        'after_risk': after_state.risk_bands(),
+        'before_events': before_events.to_dict(),
+        'after_events': after_events.to_dict(),
+        'before_timeline': _timeline(before_df),
+        'after_timeline': _timeline(after_df),
     }
-    return metrics
 
-def plot_comparison(before_df, after_df, output_file='comparison_before_after.png'):
+
+def render_comparison(data, output_file, dpi=PUBLICATION_DPI):
     """Create before vs after comparison charts"""
     
     fig, axes = plt.subplots(2, 3, figsize=(18, 12))
     fig.suptitle('LocShield Turbo - Before vs After Mitigation Analysis', 
                  fontsize=20, fontweight='bold', color='#00FF00')
     
-    # Calculate metrics
-    before_metrics = calculate_metrics(before_df, "Before Mitigation")
-    after_metrics = calculate_metrics(after_df, "After Mitigation")
+    before_metrics = data['before_metrics']
+    after_metrics = data['after_metrics']
     
     # 1. Total Events Comparison
     ax1 = axes[0, 0]
@@ -79,11 +579,10 @@ def plot_comparison(before_df, after_df, output_file='comparison_before_after.pn
     
     # 2. Risk Score Distribution
     ax2 = axes[0, 1]
-    risk_bins = [0, 3, 5, 8, 10]
     risk_labels = ['Low (0-3)', 'Medium (3-5)', 'High (5-8)', 'Critical (8-10)']
     
-    before_risk_dist = pd.cut(before_df['risk'], bins=risk_bins, labels=risk_labels).value_counts()
-    after_risk_dist = pd.cut(after_df['risk'], bins=risk_bins, labels=risk_labels).value_counts()
+    before_risk_dist = pd.Series(data['before_risk'], index=risk_labels)
+    after_risk_dist = pd.Series(data['after_risk'], index=risk_labels)
     
     before_risk_dist.plot(kind='bar', ax=ax2, alpha=0.7, color='#FF4444', width=0.4, position=0, label='Before')
     after_risk_dist.plot(kind='bar', ax=ax2, alpha=0.7, color='#44FF44', width=0.4, position=1, label='After')
@@ -113,9 +612,8 @@ def plot_comparison(before_df, after_df, output_file='comparison_before_after.pn
     
     # 4. Threat Timeline - Before
     ax4 = axes[1, 0]
-    if len(before_df) > 0:
-        ax4.plot(before_df.index, before_df['risk'], color='#FF4444', linewidth=2, alpha=0.7)
-        ax4.fill_between(before_df.index, before_df['risk'], alpha=0.3, color='#FF4444')
+    if data['before_timeline'] is not None:
+        _draw_timeline(ax4, data['before_timeline'], '#FF4444')
         ax4.axhline(y=8, color='red', linestyle='--', alpha=0.5, label='Critical')
         ax4.axhline(y=5, color='yellow', linestyle='--', alpha=0.5, label='Medium')
     ax4.set_xlabel('Event Sequence', fontsize=12)
@@ -126,9 +624,8 @@ def plot_comparison(before_df, after_df, output_file='comparison_before_after.pn
     
     # 5. Threat Timeline - After
     ax5 = axes[1, 1]
-    if len(after_df) > 0:
-        ax5.plot(after_df.index, after_df['risk'], color='#44FF44', linewidth=2, alpha=0.7)
-        ax5.fill_between(after_df.index, after_df['risk'], alpha=0.3, color='#44FF44')
+    if data['after_timeline'] is not None:
+        _draw_timeline(ax5, data['after_timeline'], '#44FF44')
         ax5.axhline(y=8, color='red', linestyle='--', alpha=0.5, label='Critical')
         ax5.axhline(y=5, color='yellow', linestyle='--', alpha=0.5, label='Medium')
     ax5.set_xlabel('Event Sequence', fontsize=12)
@@ -141,11 +638,11 @@ def plot_comparison(before_df, after_df, output_file='comparison_before_after.pn
     ax6 = axes[1, 2]
     
     # Get top 5 event types for each
-    before_events = before_df['event'].value_counts().head(5)
-    after_events = after_df['event'].value_counts().head(5)
+    before_events = data['before_events']
+    after_events = data['after_events']
     
     # Combine for comparison
-    all_events = set(before_events.index) | set(after_events.index)
+    all_events = set(before_events) | set(after_events)
     event_comparison = pd.DataFrame({
         'Before': [before_events.get(e, 0) for e in all_events],
         'After': [after_events.get(e, 0) for e in all_events]
@@ -159,41 +656,60 @@ def plot_comparison(before_df, after_df, output_file='comparison_before_after.pn
     ax6.grid(True, alpha=0.3)
     
     plt.tight_layout()
-    plt.savefig(output_file, dpi=300, bbox_inches='tight', facecolor='#0a0a0a')
+    plt.savefig(output_file, dpi=dpi, bbox_inches='tight', facecolor='#0a0a0a')
+    return fig
+
+
+def plot_comparison(before_df, after_df, output_file='comparison_before_after.png', before_state=None,
+                    after_state=None, event_names=None, dpi=PUBLICATION_DPI):
+    """Create before vs after comparison charts"""
+    data = comparison_data(before_df, after_df, before_state, after_state, event_names)
+    fig = render_comparison(data, output_file, dpi)
     print(f"✓ Chart saved to: {output_file}")
-    
-    # Print summary
-    print("\n" + "="*70)
-    print("METRICS SUMMARY")
-    print("="*70)
-    print(f"\n{'Metric':<30} {'Before':>15} {'After':>15} {'Change':>15}")
-    print("-"*70)
-    
-    for key in ['total_events', 'critical_threats', 'medium_threats', 'avg_risk', 'avg_dread']:
-        before_val = before_metrics[key]
-        after_val = after_metrics[key]
-        change = after_val - before_val
-        change_pct = (change / before_val * 100) if before_val != 0 else 0
-        
-        if 'avg' in key:
-            print(f"{key:<30} {before_val:>15.2f} {after_val:>15.2f} {change:>+10.2f} ({change_pct:+.1f}%)")
-        else:
-            print(f"{key:<30} {before_val:>15.0f} {after_val:>15.0f} {change:>+10.0f} ({change_pct:+.1f}%)")
-    
-    print("="*70 + "\n")
-    
+    print_summary(data['before_metrics'], data['after_metrics'])
     return fig
 
-def plot_dread_analysis(df, output_file='dread_analysis.png'):
+
+def dread_grid(df):
+    """Jumlah baris per sel risk (0-10) x DREAD (0-50); mergeable (jumlah array)."""
+    risk = np.clip(df['risk'].to_numpy(), 0, MAX_RISK).astype(np.intp)
+    dread = np.clip(df['dread_score'].to_numpy(), 0, 50).astype(np.intp)
+    return np.bincount(risk * 51 + dread, minlength=(MAX_RISK + 1) * 51).reshape(MAX_RISK + 1, 51)
+
+
+def dread_data(df, grid=None):
+    """
+    Payload chart DREAD: histogram 0-50 dan grid jumlah baris risk x DREAD
+    (grid dari cache analysis kalau ada). Trendline = least squares berbobot
+    jumlah per sel (sama dengan polyfit semua baris).
+    """
+    if grid is None:
+        grid = dread_grid(df)
+    cell_risk, cell_dread = np.nonzero(grid)
+    cell_count = grid[cell_risk, cell_dread]
+
+    trend = None
+    if len(np.unique(cell_risk)) > 1:
+        trend = np.polyfit(cell_risk, cell_dread, 1, w=np.sqrt(cell_count))
+    histogram = grid.sum(axis=0)
+    return {
+        # pd.cut(dread, [0, 10, 20, 30, 40, 50]): (0-10], (10-20], ... (nilai 0 tidak masuk)
+        'dread_bands': np.array([histogram[lo + 1:lo + 11].sum() for lo in range(0, 50, 10)]),
+        'cells': (cell_risk, cell_dread, cell_count),
+        'trend': trend,
+        'risk_range': (int(cell_risk.min()), int(cell_risk.max())) if len(cell_risk) else (0, 0),
+    }
+
+
+def render_dread_analysis(data, output_file, dpi=PUBLICATION_DPI):
     """Analyze DREAD scores"""
     fig, axes = plt.subplots(1, 2, figsize=(14, 6))
     fig.suptitle('DREAD Score Analysis', fontsize=18, fontweight='bold', color='#00FF00')
     
     # 1. DREAD Score Distribution
     ax1 = axes[0]
-    dread_bins = [0, 10, 20, 30, 40, 50]
     dread_labels = ['Low (0-10)', 'Medium (10-20)', 'High (20-30)', 'Very High (30-40)', 'Critical (40-50)']
-    dread_dist = pd.cut(df['dread_score'], bins=dread_bins, labels=dread_labels).value_counts()
+    dread_dist = pd.Series(data['dread_bands'], index=dread_labels)
     
     colors = ['#44FF44', '#FFFF44', '#FF8844', '#FF4444', '#AA0000']
     dread_dist.plot(kind='bar', ax=ax1, color=colors, alpha=0.8)
@@ -203,70 +719,349 @@ def plot_dread_analysis(df, output_file='dread_analysis.png'):
     ax1.grid(True, alpha=0.3)
     ax1.tick_params(axis='x', rotation=45)
     
-    # 2. Risk vs DREAD Correlation
+    # 2. Risk vs DREAD Correlation (satu marker per sel risk x DREAD, ukuran ~ log jumlah)
     ax2 = axes[1]
-    scatter = ax2.scatter(df['risk'], df['dread_score'], 
-                         c=df['dread_score'], cmap='RdYlGn_r', 
-                         s=100, alpha=0.6, edgecolors='white', linewidth=0.5)
+    cell_risk, cell_dread, cell_count = data['cells']
+    sizes = 60 + 40 * np.log10(np.maximum(cell_count, 1))
+    scatter = ax2.scatter(cell_risk, cell_dread, 
+                         c=cell_dread, cmap='RdYlGn_r', vmin=0, vmax=50,
+                         s=sizes, alpha=0.6, edgecolors='white', linewidth=0.5)
     ax2.set_xlabel('Risk Score (0-10)', fontsize=12)
     ax2.set_ylabel('DREAD Score (0-50)', fontsize=12)
-    ax2.set_title('Risk vs DREAD Correlation', fontsize=14, fontweight='bold')
+    ax2.set_title('Risk vs DREAD Correlation (marker size = log count)', fontsize=14, fontweight='bold')
     ax2.grid(True, alpha=0.3)
     
     # Add trendline
-    if len(df) > 1:
-        z = np.polyfit(df['risk'], df['dread_score'], 1)
-        p = np.poly1d(z)
-        ax2.plot(df['risk'], p(df['risk']), "r--", alpha=0.8, linewidth=2, label='Trend')
+    if data['trend'] is not None:
+        p = np.poly1d(data['trend'])
+        x = np.array(data['risk_range'])
+        ax2.plot(x, p(x), "r--", alpha=0.8, linewidth=2, label='Trend')
         ax2.legend()
     
     plt.colorbar(scatter, ax=ax2, label='DREAD Score')
     
     plt.tight_layout()
-    plt.savefig(output_file, dpi=300, bbox_inches='tight', facecolor='#0a0a0a')
+    plt.savefig(output_file, dpi=dpi, bbox_inches='tight', facecolor='#0a0a0a')
+    return fig
+
+
+def plot_dread_analysis(df, output_file='dread_analysis.png', dpi=PUBLICATION_DPI):
+    """Analyze DREAD scores"""
+    fig = render_dread_analysis(dread_data(df), output_file, dpi)
     print(f"✓ DREAD analysis saved to: {output_file}")
-    
     return fig
 
-def plot_access_rate(df, output_file='access_rate.png'):
+
+def access_rate_data(df):
+    """
+    Payload chart access rate: event per menit (berbobot `count`) dari timestamp ts,
+    satu bucket per menit kalender termasuk menit kosong; timeline min/max.
+    Per (source, event) juga, karena threshold engine (RateDetector) berlaku per key;
+    event yang tidak dicek engine (rate.DEFAULT_THRESHOLDS, mis. AMAN) tidak ikut.
+    """
+    if len(df) == 0:
+        return {'timeline': None}
+    minute = df['ts'].to_numpy() // 60000
+    first = int(minute.min())
+    offset = minute - first
+    n_minutes = int(offset.max()) + 1
+    count = df['count'].to_numpy() if 'count' in df else np.ones(len(df))
+    per_minute = np.bincount(offset, weights=count, minlength=n_minutes)
+
+    # Rate key terpadat per menit: (menit x source x event) sebagai satu bincount
+    event = _event_categorical(df)
+    event_codes = event.cat.codes.to_numpy().astype(np.int64) + 1
+    unwatched = [name for name, limit in DEFAULT_THRESHOLDS.items() if not limit]
+    watched_count = np.where(event.isin(unwatched).to_numpy(), 0, count)
+    source = df['source'] if isinstance(df['source'].dtype, pd.CategoricalDtype) else df['source'].astype('category')
+    source_codes = source.cat.codes.to_numpy().astype(np.int64) + 1
+    n_events = int(event_codes.max()) + 1
+    keys = source_codes * n_events + event_codes
+    _, key_idx = _dense_codes(keys)
+    n_keys = int(key_idx.max()) + 1
+    if n_minutes * n_keys <= 1 << 22:  # matrix float64 paling besar 32 MB
+        per_key = np.bincount(offset * n_keys + key_idx, weights=watched_count, minlength=n_minutes * n_keys)
+        busiest = per_key.reshape(n_minutes, n_keys).max(axis=1)
+    else:
+        busiest = None
+
+    x = (np.arange(n_minutes, dtype=np.int64) + first) * 60000
+    x = pd.to_datetime(x, unit='ms', utc=True).tz_convert(LOCAL_TZ).tz_localize(None).to_numpy()
+    return {
+        'timeline': decimate_minmax(x, per_minute),
+        'busiest': decimate_minmax(x, busiest) if busiest is not None else None,
+        'threshold': RATE_THRESHOLD_PER_MIN,
+    }
+
+
+def render_access_rate(data, output_file, dpi=PUBLICATION_DPI):
     """Plot GPS access rate over time"""
     fig, ax = plt.subplots(figsize=(14, 6))
     fig.suptitle('GPS Access Rate Analysis', fontsize=18, fontweight='bold', color='#00FF00')
     
-    # Calculate rolling access rate (events per minute)
-    window_size = 60  # 60 events window
-    if len(df) > window_size:
-        df['rolling_rate'] = df['id'].rolling(window=window_size).count()
+    # Access rate (events per minute, waktu nyata dari ts)
+    if data['timeline'] is not None:
+        _draw_timeline(ax, data['timeline'], '#00FFFF', 'All events')
+        if data['busiest'] is not None:
+            x, _, high = data['busiest']
+            ax.plot(x, high, color='#FF8844', linewidth=1.5, alpha=0.9, label='Busiest source/event')
         
-        ax.plot(df.index, df['rolling_rate'], color='#00FFFF', linewidth=2, alpha=0.8)
-        ax.fill_between(df.index, df['rolling_rate'], alpha=0.3, color='#00FFFF')
+        # Add threshold line (per key, sama dengan engine.RATE_THRESHOLD)
+        ax.axhline(y=data['threshold'], color='red', linestyle='--', linewidth=2, alpha=0.7,
+                   label=f"DoS Threshold ({data['threshold']}/min)")
         
-        # Add threshold line
-        ax.axhline(y=50, color='red', linestyle='--', linewidth=2, alpha=0.7, label='DoS Threshold (50/min)')
-        
-        ax.set_xlabel('Event Sequence', fontsize=12)
-        ax.set_ylabel('Access Rate (events per window)', fontsize=12)
+        ax.set_xlabel('Time', fontsize=12)
+        ax.set_ylabel('Access Rate (events per minute)', fontsize=12)
         ax.set_title('GPS Access Frequency Over Time', fontsize=14, fontweight='bold')
         ax.legend()
         ax.grid(True, alpha=0.3)
+        fig.autofmt_xdate()
     else:
         ax.text(0.5, 0.5, 'Insufficient data for rate analysis', 
                ha='center', va='center', fontsize=16, color='#888888')
     
     plt.tight_layout()
-    plt.savefig(output_file, dpi=300, bbox_inches='tight', facecolor='#0a0a0a')
+    plt.savefig(output_file, dpi=dpi, bbox_inches='tight', facecolor='#0a0a0a')
+    return fig
+
+
+def plot_access_rate(df, output_file='access_rate.png', dpi=PUBLICATION_DPI):
+    """Plot GPS access rate over time"""
+    fig = render_access_rate(access_rate_data(df), output_file, dpi)
     print(f"✓ Access rate chart saved to: {output_file}")
-    
     return fig
 
-def main():
+
+RENDERERS = {
+    'comparison': render_comparison,
+    'dread': render_dread_analysis,
+    'access_rate': render_access_rate,
+}
+
+
+def _render_job(kind, data, output_file, dpi):
+    """Dijalankan di worker: gambar, simpan, tutup figure (memori worker tidak menumpuk)."""
+    plt.switch_backend('Agg')
+    t0 = time.perf_counter()
+    fig = RENDERERS[kind](data, output_file, dpi)
+    plt.close(fig)
+    return output_file, time.perf_counter() - t0
+
+
+def render_charts(jobs, dpi=PUBLICATION_DPI, workers=RENDER_WORKERS):
+    """
+    jobs: [(kind, data, output_file), ...] -> render paralel di process pool
+    (satu figure per proses). workers <= 1 = render berurutan di proses ini.
+    """
+    if workers <= 1 or len(jobs) <= 1:
+        results = [_render_job(kind, data, output_file, dpi) for kind, data, output_file in jobs]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futures = [pool.submit(_render_job, kind, data, output_file, dpi) for kind, data, output_file in jobs]
+            results = [future.result() for future in futures]
+    for output_file, seconds in results:
+        print(f"✓ Chart saved to: {output_file} ({seconds:.1f}s, {dpi} dpi)")
+    return [output_file for output_file, _ in results]
+
+# ==============================================================================
+# INCREMENTAL ANALYSIS (CACHE AGREGAT + WATERMARK PER SESI)
+# ==============================================================================
+# CACHE_DIR/<db>.analysis.pkl menyimpan agregat parsial: MetricState per blok
+# BLOCK_ROWS baris (posisi urut id), MetricState per sesi, grid risk x DREAD,
+# id terakhir yang sudah diproses per sesi, dan digest input tiap chart.
+# Run berikutnya hanya melipat baris dengan id > watermark sesinya; rentang
+# before / during / after = merge blok penuh + scan baris di tepi rentang.
+# Chart di-render ulang hanya kalau digest inputnya berubah (atau --force).
+# Yang inkremental hanya agregat metric dan grid DREAD: timeline access rate dan
+# timeline before / after masih dihitung dari df penuh tiap run (vektor, O(n)).
+BLOCK_ROWS = 1 << 16
+ANALYSIS_CACHE_VERSION = 2
+
+
+def _analysis_cache_path():
+    return os.path.join(CACHE_DIR, os.path.basename(os.path.abspath(DB_FILE)) + ".analysis.pkl")
+
+
+def db_identity():
+    conn = _connect()
+    try:
+        return _db_identity(conn)
+    finally:
+        conn.close()
+
+
+def new_analysis_state(identity, names):
+    return {
+        'version': ANALYSIS_CACHE_VERSION,
+        'identity': identity,
+        'names': list(names),
+        'rows': 0,            # baris (posisi 0..rows-1) yang sudah dilipat
+        'last_id': None,      # id baris ke rows-1 (cek cache masih cocok dengan data)
+        'watermarks': {},     # session -> id terakhir yang sudah diproses
+        'blocks': [],         # MetricState per BLOCK_ROWS baris (blok terakhir boleh parsial)
+        'sessions': {},       # session -> MetricState
+        'dread_grid': np.zeros((MAX_RISK + 1, 51), dtype=np.int64),
+        'figures': {},        # output_file -> digest (kind, payload, dpi)
+    }
+
+
+def load_analysis_state(identity, names, df):
+    """State cache kalau masih berlaku untuk DB / kamus event / baris df ini, selain itu None."""
+    path = _analysis_cache_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+    except Exception as e:
+        print(f"Analysis cache ignored ({e})")
+        return None
+    rows = state.get('rows', 0)
+    if (state.get('version') != ANALYSIS_CACHE_VERSION or state['identity'] != identity
+            or list(names[:len(state['names'])]) != state['names'] or rows > len(df)
+            or (rows and int(df['id'].iat[rows - 1]) != state['last_id'])):
+        return None
+    state['names'] = list(names)
+    state['blocks'] = [_unpack_metric(fields).resize(len(names)) for fields in state['blocks']]
+    state['sessions'] = {session: _unpack_metric(fields).resize(len(names))
+                         for session, fields in state['sessions'].items()}
+    return state
+
+
+# MetricState disimpan sebagai tuple array biasa: pickle class dari `python analysis.py`
+# (modul __main__) tidak bisa dibaca lagi kalau analysis di-import (bench, notebook)
+def _pack_metric(metric):
+    return (metric.rows, metric.risk_rows, metric.risk_weighted, metric.dread_sum, metric.event_rows,
+            metric.event_weighted, metric.risk_sum, metric.risk_max)
+
+
+def _unpack_metric(fields):
+    return MetricState(len(fields[4]) - 1, *fields)
+
+
+def save_analysis_state(state):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _analysis_cache_path()
+    packed = dict(state, blocks=[_pack_metric(metric) for metric in state['blocks']],
+                  sessions={session: _pack_metric(metric) for session, metric in state['sessions'].items()})
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        pickle.dump(packed, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def fold_new_rows(state, df):
+    """
+    Lipat baris dengan id > watermark sesinya ke agregat state. Return jumlah baris
+    baru, atau None kalau baris baru bukan ekor df (mis. archive lama ditambahkan):
+    posisi blok tidak berlaku lagi dan state harus dibangun ulang.
+    """
+    sessions, session_idx = _dense_codes(df['session'].to_numpy())
+    limits = np.array([state['watermarks'].get(int(session), 0) for session in sessions], dtype=np.int64)
+    start = state['rows']
+    new = np.flatnonzero(df['id'].to_numpy() > limits[session_idx]) if len(df) else np.zeros(0, dtype=np.intp)
+    if len(new) != len(df) - start or (len(new) and new[0] != start):
+        return None
+    if not len(new):
+        return 0
+    tail = df.iloc[start:]
+    tail_sessions = session_idx[start:]
+
+    # Blok: posisi // BLOCK_ROWS, blok parsial terakhir dari run sebelumnya di-merge
+    first_block = start // BLOCK_ROWS
+    block_keys = np.arange(start, len(df)) // BLOCK_ROWS - first_block
+    for i, metric in enumerate(metric_states(tail, block_keys, int(block_keys[-1]) + 1)):
+        block = first_block + i
+        if block < len(state['blocks']):
+            state['blocks'][block] = state['blocks'][block].merge(metric)
+        else:
+            state['blocks'].append(metric)
+
+    # Sesi + watermark (id urut naik: id terakhir per sesi = max)
+    present = np.flatnonzero(np.bincount(tail_sessions, minlength=len(sessions)))
+    remap = np.zeros(len(sessions), dtype=np.intp)
+    remap[present] = np.arange(len(present))
+    last_ids = np.zeros(len(present), dtype=np.int64)
+    last_ids[remap[tail_sessions]] = tail['id'].to_numpy()
+    for j, metric in zip(present, metric_states(tail, remap[tail_sessions], len(present))):
+        session = int(sessions[j])
+        previous = state['sessions'].get(session)
+        state['sessions'][session] = metric if previous is None else previous.merge(metric)
+        state['watermarks'][session] = int(last_ids[remap[j]])
+
+    state['dread_grid'] = state['dread_grid'] + dread_grid(tail)
+    state['rows'] = len(df)
+    state['last_id'] = int(df['id'].iat[-1])
+    return len(new)
+
+
+def range_state(state, df, start, end):
+    """MetricState posisi [start, end): blok penuh dari cache + scan baris di tepi rentang."""
+    n_events = len(state['names'])
+    merged = MetricState(n_events)
+    if end <= start:
+        return merged
+    first = -(-start // BLOCK_ROWS)  # blok pertama yang mulai di dalam rentang
+    # Sesudah blok terakhir yang selesai di dalam rentang (blok parsial ikut kalau rentang sampai akhir)
+    last = len(state['blocks']) if end >= state['rows'] else end // BLOCK_ROWS
+    if first >= last:
+        return metric_states(df.iloc[start:end])[0].resize(n_events)
+    for block in state['blocks'][first:last]:
+        merged = merged.merge(block)
+    edges = [(start, first * BLOCK_ROWS), (min(last * BLOCK_ROWS, end), end)]
+    for a, b in edges:
+        if b > a:
+            merged = merged.merge(metric_states(df.iloc[a:b])[0].resize(n_events))
+    return merged
+
+
+def _digest_update(h, value):
+    # Isi, bukan layout: array view / non-contiguous dengan isi sama -> digest sama
+    if isinstance(value, dict):
+        for key in sorted(value, key=str):
+            h.update(repr(key).encode())
+            _digest_update(h, value[key])
+    elif isinstance(value, (list, tuple)):
+        h.update(b"[%d" % len(value))
+        for item in value:
+            _digest_update(h, item)
+    elif isinstance(value, np.ndarray):
+        h.update(f"{value.dtype}{value.shape}".encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    else:
+        h.update(repr(value).encode())
+
+
+def figure_digest(kind, data, dpi):
+    """Digest input chart (payload + dpi): sama -> PNG lama masih berlaku."""
+    h = hashlib.blake2b(digest_size=16)
+    _digest_update(h, (kind, data, dpi))
+    return h.hexdigest()
+
+def main(argv=None):
     """Main analysis function"""
+    parser = argparse.ArgumentParser(description="LocShield Turbo metrics analysis")
+    parser.add_argument("--preview", action="store_true",
+                        help=f"render cepat {PREVIEW_DPI} dpi (default: publication {PUBLICATION_DPI} dpi)")
+    parser.add_argument("--dpi", type=int, default=None, help="override dpi chart")
+    parser.add_argument("--workers", type=int, default=RENDER_WORKERS,
+                        help=f"process render paralel (default: {RENDER_WORKERS}, 1 = berurutan)")
+    parser.add_argument("--force", action="store_true",
+                        help="abaikan cache analysis: hitung ulang semua agregat dan render semua chart")
+    args = parser.parse_args(argv)
+    dpi = args.dpi or (PREVIEW_DPI if args.preview else PUBLICATION_DPI)
+
     print("\n" + "="*70)
     print("🔍 LOCSHIELD TURBO - METRICS ANALYSIS")
     print("="*70 + "\n")
     
     # Load all data
-    df = load_data()
+    try:
+        df = load_data()
+    except (RuntimeError, sqlite3.Error) as e:
+        print(f"❌ Cannot open database {DB_FILE}: {e}")
+        return
     
     if df.empty:
         print("❌ No data found in database!")
@@ -274,27 +1069,65 @@ def main():
     
     print(f"✓ Loaded {len(df)} events from database")
     
-    # Split into before/after based on attack events
-    attack_start = df[df['event'].str.contains('ATTACK', na=False)].index.min() if len(df[df['event'].str.contains('ATTACK', na=False)]) > 0 else len(df)
-    attack_end = df[df['event'].str.contains('ATTACK', na=False)].index.max() if len(df[df['event'].str.contains('ATTACK', na=False)]) > 0 else len(df)
+    # Agregat dari cache analysis: hanya baris sesudah watermark per sesi yang dilipat
+    event = _event_categorical(df)
+    names = event.cat.categories
+    identity = db_identity()
+    state = None if args.force else load_analysis_state(identity, names, df)
+    folded = fold_new_rows(state, df) if state is not None else None
+    if folded is None:
+        state = new_analysis_state(identity, names)
+        folded = fold_new_rows(state, df)
+        print(f"✓ Analysis cache rebuilt ({folded} events)")
+    else:
+        print(f"✓ Analysis cache: {folded} new events folded in")
+    
+    # Split into before/after based on attack events (isin di kode categorical, satu scan)
+    n = len(df)
+    attack_codes = np.flatnonzero(np.asarray(names.str.contains('ATTACK', na=False), dtype=bool))
+    attack_rows = np.flatnonzero(np.isin(event.cat.codes.to_numpy(), attack_codes))
+    attack_start = int(attack_rows[0]) if len(attack_rows) else n
+    attack_end = int(attack_rows[-1]) if len(attack_rows) else n
+    
+    before = (0, attack_start) if attack_start > 0 else (0, n // 2)
+    during = (attack_start, attack_end + 1) if attack_start < n else (0, 0)
+    after = (attack_end + 1, n) if attack_end < n - 1 else (n // 2, n)
+    
+    before_state, during_state, after_state = (range_state(state, df, *r) for r in (before, during, after))
     
-    before_df = df[:attack_start] if attack_start > 0 else df[:len(df)//2]
-    during_df = df[attack_start:attack_end+1] if attack_start < len(df) else pd.DataFrame()
-    after_df = df[attack_end+1:] if attack_end < len(df)-1 else df[len(df)//2:]
+    print(f"✓ Before attack: {before_state.rows} events")
+    print(f"✓ During attack: {during_state.rows} events")
+    print(f"✓ After mitigation: {after_state.rows} events\n")
     
-    print(f"✓ Before attack: {len(before_df)} events")
-    print(f"✓ During attack: {len(during_df)} events")
-    print(f"✓ After mitigation: {len(after_df)} events\n")
+    print("Per session:")
+    for session, metric in sorted(state['sessions'].items()):
+        metrics = metric.to_metrics(names, f"Session {session}")
+        print(f"  • {metrics['label']}: {metrics['total_events']} events, {metrics['critical_threats']} critical, "
+              f"avg risk {metrics['avg_risk']:.2f}, max {metrics['max_risk']}")
     
-    # Generate charts
-    print("Generating comparison charts...")
-    plot_comparison(before_df, after_df)
+    # Aggregate (proses ini), lalu render paralel hanya chart yang inputnya berubah
+    comparison = comparison_data(df.iloc[before[0]:before[1]], df.iloc[after[0]:after[1]], before_state,
+                                 after_state, names)
+    print_summary(comparison['before_metrics'], comparison['after_metrics'])
     
-    print("Generating DREAD analysis...")
-    plot_dread_analysis(df)
+    jobs, skipped = [], []
+    for kind, data, output_file in [
+        ('comparison', comparison, 'comparison_before_after.png'),
+        ('dread', dread_data(df, state['dread_grid']), 'dread_analysis.png'),
+        ('access_rate', access_rate_data(df), 'access_rate.png'),
+    ]:
+        digest = figure_digest(kind, data, dpi)
+        if not args.force and state['figures'].get(output_file) == digest and os.path.exists(output_file):
+            skipped.append(output_file)
+            continue
+        jobs.append((kind, data, output_file))
+        state['figures'][output_file] = digest
     
-    print("Generating access rate analysis...")
-    plot_access_rate(df)
+    print(f"Generating charts ({'preview' if args.preview else 'publication'}, {dpi} dpi)...")
+    for output_file in skipped:
+        print(f"✓ Unchanged, skipped: {output_file}")
+    render_charts(jobs, dpi, args.workers)
+    save_analysis_state(state)
     
     print("\n" + "="*70)
     print("✅ ANALYSIS COMPLETE")
@@ -0,0 +1,462 @@
+"""
+Microbenchmark LocShield Turbo: engine, storage, UDP dan analysis hot path.
+
+Pakai:
+    python bench.py                    # jalankan semua, bandingkan dengan bench_baseline.json
+    python bench.py --only classify    # hanya benchmark yang namanya mengandung "classify"
+    python bench.py --full             # tambah dataset analysis 10M baris (lama)
+    python bench.py --save-baseline    # simpan hasil sekarang sebagai baseline baru
+
+Exit code 1 kalau ada benchmark yang lebih lambat dari baseline melebihi --threshold,
+atau unit-nya beda dengan baseline (benchmark berubah arti: simpan baseline baru).
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+BASELINE_FILE = os.path.join(HERE, "bench_baseline.json")
+DEFAULT_THRESHOLD = 0.20
+
+BENCHMARKS = []
+
+
+def bench(name, unit, higher_is_better=True, full_only=False):
+    """Daftarkan fungsi benchmark. Fungsi menerima tmpdir dan return satu angka."""
+    def wrap(fn):
+        BENCHMARKS.append({"name": name, "unit": unit, "higher_is_better": higher_is_better,
+                           "full_only": full_only, "fn": fn})
+        return fn
+    return wrap
+
+
+def best_of(fn, repeat=3):
+    return min(fn() for _ in range(repeat))
+
+
+def import_engine(tmpdir):
+    """Import engine.py dengan DB dan port UDP yang diarahkan ke tmpdir / port bebas."""
+    import engine
+    engine.QUIET = True
+    engine.DB_FILE = os.path.join(tmpdir, "engine.db")
+    return engine
+
+
+# ==============================================================================
+# DATA SINTETIS
+# ==============================================================================
+EVENTS = [("AMAN", "Google Maps", 1, "Real GPS Access Verified (System Clean)"),
+          ("USER USED FAKE GPS TO MAPS", "Google Maps", 10,
+           "SPOOFING ATTACK! Accessing Maps while FakeGPS Process is RUNNING"),
+          ("ATTACKED", "com.locshield.turbo", 10, "HIGH_FREQ_ACCESS | DoS Attack Simulation"),
+          ("FAKE GPS DETECTED", "System Monitor", 9, "Mock Location ACTIVATED"),
+          ("INFO", "System Monitor", 1, "Fake GPS Process Disappeared (Normalized)"),
+          ("AUDIT", "com.locshield.turbo", 5, "Apps with GPS: [com.lexa.fakegps]")]
+
+
+def synthetic_lines(n, seed=1):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(n):
+        ts = f"10-18 12:{(i // 60000) % 60:02d}:{(i // 1000) % 60:02d}.{i % 1000:03d}"
+        r = rng.random()
+        if r < 0.02:
+            lines.append(f"{ts}  1000  1007 D LocationManagerService: location request from "
+                         f"com.google.android.apps.maps provider=gps\n")
+        elif r < 0.021:
+            lines.append(f'{ts}  3000  3007 E LOCSHIELD_BRIDGE: {{"event":"THREAT_EVENT",'
+                         f'"source":"com.locshield.turbo","msg":"HIGH_FREQ_ACCESS","risk":10}}\n')
+        else:
+            lines.append(f"{ts}  {rng.randint(100, 9999):>5}  5678 D chatty  : routine status update seq={i}\n")
+    return lines
+
+
+def make_logs_db(path, rows, seed=1):
+    """Isi tabel events dengan `rows` event sintetis (skema + sesi dari engine.init_db)."""
+    import engine
+    import storage
+    old = engine.DB_FILE
+    engine.DB_FILE = path
+    try:
+        session = engine.init_db("bench")
+    finally:
+        engine.DB_FILE = old
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+
+    ids = storage.DictionaryCache(conn)
+    base_ms = 1792310400000  # 2026-10-18 00:00 UTC, satu event per detik
+
+    def gen():
+        for i in range(rows):
+            status, source, risk, msg = EVENTS[0] if rng.random() < 0.6 else rng.choice(EVENTS)
+            ts = base_ms + i * 1000
+            yield (session, ts, ids.event(status), ids.source(source), risk, msg,
+                   engine.calculate_dread(status)[0], "bench-%d" % (i % 4), 1, ts, ts)
+
+    conn.executemany(storage.INSERT_SQL, gen())
+    storage.rebuild_rollups(conn)
+    conn.commit()
+    conn.close()
+
+
+# ==============================================================================
+# ENGINE
+# ==============================================================================
+@bench("classify_lines_per_sec", "lines/s")
+def bench_classify(tmpdir):
+    engine = import_engine(tmpdir)
+    from logcat import parse_threadtime
+    classifier = engine.build_classifier()
+    lines = synthetic_lines(200000)
+
+    def run():
+        t0 = time.perf_counter()
+        for record in parse_threadtime(lines):
+            classifier.classify_record(record)
+        return time.perf_counter() - t0
+    return len(lines) / best_of(run)
+
+
+@bench("calculate_dread_per_sec", "calls/s")
+def bench_dread(tmpdir):
+    engine = import_engine(tmpdir)
+    statuses = [e[0] for e in EVENTS] * 20000
+
+    def run():
+        t0 = time.perf_counter()
+        for status in statuses:
+            engine.calculate_dread(status)
+        return time.perf_counter() - t0
+    return len(statuses) / best_of(run)
+
+
+@bench("log_event_enqueue_latency_us", "us", higher_is_better=False)
+def bench_log_event(tmpdir):
+    """Latency log_event di thread pemanggil: DREAD + antre ke EventWriter / TelemetryEmitter (tanpa commit)."""
+    engine = import_engine(tmpdir)
+    from telemetry import TelemetryEmitter
+    session = engine.init_db("bench")
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    writer = engine.EventWriter(engine.DB_FILE, session=session)
+    telemetry = TelemetryEmitter(receiver.getsockname(), quiet=True)
+    engine.writer, old_writer = writer, engine.writer
+    engine.telemetry, old_telemetry = telemetry, engine.telemetry
+    writer.start()
+    telemetry.start()
+    try:
+        n = 20000
+
+        def run():
+            t0 = time.perf_counter()
+            for i in range(n):
+                status, source, risk, msg = EVENTS[i % len(EVENTS)]
+                engine.log_event(status, source, risk, msg)
+            return time.perf_counter() - t0
+        return best_of(run) / n * 1e6
+    finally:
+        writer.close()
+        telemetry.close()
+        engine.writer = old_writer
+        engine.telemetry = old_telemetry
+        receiver.close()
+
+
+# ==============================================================================
+# STORAGE
+# ==============================================================================
+# Biaya yang disengaja (baseline sudah disimpan ulang, ~60k rows/s): 4 index di events
+# (ts, risk+ts, session+id, event_id+ts untuk filter history) ~-35% dibanding tanpa index,
+# upsert rollup di transaksi yang sama ~-5%. Masih jauh di atas rate event setelah coalescing.
+@bench("sqlite_insert_rows_per_sec", "rows/s")
+def bench_sqlite_insert(tmpdir):
+    engine = import_engine(tmpdir)
+    session = engine.init_db("bench")
+    from storage import EventWriter
+    n = 100000
+    ts = 1792324800000
+    rows = [(ts + i, status, source, risk, msg, 30, "bench", 1, ts + i, ts + i)
+            for i, (status, source, risk, msg) in enumerate(EVENTS[i % len(EVENTS)] for i in range(n))]
+    writer = EventWriter(engine.DB_FILE, session=session)
+    writer.start()
+    t0 = time.perf_counter()
+    for row in rows:
+        writer.submit(row)
+    writer.close(timeout=120)
+    elapsed = time.perf_counter() - t0
+    return writer.rows_written / elapsed
+
+
+# ==============================================================================
+# UDP
+# ==============================================================================
+@bench("send_to_wireshark_drained_per_sec", "events/s")
+def bench_udp_send(tmpdir):
+    """Event per detik sampai benar-benar keluar dari socket (termasuk drain queue emitter)."""
+    engine = import_engine(tmpdir)
+    from telemetry import TelemetryEmitter
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    old_telemetry = engine.telemetry
+    try:
+        n = 20000
+
+        def run():
+            engine.telemetry = TelemetryEmitter(receiver.getsockname(), quiet=True, max_queue=n + 1)
+            engine.telemetry.start()
+            t0 = time.perf_counter()
+            for i in range(n):
+                engine.send_to_wireshark("AMAN", "Google Maps", "Real GPS Access Verified | DREAD:5", 1, 5)
+            engine.telemetry.close(timeout=30)
+            return time.perf_counter() - t0
+        return n / best_of(run)
+    finally:
+        engine.telemetry = old_telemetry
+        receiver.close()
+
+
+@bench("listener_recv_per_sec", "datagrams/s")
+def bench_listener(tmpdir):
+    """Jalankan listener.py sebagai subprocess, kirim burst, hitung paket yang diproses."""
+    proc = subprocess.Popen([sys.executable, "-u", os.path.join(HERE, "listener.py"), "--udp", "--interval", "0.02"],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                            encoding="utf-8", errors="ignore")
+    received = [0]
+    last = [0.0]
+    ready = threading.Event()
+
+    def reader():
+        for line in proc.stdout:
+            if "Waiting for packets" in line:
+                ready.set()
+            else:
+                # Ringkasan listener: "... | total N packets, ..."
+                match = re.search(r"total (\d+) packets", line)
+                if match:
+                    received[0] = int(match.group(1))
+                    last[0] = time.perf_counter()
+
+    t = threading.Thread(target=reader, daemon=True)
+    t.start()
+    ready.wait(5)
+    time.sleep(0.2)
+
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    event = {"timestamp": "2026-10-18 12:00:00.000", "status": "AMAN", "app": "Google Maps",
+             "risk": 1, "details": "Real GPS Access Verified | DREAD:5", "dread": 5, "device": None, "count": 1}
+    # Satu event per datagram, format batch JSON dari telemetry.py
+    payloads = [json.dumps({"v": 1, "seq": i + 1, "count": 1, "events": [event]}).encode() for i in range(20000)]
+    n = len(payloads)
+    t0 = time.perf_counter()
+    for payload in payloads:
+        sender.sendto(payload, ("127.0.0.1", 9999))
+    # Tunggu sampai listener diam
+    idle_since = time.perf_counter()
+    seen = -1
+    while time.perf_counter() - idle_since < 0.5:
+        if received[0] != seen:
+            seen, idle_since = received[0], time.perf_counter()
+        time.sleep(0.05)
+    proc.terminate()
+    proc.wait(5)
+    sender.close()
+    if not received[0]:
+        return 0.0
+    return received[0] / (last[0] - t0)
+
+
+# ==============================================================================
+# ANALYSIS
+# ==============================================================================
+def analysis_db(tmpdir, rows):
+    path = os.path.join(tmpdir, f"analysis_{rows}.db")
+    if not os.path.exists(path):
+        make_logs_db(path, rows)
+    return path
+
+
+def import_analysis(tmpdir, rows, fresh_cache=True):
+    import analysis
+    analysis.DB_FILE = analysis_db(tmpdir, rows)
+    analysis.CACHE_DIR = os.path.join(tmpdir, "cache")
+    if fresh_cache:
+        shutil.rmtree(analysis.CACHE_DIR, ignore_errors=True)
+    return analysis
+
+
+def bench_load_data(tmpdir, rows):
+    """Load dingin: DB penuh dibaca per chunk dan cache .npz ditulis."""
+    analysis = import_analysis(tmpdir, rows)
+    t0 = time.perf_counter()
+    df = analysis.load_data()
+    elapsed = time.perf_counter() - t0
+    assert len(df) == rows, f"load_data returned {len(df)} rows"
+    return elapsed
+
+
+def bench_load_data_cached(tmpdir, rows):
+    """Load ulang dengan cache (tidak ada baris baru): hanya baca .npz."""
+    analysis = import_analysis(tmpdir, rows)
+    analysis.load_data()
+
+    def run():
+        t0 = time.perf_counter()
+        df = analysis.load_data()
+        elapsed = time.perf_counter() - t0
+        assert len(df) == rows, f"load_data returned {len(df)} rows"
+        return elapsed
+    # ~0.1 s: jitter relatif besar, ambil yang terbaik dari 7
+    return best_of(run, repeat=7)
+
+
+def check_risk_metrics(analysis, df):
+    """avg / max risk tidak boleh ikut clip histogram: bandingkan dengan pandas di frame ber-risk > 10."""
+    frame = df.iloc[:100000].copy()
+    frame.loc[frame.index[::1000], 'risk'] = 200
+    frame.loc[frame.index[500::1000], 'risk'] = -3
+    weights = frame['count']
+    expected_avg = (frame['risk'] * weights).sum() / weights.sum()
+    got = analysis.calculate_metrics(frame)
+    assert got['max_risk'] == frame['risk'].max(), f"max_risk {got['max_risk']} != {frame['risk'].max()}"
+    assert abs(got['avg_risk'] - expected_avg) < 1e-9, f"avg_risk {got['avg_risk']} != {expected_avg}"
+    if (weights == 1).all():
+        assert abs(got['avg_risk'] - frame['risk'].mean()) < 1e-9
+    _, per_session = analysis.segment_states(frame, [])
+    for session, group in frame.groupby('session'):
+        metrics = per_session[int(session)].to_metrics(analysis._event_categorical(frame).cat.categories)
+        assert metrics['max_risk'] == group['risk'].max(), f"session {session} max_risk {metrics['max_risk']}"
+
+
+def bench_metrics(tmpdir, rows):
+    analysis = import_analysis(tmpdir, rows, fresh_cache=False)
+    df = analysis.load_data()
+    check_risk_metrics(analysis, df)
+
+    def run():
+        t0 = time.perf_counter()
+        analysis.calculate_metrics(df)
+        return time.perf_counter() - t0
+    return best_of(run)
+
+
+def bench_report(tmpdir, rows):
+    """Agregasi + render tiga chart report (300 dpi, process pool) dari DataFrame yang sudah di-load."""
+    analysis = import_analysis(tmpdir, rows, fresh_cache=False)
+    df = analysis.load_data()
+    half = len(df) // 2
+
+    def run():
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            analysis.render_charts([
+                ("comparison", analysis.comparison_data(df.iloc[:half], df.iloc[half:]),
+                 os.path.join(tmpdir, "comparison.png")),
+                ("dread", analysis.dread_data(df), os.path.join(tmpdir, "dread.png")),
+                ("access_rate", analysis.access_rate_data(df), os.path.join(tmpdir, "access_rate.png")),
+            ])
+        return time.perf_counter() - t0
+    # Render 300 dpi cukup bising (start process pool, I/O PNG): ambil yang terbaik dari 2
+    return best_of(run, repeat=2)
+
+
+bench("analysis_load_data_1m_sec", "s", higher_is_better=False)(lambda d: bench_load_data(d, 1000000))
+bench("analysis_load_data_cached_1m_sec", "s", higher_is_better=False)(lambda d: bench_load_data_cached(d, 1000000))
+bench("analysis_calculate_metrics_1m_sec", "s", higher_is_better=False)(lambda d: bench_metrics(d, 1000000))
+bench("analysis_report_1m_sec", "s", higher_is_better=False)(lambda d: bench_report(d, 1000000))
+bench("analysis_load_data_10m_sec", "s", higher_is_better=False,
+      full_only=True)(lambda d: bench_load_data(d, 10000000))
+bench("analysis_calculate_metrics_10m_sec", "s", higher_is_better=False,
+      full_only=True)(lambda d: bench_metrics(d, 10000000))
+
+
+# ==============================================================================
+# MAIN
+# ==============================================================================
+def load_baseline():
+    try:
+        with open(BASELINE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LocShield Turbo microbenchmarks")
+    parser.add_argument("--only", help="jalankan benchmark yang namanya mengandung teks ini")
+    parser.add_argument("--full", action="store_true", help="ikutkan dataset analysis 10M baris")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="batas regresi relatif (default 0.20 = 20%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="tulis hasil ke bench_baseline.json")
+    args = parser.parse_args()
+
+    baseline = load_baseline()
+    results = {}
+    regressions = []
+    tmpdir = tempfile.mkdtemp(prefix="locshield-bench-")
+
+    print(f"{'Benchmark':<38} {'Result':>14} {'Baseline':>14} {'Change':>9}")
+    print("-" * 78)
+    try:
+        for b in BENCHMARKS:
+            if args.only and args.only not in b["name"]:
+                continue
+            if b["full_only"] and not args.full:
+                continue
+            try:
+                value = b["fn"](tmpdir)
+            except ImportError as e:
+                print(f"{b['name']:<38} {'SKIP':>14}  ({e})")
+                continue
+
+            results[b["name"]] = {"value": value, "unit": b["unit"], "higher_is_better": b["higher_is_better"]}
+            base = baseline.get(b["name"])
+            if base and base.get("unit") != b["unit"]:
+                # Benchmark berubah arti (unit lain): angka tidak bisa dibandingkan, simpan baseline baru
+                regressions.append(b["name"])
+                print(f"{b['name']:<38} {value:>14,.2f} {base['value']:>14,.2f} {'':>9}  "
+                      f"UNIT MISMATCH ({b['unit']} vs baseline {base.get('unit')})")
+            elif base:
+                change = (value - base["value"]) / base["value"] if base["value"] else 0.0
+                slower = -change if b["higher_is_better"] else change
+                flag = "  REGRESSION" if slower > args.threshold else ""
+                if flag:
+                    regressions.append(b["name"])
+                print(f"{b['name']:<38} {value:>14,.2f} {base['value']:>14,.2f} {change:>+8.1%}{flag}")
+            else:
+                print(f"{b['name']:<38} {value:>14,.2f} {'-':>14} {'':>9}")
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {BASELINE_FILE}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%} or unit mismatch: "
+              f"{', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,351 @@
+import json
+import socket
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime
+
+# ==============================================================================
+# PROTOKOL
+# ==============================================================================
+# TCP localhost, satu JSON per baris (newline-delimited).
+# Client -> server (baris pertama, opsional):  {"resume_from": ID}
+#     ID = id event terakhir yang sudah dilihat; server kirim semua event sesudahnya
+#     (dari memori, atau dari SQLite kalau sudah lewat history). Tanpa hello /
+#     resume_from null = hanya event live.
+# Server -> client:
+#     {"type": "hello", "last_id": N}
+#     {"type": "event", "id", "session", "ts", "timestamp", "device", "event", "source",
+#      "risk", "msg", "dread_score", "count", "first_ts", "last_ts"}   (kolom view `logs`)
+#     {"type": "gap", "dropped": K}   subscriber lambat, K event dibuang (policy drop_oldest)
+EVENT_FIELDS = ("id", "session", "ts", "timestamp", "device", "event", "source", "risk", "msg",
+                "dread_score", "count", "first_ts", "last_ts")
+POLICIES = ("drop_oldest", "disconnect")
+
+BACKLOG_SQL = f"""
+    SELECT {", ".join(EVENT_FIELDS)} FROM logs
+    WHERE id > ? AND id < ? ORDER BY id LIMIT ?
+"""
+
+
+def event_line(event_id, session, row):
+    """Satu row EventWriter -> baris JSON bus (bytes)."""
+    ts, status, source, risk, msg, dread, device, count, first, last = row
+    return (json.dumps({
+        "type": "event", "id": event_id, "session": session, "ts": ts,
+        "timestamp": datetime.fromtimestamp(ts / 1000).strftime("%H:%M:%S"),
+        "device": device, "event": status, "source": source, "risk": risk, "msg": msg,
+        "dread_score": dread, "count": count, "first_ts": first, "last_ts": last,
+    }, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _control(payload):
+    return (json.dumps(payload, separators=(",", ":")) + "\n").encode("utf-8")
+
+# ==============================================================================
+# SERVER (SISI ENGINE)
+# ==============================================================================
+class _Subscriber:
+    """Buffer terbatas + thread pengirim untuk satu client."""
+
+    def __init__(self, bus, sock, addr):
+        self.bus = bus
+        self.sock = sock
+        self.addr = addr
+        self.buffer = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+        self.sent = 0
+
+    def offer(self, line):
+        with self.cond:
+            if self.closed:
+                return
+            if len(self.buffer) >= self.bus.buffer_size:
+                if self.bus.policy == "disconnect":
+                    self.closed = True
+                    self.cond.notify()
+                    return
+                self.buffer.popleft()
+                self.dropped += 1
+            self.buffer.append(line)
+            self.cond.notify()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+
+    def drain(self):
+        while True:
+            with self.cond:
+                while not self.buffer and not self.closed:
+                    self.cond.wait()
+                if self.closed:
+                    return
+                lines = list(self.buffer)
+                self.buffer.clear()
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                self.bus.events_dropped += dropped
+                lines.insert(0, _control({"type": "gap", "dropped": dropped}))
+            self.sock.sendall(b"".join(lines))
+            self.sent += len(lines)
+
+
+class EventBus:
+    """
+    Publish/subscribe lokal untuk event yang sudah di-commit EventWriter.
+    publish() dipanggil dari thread writer: encode JSON sekali, lalu append ke
+    buffer tiap subscriber (tanpa I/O socket). Tiap subscriber punya thread
+    pengirim sendiri dan buffer `buffer_size`; kalau penuh, policy drop_oldest
+    membuang event paling lama (client dapat pesan gap) atau disconnect memutus
+    client lambat (client bisa reconnect dengan resume_from).
+    """
+
+    def __init__(self, db_file, host="127.0.0.1", port=9200, buffer_size=10000, history=10000,
+                 policy="drop_oldest"):
+        if policy not in POLICIES:
+            raise ValueError(f"policy harus salah satu dari {POLICIES}")
+        self.db_file = db_file
+        self.host = host
+        self.port = port
+        self.buffer_size = buffer_size
+        self.policy = policy
+        self.history = deque(maxlen=history)   # (id, line) terbaru untuk resume
+        self.subscribers = set()
+        self.last_id = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+        # Counters
+        self.events_published = 0
+        self.events_dropped = 0
+        self.subscribers_total = 0
+
+    def start(self):
+        try:
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server.bind((self.host, self.port))
+            server.listen(16)
+        except OSError as e:
+            print(f"\033[93m[BUS] Tidak bisa listen di {self.host}:{self.port}: {e}\033[0m")
+            return False
+        self._server = server
+        self.port = server.getsockname()[1]
+        threading.Thread(target=self._accept, name="EventBus", daemon=True).start()
+        print(f"[BUS] Event bus: tcp://{self.host}:{self.port}")
+        return True
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.close()
+            except OSError:
+                pass
+            self._server = None
+        with self._lock:
+            subscribers = list(self.subscribers)
+        for sub in subscribers:
+            sub.close()
+
+    def stats(self):
+        return {"subscribers": len(self.subscribers), "subscribers_total": self.subscribers_total,
+                "events_published": self.events_published, "events_dropped": self.events_dropped,
+                "last_id": self.last_id}
+
+    def publish(self, session, events):
+        """events: [(id, row EventWriter), ...] yang baru saja di-commit."""
+        lines = [(event_id, event_line(event_id, session, row)) for event_id, row in events]
+        with self._lock:
+            self.history.extend(lines)
+            if lines:
+                self.last_id = lines[-1][0]
+            self.events_published += len(lines)
+            subscribers = list(self.subscribers)
+        for sub in subscribers:
+            for _, line in lines:
+                sub.offer(line)
+
+    # --------------------------------------------------------------------------
+    def _accept(self):
+        while self._server is not None:
+            try:
+                sock, addr = self._server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(sock, addr), name=f"EventBus-{addr[1]}",
+                             daemon=True).start()
+
+    def _read_hello(self, sock):
+        """Baris pertama dari client (timeout pendek); client tanpa hello = live saja."""
+        sock.settimeout(1.0)
+        data = b""
+        try:
+            while b"\n" not in data and len(data) < 4096:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+        except socket.timeout:
+            pass
+        sock.settimeout(None)
+        try:
+            return json.loads(data.split(b"\n", 1)[0] or b"{}").get("resume_from")
+        except ValueError:
+            return None
+
+    def _backlog_from_db(self, after_id, before_id):
+        """Event after_id < id < before_id dari SQLite (resume yang lebih tua dari history memori)."""
+        conn = sqlite3.connect(self.db_file, timeout=5.0)
+        try:
+            while True:
+                rows = conn.execute(BACKLOG_SQL, (after_id, before_id, 5000)).fetchall()
+                if not rows:
+                    return
+                for row in rows:
+                    event = dict(zip(EVENT_FIELDS, row))
+                    event["type"] = "event"
+                    yield _control(event)
+                after_id = rows[-1][0]
+        finally:
+            conn.close()
+
+    def _serve(self, sock, addr):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        resume_from = self._read_hello(sock)
+        sub = _Subscriber(self, sock, addr)
+
+        # Snapshot history + daftar subscriber di lock yang sama dengan publish():
+        # event sesudah snapshot pasti masuk buffer subscriber, tidak ada yang hilang / dobel
+        with self._lock:
+            history = list(self.history)
+            last_id = self.last_id
+            self.subscribers.add(sub)
+            self.subscribers_total += 1
+        print(f"[BUS] Subscriber connected {addr[0]}:{addr[1]} (resume_from={resume_from})")
+
+        try:
+            sock.sendall(_control({"type": "hello", "last_id": last_id}))
+            if resume_from is not None:
+                first_in_memory = history[0][0] if history else last_id + 1
+                if resume_from + 1 < first_in_memory:
+                    batch = []
+                    for line in self._backlog_from_db(resume_from, first_in_memory):
+                        batch.append(line)
+                        if len(batch) >= 1000:
+                            sock.sendall(b"".join(batch))
+                            batch = []
+                    if batch:
+                        sock.sendall(b"".join(batch))
+                backlog = [line for event_id, line in history if event_id > resume_from]
+                if backlog:
+                    sock.sendall(b"".join(backlog))
+            sub.drain()
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                self.subscribers.discard(sub)
+            sub.close()
+            try:
+                sock.close()
+            except OSError:
+                pass
+            reason = " (slow consumer)" if self.policy == "disconnect" and sub.closed and sub.buffer else ""
+            print(f"[BUS] Subscriber disconnected {addr[0]}:{addr[1]}{reason}")
+
+# ==============================================================================
+# CLIENT (DASHBOARD / LISTENER)
+# ==============================================================================
+class BusSubscriber:
+    """
+    Client sederhana: poll(timeout) mengembalikan event yang sudah datang (list dict),
+    blocking paling lama `timeout` detik. Reconnect otomatis dengan resume_from = id
+    terakhir yang diterima, jadi putus sebentar tidak kehilangan event.
+    """
+
+    def __init__(self, host="127.0.0.1", port=9200, resume_from=None):
+        self.host = host
+        self.port = port
+        self.last_id = resume_from
+        self.sock = None
+        self.pending = b""
+        self.gaps = 0
+        self.dropped = 0
+
+    def connect(self, timeout=1.0):
+        self.close()
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=timeout)
+        except OSError:
+            return False
+        sock.sendall(_control({"resume_from": self.last_id}))
+        self.sock = sock
+        self.pending = b""
+        return True
+
+    @property
+    def connected(self):
+        return self.sock is not None
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def poll(self, timeout=0.5):
+        if self.sock is None and not self.connect():
+            return None  # engine / bus tidak jalan
+        self.sock.settimeout(timeout)
+        try:
+            data = self.sock.recv(65536)
+        except socket.timeout:
+            return []
+        except OSError:
+            self.close()
+            return None
+        if not data:
+            self.close()
+            return None
+
+        # Ambil semua yang sudah ada di socket tanpa menunggu lagi
+        self.sock.setblocking(False)
+        try:
+            while True:
+                more = self.sock.recv(65536)
+                if not more:
+                    break
+                data += more
+        except (BlockingIOError, socket.timeout):
+            pass
+        except OSError:
+            self.close()
+        finally:
+            if self.sock is not None:
+                self.sock.setblocking(True)
+
+        lines = (self.pending + data).split(b"\n")
+        self.pending = lines.pop()
+        events = []
+        for line in lines:
+            if not line:
+                continue
+            message = json.loads(line)
+            kind = message.get("type")
+            if kind == "event":
+                if self.last_id is not None and message["id"] <= self.last_id:
+                    continue
+                self.last_id = message["id"]
+                events.append(message)
+            elif kind == "gap":
+                self.gaps += 1
+                self.dropped += message["dropped"]
+            elif kind == "hello" and self.last_id is None:
+                self.last_id = message["last_id"]
+        return events
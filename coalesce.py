@@ -0,0 +1,201 @@
+import threading
+import time
+
+# ==============================================================================
+# EVENT COALESCING (FLOOD CONTROL)
+# ==============================================================================
+class _Run:
+    """Event berulang untuk satu (device, event, source) di window yang sedang jalan."""
+
+    __slots__ = ("window_start", "count", "first_seen", "last_seen", "risk", "msg")
+
+    def __init__(self, now):
+        self.window_start = now
+        self.count = 0
+        self.first_seen = None
+        self.last_seen = None
+        self.risk = 0
+        self.msg = ""
+
+
+class EventCoalescer:
+    """
+    Tahap sebelum sink (console, DB, UDP). Event pertama dari satu
+    (device, event, source) langsung diteruskan; pengulangan di dalam `window`
+    detik dilipat jadi satu baris ringkasan dengan count / first_seen / last_seen.
+
+    Perubahan status per (device, source) (mis. AMAN -> USER USED FAKE GPS TO MAPS)
+    selalu lewat langsung. Sebelumnya semua ringkasan yang masih terbuka di device
+    itu (semua source, urut first_seen) di-flush lebih dulu, supaya urutan baris di
+    DB sama dengan timeline device (mis. "Process Disappeared" dari System Monitor
+    tidak mendahului ringkasan Maps yang terjadi sebelumnya).
+
+    emit(status, source, risk, msg, device, count, first_seen, last_seen)
+    dipanggil di luar lock state, tapi di bawah `_emit_lock` yang diambil sebelum
+    lock state dilepas: urutan baris di DB / bus sama dengan urutan baris dibuat,
+    juga antara thread monitor dan thread flush. first_seen / last_seen dalam epoch detik.
+    last_status dibuang bersama run terakhir (device, source) yang kedaluwarsa.
+    """
+
+    def __init__(self, emit, window=5.0, clock=time.time):
+        self.emit = emit
+        self.window = window
+        self.clock = clock
+        self.runs = {}          # (device, status, source) -> _Run
+        self.last_status = {}   # (device, source) -> status terakhir
+        self._lock = threading.Lock()
+        self._emit_lock = threading.Lock()  # selalu diambil sesudah _lock (urutan emit)
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Counters
+        self.events_in = 0
+        self.rows_out = 0
+        self.folded = 0
+
+    # --------------------------------------------------------------------------
+    def start(self):
+        """Thread kecil yang mem-flush run yang window-nya sudah lewat (key yang diam)."""
+        if self.window <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="EventCoalescer", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(2.0)
+            self._thread = None
+        self.flush_all()
+
+    def stats(self):
+        return {"events_in": self.events_in, "rows_out": self.rows_out, "folded": self.folded,
+                "open_runs": len(self.runs), "tracked_sources": len(self.last_status)}
+
+    # --------------------------------------------------------------------------
+    def submit(self, status, source, risk, msg, device=None):
+        now = self.clock()
+        if self.window <= 0:
+            with self._lock:
+                self.events_in += 1
+                self._emit_lock.acquire()
+            self._emit([(status, source, risk, msg, device, 1, now, now)])
+            return
+
+        out = []
+        with self._lock:
+            self.events_in += 1
+            key = (device, status, source)
+            state_key = (device, source)
+
+            prev = self.last_status.get(state_key)
+            if prev != status:
+                # Transisi status (termasuk status pertama source ini): ringkasan lama keluar duluan
+                old = self.runs.pop((device, prev, source), None) if prev is not None else None
+                if old is not None and old.count:
+                    out.append(self._summary((device, prev, source), old))
+                self._flush_device(device, now, out)
+                out.sort(key=lambda row: row[6])
+            self.last_status[state_key] = status
+
+            run = self.runs.get(key)
+            if run is not None and now - run.window_start >= self.window:
+                if run.count:
+                    out.append(self._summary(key, run))
+                    run.window_start = now
+                    run.count = 0
+                else:
+                    del self.runs[key]
+                    run = None
+
+            if run is None:
+                self.runs[key] = _Run(now)
+                out.append((status, source, risk, msg, device, 1, now, now))
+            else:
+                if run.count == 0:
+                    run.first_seen = now
+                run.count += 1
+                run.last_seen = now
+                run.risk = risk
+                run.msg = msg
+                self.folded += 1
+            self._emit_lock.acquire()
+        self._emit(out)
+
+    def alert(self, status, source, risk, msg, device=None, count=1, first_seen=None, last_seen=None):
+        """
+        Baris sampingan (alarm HIGH_FREQ dari RateDetector): ringkasan terbuka device
+        di-flush dulu supaya urutan di DB benar, lalu alarm lewat tanpa dilipat dan
+        tanpa mengubah status terakhir per source.
+        """
+        now = self.clock()
+        out = []
+        with self._lock:
+            self._flush_device(device, now, out)
+            out.sort(key=lambda row: row[6])
+            out.append((status, source, risk, msg, device, count, first_seen or now, last_seen or now))
+            self._emit_lock.acquire()
+        self._emit(out)
+
+    def flush_expired(self, now=None):
+        """Flush ringkasan untuk run yang window-nya sudah habis; run kosong (dan last_status-nya) dibuang."""
+        now = self.clock() if now is None else now
+        out = []
+        with self._lock:
+            dropped = []
+            for key, run in list(self.runs.items()):
+                if now - run.window_start < self.window:
+                    continue
+                if run.count:
+                    out.append(self._summary(key, run))
+                    run.window_start = now
+                    run.count = 0
+                else:
+                    del self.runs[key]
+                    dropped.append((key[0], key[2]))
+            if dropped:
+                live = {(device, source) for device, _, source in self.runs}
+                for state_key in dropped:
+                    if state_key not in live:
+                        self.last_status.pop(state_key, None)
+            self._emit_lock.acquire()
+        self._emit(out)
+
+    def flush_all(self):
+        out = []
+        with self._lock:
+            for key, run in self.runs.items():
+                if run.count:
+                    out.append(self._summary(key, run))
+            self.runs.clear()
+            self.last_status.clear()
+            self._emit_lock.acquire()
+        self._emit(out)
+
+    def _flush_device(self, device, now, out):
+        """Ringkasan semua run terbuka milik device ke `out` (dipanggil dengan lock)."""
+        for key, run in self.runs.items():
+            if key[0] == device and run.count:
+                out.append(self._summary(key, run))
+                run.window_start = now
+                run.count = 0
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _summary(key, run):
+        device, status, source = key
+        return (status, source, run.risk, run.msg, device, run.count, run.first_seen, run.last_seen)
+
+    def _emit(self, rows):
+        """Dipanggil dengan _emit_lock sudah diambil (di dalam _lock); lock dilepas di sini."""
+        try:
+            for row in rows:
+                self.rows_out += 1
+                self.emit(*row)
+        finally:
+            self._emit_lock.release()
+
+    def _run(self):
+        interval = min(1.0, self.window / 2)
+        while not self._stop.wait(interval):
+            self.flush_expired()
@@ -1,15 +1,22 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
-import time
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-import uuid
+import hashlib
+import numpy as np
+import time
+
+import storage
+from snapshot import SnapshotProducer
 
 st.set_page_config(page_title="LocShield Turbo Dashboard", layout="wide", initial_sidebar_state="collapsed")
 DB_FILE = "locshield.db"
 
+# Event bus engine (push). Kalau engine tidak menjalankan bus, dashboard polling SQLite.
+BUS_HOST = "127.0.0.1"
+BUS_PORT = 9200
+
 # CSS ENHANCED
 st.markdown("""
 <style>
@@ -86,7 +93,161 @@ with col_header1:
 with col_header2:
     st.markdown(f"**Live Update:** {datetime.now().strftime('%H:%M:%S')}")
 
-placeholder = st.empty()
+live_tab, history_tab = st.tabs(["📡 Live", "🔎 History"])
+
+# Satu slot per komponen: komponen yang isinya tidak berubah tidak dikirim ulang ke browser
+with live_tab:
+    slots = {"error": st.empty(), "waiting": st.empty(), "status": st.empty(), "metrics": st.empty()}
+    chart_col1, chart_col2 = st.columns(2)
+    slots["risk_chart"] = chart_col1.empty()
+    slots["events_chart"] = chart_col2.empty()
+    for name in ("stream", "timeline", "engine_metrics"):
+        slots[name] = st.empty()
+# Key yang terakhir digambar per slot (slot baru tiap script rerun, jadi mulai kosong)
+drawn = {}
+
+# Warna baris tabel event (risk >= 8, risk >= 5, AMAN, lainnya)
+ROW_STYLES = ['background-color: #330000; color: #FF0000; font-weight: bold',
+              'background-color: #333300; color: #FFFF00',
+              'background-color: #002200; color: #00FF00']
+ROW_STYLE_DEFAULT = 'background-color: #0a0a0a; color: #888888'
+
+
+def content_hash(frame):
+    """Hash isi DataFrame (nilai saja, tanpa index) untuk memo render."""
+    if frame.empty:
+        return ""
+    values = pd.util.hash_pandas_object(frame, index=False).values
+    return hashlib.blake2b(values.tobytes(), digest_size=16).hexdigest()
+
+
+def render_component(name, key, draw):
+    """Gambar ulang slot `name` hanya kalau key berubah. draw None = kosongkan slot."""
+    state = (key, draw is not None)
+    if drawn.get(name) == state:
+        return
+    drawn[name] = state
+    if draw is None:
+        slots[name].empty()
+    else:
+        with slots[name].container():
+            draw()
+
+
+def clear_components():
+    for name in slots:
+        if name not in ("error", "waiting"):
+            render_component(name, None, None)
+
+
+def style_frame(frame):
+    """CSS semua sel sekaligus dari mask kolom (Styler.apply axis=None)."""
+    risk = frame['risk'].to_numpy()
+    safe = frame['event'].astype(str).str.contains('AMAN', regex=False).to_numpy()
+    css = np.select([risk >= 8, risk >= 5, safe], ROW_STYLES, ROW_STYLE_DEFAULT)
+    return pd.DataFrame(np.repeat(css[:, None], frame.shape[1], axis=1), index=frame.index,
+                        columns=frame.columns)
+
+
+# Figure di-cache per hash isi, dipakai bersama semua sesi browser (operator)
+@st.cache_data(max_entries=32, show_spinner=False)
+def risk_figure(key, _risk_dist):
+    fig_risk = px.bar(
+        x=_risk_dist.index, 
+        y=_risk_dist.values,
+        labels={'x': 'Risk Level', 'y': 'Count'},
+        color=_risk_dist.values,
+        color_continuous_scale=['green', 'yellow', 'orange', 'red']
+    )
+    fig_risk.update_layout(
+        plot_bgcolor='#0a0a0a',
+        paper_bgcolor='#0a0a0a',
+        font_color='#00FF00',
+        showlegend=False,
+        height=300
+    )
+    return fig_risk
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def event_figure(key, _event_counts):
+    fig_events = px.pie(
+        values=_event_counts['count'],
+        names=_event_counts['event'],
+        color_discrete_sequence=px.colors.sequential.RdBu
+    )
+    fig_events.update_layout(
+        plot_bgcolor='#0a0a0a',
+        paper_bgcolor='#0a0a0a',
+        font_color='#00FF00',
+        height=300
+    )
+    return fig_events
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def timeline_figure(key, _time_df):
+    # Prepare timeline data (epoch menit -> jam lokal)
+    time_df = _time_df.copy()
+    time_df['time'] = pd.to_datetime(time_df['minute'] * 60, unit='s', utc=True) \
+        .dt.tz_convert(datetime.now().astimezone().tzinfo).dt.tz_localize(None)
+    fig_timeline = px.bar(
+        time_df,
+        x='time',
+        y='count',
+        color='event',
+        title='Events per Minute',
+        labels={'time': 'Minute', 'count': 'Events', 'event': 'Event'}
+    )
+    risk_line = time_df.groupby('time')['risk_max'].max()
+    fig_timeline.add_trace(go.Scatter(x=risk_line.index, y=risk_line.values, name='Max Risk',
+                                      yaxis='y2', line=dict(color='#FF0000')))
+    fig_timeline.add_hline(y=8, line_dash="dash", line_color="red", yref='y2',
+                          annotation_text="Critical Threshold")
+    fig_timeline.add_hline(y=5, line_dash="dash", line_color="yellow", yref='y2',
+                          annotation_text="Medium Threshold")
+    fig_timeline.update_layout(
+        plot_bgcolor='#0a0a0a',
+        paper_bgcolor='#0a0a0a',
+        font_color='#00FF00',
+        barmode='stack',
+        yaxis2=dict(title='Max Risk', overlaying='y', side='right', range=[0, 10.5]),
+        height=300
+    )
+    return fig_timeline
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def engine_figures(key, _metrics_df):
+    metrics_df = _metrics_df.copy()
+    metrics_df['p95_ms'] = metrics_df['p95'] * 1000
+    metrics_df['series'] = metrics_df['labels'].str.split('=').str[-1]
+
+    stage_df = metrics_df[metrics_df['name'] == 'stage_seconds']
+    fig_stage = px.line(stage_df, x='timestamp', y='p95_ms', color='series',
+                        labels={'timestamp': 'Snapshot', 'p95_ms': 'p95 (ms)', 'series': 'Stage'},
+                        log_y=True)
+    fig_stage.update_layout(plot_bgcolor='#0a0a0a', paper_bgcolor='#0a0a0a',
+                            font_color='#00FF00', height=300)
+
+    lag_df = metrics_df[metrics_df['name'] == 'logcat_lag_seconds']
+    fig_lag = px.line(lag_df, x='timestamp', y='p95_ms', color='series',
+                      labels={'timestamp': 'Snapshot', 'p95_ms': 'Logcat lag p95 (ms)',
+                              'series': 'Device'})
+    fig_lag.update_layout(plot_bgcolor='#0a0a0a', paper_bgcolor='#0a0a0a',
+                          font_color='#00FF00', height=300)
+    return fig_stage, fig_lag
+
+
+def draw_waiting():
+    st.info("🟢 System Ready - Waiting for events...")
+    st.markdown("""
+    ### Quick Start Guide:
+    1. ✅ Make sure `engine.py` is running
+    2. ✅ Android device/emulator connected via ADB
+    3. ✅ Start monitoring for location access events
+    4. ✅ This dashboard updates as soon as the engine publishes events (event bus)
+    """)
 
 # Initialize session state for metrics tracking
 if 'previous_threats' not in st.session_state:
@@ -94,53 +255,134 @@ if 'previous_threats' not in st.session_state:
 if 'previous_total' not in st.session_state:
     st.session_state.previous_total = 0
 
-while True:
-    uid = str(uuid.uuid4())[:8]
+
+@st.cache_resource
+def get_snapshots():
+    """Satu producer per proses Streamlit, dipakai bersama semua sesi browser."""
+    return SnapshotProducer(DB_FILE, BUS_HOST, BUS_PORT).start()
+
+
+snapshots = get_snapshots()
+
+# History drill-down: halaman keyset (ts, id) dari storage.history_page; "Load older" menambah halaman
+# berikutnya ke tabel tanpa OFFSET.
+HISTORY_PAGE_SIZE = 200
+HISTORY_COLUMNS = ['timestamp', 'device', 'event', 'source', 'risk', 'dread_score', 'count', 'msg']
+
+
+def load_history_page():
+    state = st.session_state
+    before = None
+    if state.hist_rows:
+        last = state.hist_rows[-1]
+        before = (last[1], last[0])
+    t0 = time.perf_counter()
+    with get_snapshots().pool.connection() as conn:
+        rows = storage.history_page(conn, *state.hist_filters, before=before, limit=HISTORY_PAGE_SIZE)
+    state.hist_query_ms = (time.perf_counter() - t0) * 1000
+    state.hist_rows.extend(rows)
+    state.hist_done = len(rows) < HISTORY_PAGE_SIZE
+
+
+def seed_history_defaults():
+    """
+    Default filter ditulis ke session_state sekali saja (dibulatkan ke menit). Widget
+    dibuat tanpa value=: di streamlit 1.29 id widget ikut default-nya, jadi default
+    dari datetime.now() tiap rerun me-reset filter dan "Load older" mulai dari halaman 1.
+    """
+    state = st.session_state
+    if 'hist_start_date' in state:
+        return
+    now = datetime.now().replace(second=0, microsecond=0)
+    start = now - timedelta(hours=1)
+    state.hist_start_date = start.date()
+    state.hist_start_time = start.time()
+    state.hist_end_date = now.date()
+    state.hist_end_time = now.time()
+    state.hist_min_risk = 0
+
+
+def render_history():
+    seed_history_defaults()
     try:
-        conn = sqlite3.connect(DB_FILE)
-        df = pd.read_sql_query("""
-            SELECT id, timestamp, event, source, risk, msg, dread_score 
-            FROM logs 
-            ORDER BY id DESC 
-            LIMIT 100
-        """, conn)
-        
-        # Get statistics
-        stats_query = """
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN risk >= 8 THEN 1 ELSE 0 END) as high_threats,
-                SUM(CASE WHEN risk >= 5 AND risk < 8 THEN 1 ELSE 0 END) as medium_threats,
-                AVG(risk) as avg_risk,
-                AVG(dread_score) as avg_dread
-            FROM logs
-        """
-        stats = pd.read_sql_query(stats_query, conn)
-        
-        # Time-based analysis (last 10 minutes)
-        time_query = """
-            SELECT timestamp, event, risk 
-            FROM logs 
-            WHERE id >= (SELECT MAX(id) - 100 FROM logs)
-            ORDER BY id DESC
-        """
-        time_df = pd.read_sql_query(time_query, conn)
-        
-        conn.close()
-    except Exception as e:
-        st.error(f"Database Error: {e}")
-        df = pd.DataFrame()
-        stats = pd.DataFrame({'total': [0], 'high_threats': [0], 'medium_threats': [0], 
-                            'avg_risk': [0], 'avg_dread': [0]})
-        time_df = pd.DataFrame()
-
-    with placeholder.container():
-        if not df.empty:
-            last_event = df.iloc[0]['event']
-            last_risk = df.iloc[0]['risk']
-            last_msg = df.iloc[0]['msg']
-            
-            # DYNAMIC STATUS BAR
+        with snapshots.pool.connection() as conn:
+            event_types = [row[0] for row in conn.execute("SELECT name FROM event_types ORDER BY name")]
+    except Exception:
+        event_types = []
+
+    with st.form("history_filters"):
+        f1, f2, f3, f4 = st.columns([2, 2, 1, 2])
+        start_date = f1.date_input("From", key="hist_start_date")
+        start_time = f1.time_input("From time", step=60, key="hist_start_time", label_visibility="collapsed")
+        end_date = f2.date_input("To", key="hist_end_date")
+        end_time = f2.time_input("To time", step=60, key="hist_end_time", label_visibility="collapsed")
+        min_risk = f3.number_input("Min risk", min_value=0, step=1, key="hist_min_risk")
+        event = f4.selectbox("Event type", ["(all)"] + event_types, key="hist_event")
+        submitted = st.form_submit_button("🔎 Search")
+
+    start_ms = int(datetime.combine(start_date, start_time).timestamp() * 1000)
+    # Menit "To" ikut sampai detik terakhirnya
+    end_ms = int(datetime.combine(end_date, end_time.replace(second=59, microsecond=999000)).timestamp() * 1000)
+    filters = (start_ms, end_ms, int(min_risk), None if event == "(all)" else event)
+
+    state = st.session_state
+    if submitted or state.get('hist_filters') != filters:
+        state.hist_filters = filters
+        state.hist_rows = []
+        try:
+            load_history_page()
+        except Exception as e:
+            state.hist_done = True
+            st.error(f"Database Error: {e}")
+
+    rows = state.hist_rows
+    st.caption(f"{len(rows)} events loaded (last page {state.get('hist_query_ms', 0):.1f} ms)"
+               + (" - end of range" if state.hist_done else ""))
+    if rows:
+        history_df = pd.DataFrame(rows, columns=storage.HISTORY_COLUMNS)[HISTORY_COLUMNS]
+        st.dataframe(history_df, height=500, use_container_width=True, hide_index=True)
+    st.button("⬇️ Load older", on_click=load_history_page, disabled=state.hist_done, key="hist_more")
+
+
+with history_tab:
+    render_history()
+
+version = None
+
+while True:
+    # Tidur sampai producer publish snapshot baru (event dari bus / polling SQLite)
+    snapshot = snapshots.wait(version, timeout=1.0)
+    if snapshot is None or snapshot.version == version:
+        continue
+    version = snapshot.version
+    df, stats, event_stats = snapshot.events, snapshot.stats, snapshot.event_stats
+    time_df, metrics_df = snapshot.time_df, snapshot.metrics_df
+
+    if snapshot.error:
+        render_component("error", snapshot.error, lambda: st.error(f"Database Error: {snapshot.error}"))
+    else:
+        render_component("error", None, None)
+
+    if df.empty:
+        clear_components()
+        render_component("waiting", None, draw_waiting)
+    else:
+        render_component("waiting", None, None)
+        last_event = df.iloc[0]['event']
+        last_risk = df.iloc[0]['risk']
+        last_msg = df.iloc[0]['msg']
+
+        total_events = int(stats['total'].iloc[0])
+        high_threats = int(stats['high_threats'].iloc[0])
+        medium_threats = int(stats['medium_threats'].iloc[0])
+        avg_risk = float(stats['avg_risk'].iloc[0])
+        last_dread = df.iloc[0].get('dread_score', 0)
+        avg_dread = float(stats['avg_dread'].iloc[0])
+        safe_events = int(event_stats.loc[event_stats['event'] == 'AMAN', 'count'].sum())
+        fake_gps_count = int(event_stats.loc[event_stats['event'].str.contains('FAKE', na=False), 'count'].sum())
+
+        # DYNAMIC STATUS BAR
+        def draw_status():
             if "USER USED FAKE" in last_event or "ATTACKED" in last_event:
                 st.markdown(f'<div class="status-box danger">🚨 CRITICAL THREAT: {last_event}</div>', 
                           unsafe_allow_html=True)
@@ -151,18 +393,17 @@ while True:
                 st.markdown(f'<div class="status-box safe">✅ SYSTEM SECURE - {last_event}</div>', 
                           unsafe_allow_html=True)
 
-            # METRICS ROW 1
-            c1, c2, c3, c4 = st.columns(4)
-            
-            total_events = int(stats['total'].iloc[0])
-            high_threats = int(stats['high_threats'].iloc[0])
-            medium_threats = int(stats['medium_threats'].iloc[0])
-            avg_risk = float(stats['avg_risk'].iloc[0])
-            
-            # Calculate deltas
+        render_component("status", (last_event, last_msg), draw_status)
+
+        # METRICS ROW 1 + 2 (delta dihitung hanya saat angka berubah)
+        metric_values = (total_events, high_threats, medium_threats, round(avg_risk, 1), int(last_dread),
+                         round(avg_dread, 1), safe_events, fake_gps_count)
+
+        def draw_metrics():
             delta_total = total_events - st.session_state.previous_total
             delta_threats = high_threats - st.session_state.previous_threats
-            
+
+            c1, c2, c3, c4 = st.columns(4)
             c1.metric("📊 Total Events", f"{total_events}", 
                      delta=f"+{delta_total}" if delta_total > 0 else None)
             c2.metric("🔴 Critical Threats", f"{high_threats}", 
@@ -170,7 +411,7 @@ while True:
                      delta_color="inverse")
             c3.metric("🟡 Medium Alerts", f"{medium_threats}")
             c4.metric("📈 Avg Risk Score", f"{avg_risk:.1f}/10")
-            
+
             # Update session state
             st.session_state.previous_total = total_events
             st.session_state.previous_threats = high_threats
@@ -178,115 +419,77 @@ while True:
             # METRICS ROW 2
             st.markdown("---")
             c5, c6, c7, c8 = st.columns(4)
-            
-            last_dread = df.iloc[0].get('dread_score', 0)
-            avg_dread = float(stats['avg_dread'].iloc[0])
-            safe_events = len(df[df['event'] == 'AMAN'])
-            fake_gps_count = len(df[df['event'].str.contains('FAKE', na=False)])
-            
             c5.metric("🎯 Last DREAD Score", f"{last_dread}/50")
             c6.metric("📊 Avg DREAD", f"{avg_dread:.1f}/50")
             c7.metric("✅ Safe Events", f"{safe_events}")
             c8.metric("🎭 Fake GPS Detections", f"{fake_gps_count}")
-
             st.markdown("---")
 
-            # CHARTS
-            chart_col1, chart_col2 = st.columns(2)
-            
-            with chart_col1:
-                st.subheader("📊 Risk Distribution")
-                risk_dist = df['risk'].value_counts().sort_index()
-                fig_risk = px.bar(
-                    x=risk_dist.index, 
-                    y=risk_dist.values,
-                    labels={'x': 'Risk Level', 'y': 'Count'},
-                    color=risk_dist.values,
-                    color_continuous_scale=['green', 'yellow', 'orange', 'red']
-                )
-                fig_risk.update_layout(
-                    plot_bgcolor='#0a0a0a',
-                    paper_bgcolor='#0a0a0a',
-                    font_color='#00FF00',
-                    showlegend=False,
-                    height=300
-                )
-                st.plotly_chart(fig_risk, use_container_width=True, key="risk_distribution_chart")
-            
-            with chart_col2:
-                st.subheader("📈 Event Types")
-                event_counts = df['event'].value_counts().head(5)
-                fig_events = px.pie(
-                    values=event_counts.values,
-                    names=event_counts.index,
-                    color_discrete_sequence=px.colors.sequential.RdBu
-                )
-                fig_events.update_layout(
-                    plot_bgcolor='#0a0a0a',
-                    paper_bgcolor='#0a0a0a',
-                    font_color='#00FF00',
-                    height=300
-                )
-                st.plotly_chart(fig_events, use_container_width=True, key="event_types_pie_chart")
+        render_component("metrics", metric_values, draw_metrics)
+
+        # CHARTS
+        risk_dist = df['risk'].value_counts().sort_index()
+        risk_key = content_hash(risk_dist.reset_index())
+
+        def draw_risk_chart():
+            st.subheader("📊 Risk Distribution")
+            st.plotly_chart(risk_figure(risk_key, risk_dist), use_container_width=True,
+                            key="risk_distribution_chart")
+
+        render_component("risk_chart", risk_key, draw_risk_chart)
+
+        event_counts = event_stats.head(5)
+        events_key = content_hash(event_counts)
+
+        def draw_events_chart():
+            st.subheader("📈 Event Types")
+            st.plotly_chart(event_figure(events_key, event_counts), use_container_width=True,
+                            key="event_types_pie_chart")
+
+        render_component("events_chart", events_key, draw_events_chart)
 
+        # REAL-TIME EVENT LOG (warna dari mask kolom, bukan callback per baris)
+        display_df = df[['timestamp', 'device', 'event', 'source', 'risk', 'dread_score', 'msg']].head(50)
+
+        def draw_stream():
             st.markdown("---")
-            
-            # REAL-TIME EVENT LOG
             st.subheader("📡 Real-Time Event Stream")
-            
-            # Color-coded dataframe
-            def style_row(row):
-                if row['risk'] >= 8:
-                    return ['background-color: #330000; color: #FF0000; font-weight: bold'] * len(row)
-                elif row['risk'] >= 5:
-                    return ['background-color: #333300; color: #FFFF00'] * len(row)
-                elif 'AMAN' in str(row['event']):
-                    return ['background-color: #002200; color: #00FF00'] * len(row)
-                return ['background-color: #0a0a0a; color: #888888'] * len(row)
-
-            # Display styled dataframe
-            display_df = df[['timestamp', 'event', 'source', 'risk', 'dread_score', 'msg']].head(50)
-            
             try:
-                styled_df = display_df.style.apply(style_row, axis=1)
-                st.dataframe(styled_df, height=400, use_container_width=True)
+                st.dataframe(display_df.style.apply(style_frame, axis=None), height=400,
+                             use_container_width=True)
             except:
                 st.dataframe(display_df, height=400, use_container_width=True)
-            
-            # THREAT TIMELINE
-            if not time_df.empty and len(time_df) > 1:
+
+        render_component("stream", content_hash(display_df), draw_stream)
+
+        # THREAT TIMELINE
+        if time_df.empty:
+            render_component("timeline", None, None)
+        else:
+            timeline_key = content_hash(time_df)
+
+            def draw_timeline():
                 st.markdown("---")
-                st.subheader("⏱️ Threat Timeline (Last 100 Events)")
-                
-                # Prepare timeline data
-                time_df['id'] = range(len(time_df), 0, -1)
-                fig_timeline = px.line(
-                    time_df, 
-                    x='id', 
-                    y='risk',
-                    title='Risk Level Over Time',
-                    labels={'id': 'Event Sequence', 'risk': 'Risk Level'}
-                )
-                fig_timeline.add_hline(y=8, line_dash="dash", line_color="red", 
-                                      annotation_text="Critical Threshold")
-                fig_timeline.add_hline(y=5, line_dash="dash", line_color="yellow", 
-                                      annotation_text="Medium Threshold")
-                fig_timeline.update_layout(
-                    plot_bgcolor='#0a0a0a',
-                    paper_bgcolor='#0a0a0a',
-                    font_color='#00FF00',
-                    height=300
-                )
-                st.plotly_chart(fig_timeline, use_container_width=True, key="threat_timeline_chart")
+                st.subheader("⏱️ Threat Timeline (Last 60 Minutes)")
+                st.plotly_chart(timeline_figure(timeline_key, time_df), use_container_width=True,
+                                key="threat_timeline_chart")
 
+            render_component("timeline", timeline_key, draw_timeline)
+
+        # ENGINE METRICS (p95 per stage + lag logcat)
+        if metrics_df.empty:
+            render_component("engine_metrics", None, None)
         else:
-            st.info("🟢 System Ready - Waiting for events...")
-            st.markdown("""
-            ### Quick Start Guide:
-            1. ✅ Make sure `engine.py` is running
-            2. ✅ Android device/emulator connected via ADB
-            3. ✅ Start monitoring for location access events
-            4. ✅ This dashboard will auto-update every 0.5s
-            """)
-
-    time.sleep(0.5)  # Fast refresh rate for real-time monitoring
\ No newline at end of file
+            engine_key = content_hash(metrics_df)
+
+            def draw_engine_metrics():
+                st.markdown("---")
+                st.subheader("⚙️ Engine Metrics (p95)")
+                fig_stage, fig_lag = engine_figures(engine_key, metrics_df)
+                metric_col1, metric_col2 = st.columns(2)
+                with metric_col1:
+                    st.plotly_chart(fig_stage, use_container_width=True, key="stage_latency_chart")
+                with metric_col2:
+                    st.plotly_chart(fig_lag, use_container_width=True, key="logcat_lag_chart")
+
+            render_component("engine_metrics", engine_key, draw_engine_metrics)
@@ -1,17 +1,29 @@
 import subprocess
 import json
-import sqlite3
 import re
 import threading
 import time
 import os
-import socket
+import argparse
 from datetime import datetime
 
+import storage
+from storage import EventWriter
+from coalesce import EventCoalescer
+from rate import RateDetector
+from telemetry import TelemetryEmitter
+from bus import EventBus
+from metrics import MetricsRegistry, MetricsServer, MetricsSnapshotter
+from retention import RetentionManager, ensure_incremental_vacuum
+from tracker import ProcessTracker
+from logcat import (LineClassifier, parse_threadtime_line, build_logcat_cmd,
+                    record_epoch, CATEGORY_FAKE, CATEGORY_BRIDGE, CATEGORY_MAPS)
+
 # ==============================================================================
 # KONFIGURASI SYSTEM
 # ==============================================================================
-ADB_PATH = r"C:\Users\pyjyu\AppData\Local\Android\Sdk\platform-tools\adb.exe"
+# LOCSHIELD_ADB bisa diarahkan ke fake_adb.py untuk load-test tanpa HP
+ADB_PATH = os.environ.get("LOCSHIELD_ADB", r"C:\Users\pyjyu\AppData\Local\Android\Sdk\platform-tools\adb.exe")
 DB_FILE = "locshield.db"
 
 # Setting Wireshark
@@ -19,7 +31,65 @@ WIRESHARK_IP = "127.0.0.1"
 WIRESHARK_PORT = 9999
 WIRESHARK_BIND_IP = "0.0.0.0"
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+# True = tidak print per event ke console (dipakai replay --quiet)
+QUIET = False
+
+# Metrics: endpoint Prometheus di localhost (0 = matikan), 1 dari N baris logcat diukur,
+# snapshot ke tabel `metrics` untuk dashboard tiap N detik (0 = matikan)
+METRICS_BIND_IP = "127.0.0.1"
+METRICS_PORT = 9108
+METRICS_SAMPLE_EVERY = 16
+METRICS_SNAPSHOT_INTERVAL = 10.0
+
+metrics = MetricsRegistry(sample_every=METRICS_SAMPLE_EVERY)
+M_READ = metrics.stage("logcat_read")
+M_PARSE = metrics.stage("parse")
+M_CLASSIFY = metrics.stage("classify")
+M_DETECT = metrics.stage("detect")
+M_BRIDGE_PARSE = metrics.stage("bridge_parse")
+M_PROC_VERIFY = metrics.stage("proc_verify")
+M_EMIT = metrics.stage("emit")
+M_DREAD = metrics.stage("dread")
+M_DB_WRITE = metrics.stage("db_write")
+M_UDP_SEND = metrics.stage("udp_send")
+
+# Encoding datagram: "json" (terbaca di Wireshark) atau "binary" (compact)
+TELEMETRY_ENCODING = "json"
+
+telemetry = TelemetryEmitter((WIRESHARK_IP, WIRESHARK_PORT), encoding=TELEMETRY_ENCODING,
+                             on_send=M_UDP_SEND.observe)
+
+# Setting DB writer (group commit: 500 baris atau 50 ms)
+DB_BATCH_SIZE = 500
+DB_FLUSH_INTERVAL = 0.05
+
+writer = EventWriter(DB_FILE, batch_size=DB_BATCH_SIZE, flush_interval=DB_FLUSH_INTERVAL,
+                     on_commit=M_DB_WRITE.observe)
+
+# Event bus: dashboard / listener subscribe ke localhost TCP (0 = matikan).
+# Tiap subscriber punya buffer BUS_BUFFER event; kalau penuh "drop_oldest" atau "disconnect".
+BUS_BIND_IP = "127.0.0.1"
+BUS_PORT = 9200
+BUS_BUFFER = 10000
+BUS_POLICY = "drop_oldest"
+
+# Retention: event > 24 jam (atau DB > 512 MB) dipindah ke archive/*.jsonl.gz tiap 5 menit
+ARCHIVE_DIR = "archive"
+RETENTION_MAX_AGE_HOURS = 24.0
+RETENTION_MAX_DB_MB = 512.0
+RETENTION_INTERVAL = 300.0
+
+# Event berulang (event, source) dalam window ini dilipat jadi satu baris (0 = matikan)
+COALESCE_WINDOW = 5.0
+
+# Rate detector: event per (device, source, event) di sliding window RATE_WINDOW detik.
+# Lebih dari RATE_THRESHOLD per menit -> event HIGH_FREQ (0 = matikan).
+# RATE_THRESHOLDS override per event di atas rate.DEFAULT_THRESHOLDS (AMAN / INFO tidak
+# dicek), mis. {"AMAN": 6000} untuk tetap mengawasi Maps di atas rate normalnya.
+RATE_WINDOW = 60.0
+RATE_THRESHOLD = 50
+RATE_THRESHOLDS = {}
+RATE_MAX_KEYS = 4096
 
 # Daftar Aplikasi Cheat untuk dicek
 FAKE_KEYWORDS = [
@@ -29,44 +99,54 @@ FAKE_KEYWORDS = [
     "com.incorporateapps.fakegps"
 ]
 
+# Kata pemicu (substring, case-insensitive)
+FAKE_TRIGGER_WORDS = ["start", "service", "provider", "enabled"]
+MAPS_PACKAGE = "com.google.android.apps.maps"
+MAPS_TRIGGER_WORDS = ["location", "gps", "latitude", "longitude"]
+
+# Filter tag yang dikirim ke `adb logcat` (mis. ["LOCSHIELD_BRIDGE:E", "ActivityManager:I",
+# "LocationManagerService:D"]). Kosong = device kirim semua baris.
+# ActivityManager sebaiknya ikut, marker start/died-nya dipakai ProcessTracker.
+LOGCAT_TAG_FILTERS = []
+# Tag yang body-nya di-scan untuk FAKE / MAPS. None = semua tag.
+WATCH_TAGS = None
+
+# Process tracker: satu sesi `adb shell` persistent per device, poll `ps -A` tiap 1 detik
+PS_POLL_INTERVAL = 1.0
+PS_TTL = 5.0
+
+# Multi-device: `adb devices` dicek ulang tiap 2 detik untuk hot-plug
+DEVICE_POLL_INTERVAL = 2.0
+
 # ==============================================================================
 # DATABASE
 # ==============================================================================
-def init_db():
+def init_db(mode="live"):
+    """
+    Migrasi skema (PRAGMA user_version) lalu buka sesi baru. Tidak ada DROP TABLE:
+    history dari run sebelumnya tetap ada, tiap run punya id sesi sendiri.
+    """
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute('DROP TABLE IF EXISTS logs')
-        c.execute('''CREATE TABLE logs 
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                  timestamp TEXT, event TEXT, source TEXT, risk INTEGER, msg TEXT, 
-                  dread_score INTEGER DEFAULT 0)''')
-        conn.commit()
+        session = storage.init_db(DB_FILE, mode)
+        conn = storage.connect(DB_FILE)
+        ensure_incremental_vacuum(conn)
         conn.close()
-        print("[DB] Database initialized successfully")
+        writer.session = session
+        print(f"[DB] Database initialized successfully (schema v{storage.SCHEMA_VERSION}, session {session})")
+        return session
     except Exception as e:
         print(f"[DB ERROR] {e}")
+        return None
 
 # ==============================================================================
 # NETWORK & LOGGING
 # ==============================================================================
-def send_to_wireshark(status, app_name, details, risk=0):
-    try:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-        payload = {
-            "timestamp": timestamp,
-            "status": status,
-            "app": app_name,
-            "risk": risk,
-            "details": details
-        }
-        msg = json.dumps(payload)
-        sock.sendto(msg.encode('utf-8'), (WIRESHARK_IP, WIRESHARK_PORT))
-        
-        color = "\033[96m"
-        print(f"{color}[NETWORK] UDP -> {WIRESHARK_IP}:{WIRESHARK_PORT} | {status[:30]}\033[0m")
-    except Exception as e:
-        pass
+def send_to_wireshark(status, app_name, details, risk=0, dread=0, device=None, count=1):
+    """
+    Antrikan event ke TelemetryEmitter. Encoding, batching sampai MTU, sequence number
+    dan socket send semuanya di thread emitter, jadi thread logcat tidak pernah menunggu.
+    """
+    telemetry.send(status, app_name, details, risk, dread, device, count)
 
 def calculate_dread(event_type):
     dread_matrix = {
@@ -82,9 +162,16 @@ def calculate_dread(event_type):
         scores = dread_matrix.get(event_type, {"D": 5, "R": 5, "E": 5, "A": 5, "Disc": 5})
     return sum(scores.values()), scores
 
-def log_event(status, source, risk, msg):
-    ts = datetime.now().strftime("%H:%M:%S")
+def log_event(status, source, risk, msg, device=None, count=1, first_seen=None, last_seen=None):
+    now = time.time()
+    ts = datetime.fromtimestamp(now).strftime("%H:%M:%S")
+    t0 = time.perf_counter()
     dread_total, dread_detail = calculate_dread(status)
+    M_DREAD.observe(time.perf_counter() - t0)
+    metrics.counter("events_total", "Event yang keluar dari coalescer (satu baris DB)", status=status).inc()
+    first_ts = datetime.fromtimestamp(first_seen).strftime("%H:%M:%S") if first_seen else ts
+    last_ts = datetime.fromtimestamp(last_seen).strftime("%H:%M:%S") if last_seen else ts
+    repeat = f" (x{count} {first_ts}-{last_ts})" if count > 1 else ""
     
     color = "\033[97m"  # White
     if status == "AMAN": 
@@ -94,42 +181,343 @@ def log_event(status, source, risk, msg):
     elif "ATTACK" in status or "THREAT" in status or risk >= 7: 
         color = "\033[91m"  # Merah
     
-    print(f"{color}[{ts}] {status} | {source} | Risk:{risk} | DREAD:{dread_total}/50 | {msg}\033[0m")
+    if not QUIET:
+        prefix = f"[{device}] " if device else ""
+        print(f"{color}{prefix}[{ts}] {status} | {source} | Risk:{risk} | DREAD:{dread_total}/50 | {msg}{repeat}\033[0m")
     
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("INSERT INTO logs (timestamp, event, source, risk, msg, dread_score) VALUES (?, ?, ?, ?, ?, ?)",
-                  (ts, status, source, risk, msg, dread_total))
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        pass
+    # Tulis lewat background writer, tidak ada fsync di thread logcat.
+    # ts = waktu event terakhir (jam device saat replay), epoch ms
+    first_ms = int((first_seen or now) * 1000)
+    last_ms = int((last_seen or now) * 1000)
+    writer.submit((last_ms, status, source, risk, msg, dread_total, device, count, first_ms, last_ms))
 
-    details_full = f"{msg} | DREAD:{dread_total}"
-    send_to_wireshark(status, source, details_full, risk)
+    details_full = f"{msg} | DREAD:{dread_total}{repeat}"
+    send_to_wireshark(status, source, details_full, risk, dread_total, device, count)
+
+# Semua Detector lewat sini dulu sebelum log_event: rate detector -> coalescer -> sink.
+# Alarm HIGH_FREQ lewat coalescer.alert (flush ringkasan device dulu, tidak dilipat).
+coalescer = EventCoalescer(log_event, window=COALESCE_WINDOW)
+rate_detector = RateDetector(coalescer.submit, coalescer.alert, window=RATE_WINDOW, threshold=RATE_THRESHOLD,
+                             thresholds=RATE_THRESHOLDS, max_keys=RATE_MAX_KEYS)
 
 # ==============================================================================
 # HELPER: CEK PROSES AKTIF (AUTO-VERIFY)
 # ==============================================================================
-def check_is_process_running():
+def check_is_process_running(tracker):
     """
-    Fungsi ini melakukan double-check ke sistem Android.
-    Mengembalikan True jika aplikasi Fake GPS masih jalan.
+    Fungsi ini melakukan double-check ke sistem Android (device milik tracker).
+    Mengembalikan True jika aplikasi Fake GPS masih jalan, False jika sudah mati,
+    None jika data ProcessTracker basi (adb shell macet) -> jangan ubah status.
+    Hanya membaca tabel pid di memori, tidak spawn `adb shell ps` lagi.
     """
-    try:
-        # ps -A mengambil semua proses yang jalan
-        cmd = [ADB_PATH, 'shell', 'ps', '-A']
-        # timeout 1 detik biar tidak bikin lag
-        output = subprocess.run(cmd, capture_output=True, text=True, errors='ignore', timeout=1.0).stdout.lower()
-        
-        for app in FAKE_KEYWORDS:
-            if app in output:
-                return True # MASIH JALAN!
-        return False # SUDAH MATI
-    except:
+    t0 = time.perf_counter()
+    result = tracker.is_running()
+    M_PROC_VERIFY.observe(time.perf_counter() - t0)
+    return result
+
+# ==============================================================================
+# DETEKSI (STATE PER STREAM LOGCAT)
+# ==============================================================================
+class Detector:
+    """
+    Pipeline deteksi untuk satu stream logcat: tracker -> classifier -> aturan A/B/C.
+    Dipakai oleh DeviceMonitor (live, satu per device) dan replay (file capture).
+    """
+
+    def __init__(self, classifier, tracker, device=None):
+        self.classifier = classifier
+        self.tracker = tracker
+        self.device = device
+        self.is_fake_gps_active = False
+        self.events = 0
+        self.lines = metrics.counter("lines_total", "Baris logcat yang diproses", device=device or "")
+        self.lag = metrics.lag(device)
+
+    def emit(self, status, source, risk, msg):
+        self.events += 1
+        t0 = time.perf_counter()
+        rate_detector.submit(status, source, risk, msg, self.device)
+        M_EMIT.observe(time.perf_counter() - t0)
+
+    def startup_scan(self):
+        if check_is_process_running(self.tracker):
+            self.is_fake_gps_active = True
+            self.emit("FAKE GPS DETECTED", "Startup Scan", 9, "Cheat App Found Running in Background!")
+            return True
         return False
 
+    def process(self, record):
+        self.tracker.observe(record)
+        match = self.classifier.classify_record(record)
+        if match is not None:
+            self.handle(match[0], record)
+
+    def process_sampled(self, record):
+        """Sama dengan process() tapi tiap stage diukur; dipanggil untuk 1 dari N baris."""
+        perf = time.perf_counter
+        self.lines.inc(metrics.sample_every)
+        self.lag.observe(max(0.0, time.time() - record_epoch(record)))
+        t0 = perf()
+        self.tracker.observe(record)
+        match = self.classifier.classify_record(record)
+        t1 = perf()
+        M_CLASSIFY.observe(t1 - t0)
+        if match is not None:
+            self.handle(match[0], record)
+            M_DETECT.observe(perf() - t1)
+
+    def handle(self, category, record):
+        # --- A. DETEKSI LOG FAKE GPS ---
+        # Jika log muncul, pasti aktif
+        if category == CATEGORY_FAKE:
+            if not self.is_fake_gps_active:
+                self.emit("FAKE GPS DETECTED", "System Monitor", 9, "Mock Location ACTIVATED")
+            self.is_fake_gps_active = True
+
+        # --- B. TOMBOL ATTACK ---
+        elif category == CATEGORY_BRIDGE:
+            try:
+                message = record.message
+                json_start = message.find('{')
+                if json_start != -1:
+                    t0 = time.perf_counter()
+                    json_str = message[json_start:].strip()
+                    json_str = re.sub(r'\x1b\[[0-9;]*m', '', json_str)
+                    data = json.loads(json_str)
+                    M_BRIDGE_PARSE.observe(time.perf_counter() - t0)
+                    risk = data.get('risk', 0)
+                    event = data.get('event', '')
+                    
+                    if risk >= 8 or "THREAT" in event:
+                        status = "ATTACKED"
+                    elif "AUDIT" in event:
+                        status = "AUDIT"
+                    else:
+                        status = "INFO"
+                    
+                    self.emit(status, data.get('source', 'LocShield'), risk, data.get('msg', ''))
+            except:
+                pass
+
+        # --- C. GOOGLE MAPS (DENGAN AUTO-VERIFY) ---
+        elif category == CATEGORY_MAPS:
+            # LOGIC BARU: Jika status ACTIVE, kita cek ulang benarkah masih jalan?
+            # Cek ke tabel ProcessTracker cukup murah untuk dilakukan tiap event
+            if self.is_fake_gps_active:
+                is_still_running = check_is_process_running(self.tracker)
+                
+                if is_still_running is False:
+                    # TAHU-TAHU MATI? Reset status!
+                    self.is_fake_gps_active = False
+                    self.emit("INFO", "System Monitor", 1, "Fake GPS Process Disappeared (Normalized)")
+
+            # LOGGING BERDASARKAN HASIL VERIFIKASI
+            if self.is_fake_gps_active:
+                self.emit("USER USED FAKE GPS TO MAPS", "Google Maps", 10, 
+                          "SPOOFING ATTACK! Accessing Maps while FakeGPS Process is RUNNING")
+            else:
+                self.emit("AMAN", "Google Maps", 1, "Real GPS Access Verified (System Clean)")
+
+
+def build_classifier():
+    return LineClassifier(FAKE_KEYWORDS, FAKE_TRIGGER_WORDS, MAPS_PACKAGE, MAPS_TRIGGER_WORDS,
+                          watch_tags=WATCH_TAGS)
+
+
+def print_writer_stats():
+    cstats = coalescer.stats()
+    print(f"[COALESCE] {cstats['events_in']} events -> {cstats['rows_out']} rows "
+          f"({cstats['folded']} folded)")
+    rstats = rate_detector.stats()
+    print(f"[RATE] {rstats['alerts']} HIGH_FREQ alerts, {rstats['keys']} keys tracked "
+          f"({rstats['evicted']} evicted)")
+    tstats = telemetry.stats()
+    print(f"[NETWORK] {tstats['events_sent']} events in {tstats['datagrams_sent']} datagrams "
+          f"({tstats['events_per_datagram']:.1f}/datagram), dropped {tstats['events_dropped']}, "
+          f"errors {tstats['send_errors']}")
+    stats = writer.stats()
+    print(f"[DB] {stats['rows_written']} rows, {stats['commits']} commits, "
+          f"avg commit {stats['avg_commit_ms']:.2f} ms, max {stats['max_commit_ms']:.2f} ms, "
+          f"dropped {stats['rows_dropped']}")
+
+
+def collect_component_stats():
+    """Stats writer / telemetry / coalescer untuk endpoint metrics (dibaca saat scrape saja)."""
+    w, t, c, r = writer.stats(), telemetry.stats(), coalescer.stats(), rate_detector.stats()
+    return [
+        ("db_rows_written_total", "counter", "Baris yang sudah di-commit", {}, w["rows_written"]),
+        ("db_rows_dropped_total", "counter", "Baris di-drop karena queue writer penuh", {}, w["rows_dropped"]),
+        ("db_commits_total", "counter", "Jumlah commit SQLite", {}, w["commits"]),
+        ("db_queue_depth", "gauge", "Baris yang menunggu di queue writer", {}, w["queue_depth"]),
+        ("udp_events_sent_total", "counter", "Event terkirim lewat UDP", {}, t["events_sent"]),
+        ("udp_events_dropped_total", "counter", "Event UDP di-drop (queue penuh)", {}, t["events_dropped"]),
+        ("udp_datagrams_sent_total", "counter", "Datagram UDP terkirim", {}, t["datagrams_sent"]),
+        ("udp_send_errors_total", "counter", "Error sendto", {}, t["send_errors"]),
+        ("udp_queue_depth", "gauge", "Event yang menunggu di queue emitter", {}, t["queue_depth"]),
+        ("coalesce_events_in_total", "counter", "Event masuk coalescer", {}, c["events_in"]),
+        ("coalesce_folded_total", "counter", "Event yang dilipat coalescer", {}, c["folded"]),
+        ("coalesce_open_runs", "gauge", "Run coalescing yang masih terbuka", {}, c["open_runs"]),
+        ("rate_alerts_total", "counter", "Event HIGH_FREQ dari rate detector", {}, r["alerts"]),
+        ("rate_keys", "gauge", "Window (device, source, event) yang dilacak rate detector", {}, r["keys"]),
+        ("rate_evicted_total", "counter", "Window rate detector yang dibuang (LRU)", {}, r["evicted"]),
+    ]
+
+
+metrics.add_collector(collect_component_stats)
+bus = None
+
+
+def collect_bus_stats():
+    if bus is None:
+        return []
+    b = bus.stats()
+    return [
+        ("bus_subscribers", "gauge", "Subscriber event bus yang tersambung", {}, b["subscribers"]),
+        ("bus_events_published_total", "counter", "Event yang di-publish ke event bus", {}, b["events_published"]),
+        ("bus_events_dropped_total", "counter", "Event bus di-drop untuk subscriber lambat", {},
+         b["events_dropped"]),
+    ]
+
+
+metrics.add_collector(collect_bus_stats)
+
+
+def start_bus():
+    """Event bus di BUS_PORT; writer publish tiap batch yang sudah di-commit."""
+    global bus
+    if not BUS_PORT:
+        return None
+    bus = EventBus(DB_FILE, BUS_BIND_IP, BUS_PORT, buffer_size=BUS_BUFFER, history=BUS_BUFFER,
+                   policy=BUS_POLICY)
+    if not bus.start():
+        bus = None
+        return None
+    writer.on_publish = bus.publish
+    return bus
+
+
+def stop_bus():
+    global bus
+    if bus is not None:
+        writer.on_publish = None
+        bus.close()
+        b = bus.stats()
+        print(f"[BUS] {b['events_published']} events published to {b['subscribers_total']} subscriber(s), "
+              f"dropped {b['events_dropped']}")
+        bus = None
+
+
+def start_metrics():
+    """Endpoint HTTP + snapshotter tabel `metrics`. Return snapshotter (None kalau mati)."""
+    if METRICS_PORT:
+        MetricsServer(metrics, METRICS_BIND_IP, METRICS_PORT).start()
+    if METRICS_SNAPSHOT_INTERVAL > 0:
+        snapshotter = MetricsSnapshotter(metrics, DB_FILE, METRICS_SNAPSHOT_INTERVAL)
+        snapshotter.start()
+        return snapshotter
+    return None
+
+# ==============================================================================
+# MULTI-DEVICE
+# ==============================================================================
+def list_devices():
+    """Serial dari `adb devices` yang statusnya 'device' (bukan offline / unauthorized)."""
+    try:
+        output = subprocess.run([ADB_PATH, 'devices'], capture_output=True, text=True,
+                                errors='ignore', timeout=5.0).stdout
+    except Exception:
+        return []
+    serials = []
+    for line in output.splitlines()[1:]:
+        parts = line.split()
+        if len(parts) >= 2 and parts[1] == "device":
+            serials.append(parts[0])
+    return serials
+
+
+class DeviceMonitor:
+    """
+    Satu thread per device: `adb -s SERIAL logcat` + ProcessTracker + Detector sendiri.
+    Semua device berbagi writer (batched) dan socket UDP yang sama.
+    """
+
+    def __init__(self, serial):
+        self.serial = serial
+        self.tracker = ProcessTracker(ADB_PATH, FAKE_KEYWORDS, serial=serial,
+                                      poll_interval=PS_POLL_INTERVAL, ttl=PS_TTL)
+        self.detector = Detector(build_classifier(), self.tracker, device=serial)
+        self.process = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"DeviceMonitor-{serial}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def stop(self):
+        self._stop.set()
+        if self.process is not None:
+            self.process.terminate()
+        self.tracker.stop()
+        self._thread.join(2.0)
+
+    def _run(self):
+        serial = self.serial
+        self.tracker.start()
+
+        # 1. STARTUP SCAN
+        print(f"[ENGINE] [{serial}] Startup Scan...")
+        if not self.tracker.wait_ready(3.0):
+            print(f"\033[93m[WARN] [{serial}] Process tracker belum dapat snapshot ps, "
+                  f"lanjut tanpa verifikasi awal\033[0m")
+        if not self.detector.startup_scan():
+            print(f"[INFO] [{serial}] Clean startup. No cheats found.")
+
+        # 2. MONITORING
+        subprocess.run([ADB_PATH, '-s', serial, 'logcat', '-c'], capture_output=True)
+        cmd = build_logcat_cmd(ADB_PATH, LOGCAT_TAG_FILTERS, serial=serial)
+        self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        text=True, encoding='utf-8', errors='ignore', bufsize=1)
+        if self._stop.is_set():
+            self.process.terminate()
+        print(f"[ENGINE] [{serial}] Monitoring started... (Realtime)")
+
+        readline = self.process.stdout.readline
+        detector = self.detector
+        every = metrics.sample_every
+        perf = time.perf_counter
+        n = 0
+        try:
+            while True:
+                n += 1
+                if n % every:
+                    line = readline()
+                    if not line:
+                        break
+                    record = parse_threadtime_line(line)
+                    if record is not None:
+                        detector.process(record)
+                    continue
+
+                # Baris sampel: ukur read (termasuk tunggu logcat), parse, lag, classify, detect
+                t0 = perf()
+                line = readline()
+                t1 = perf()
+                if not line:
+                    break
+                record = parse_threadtime_line(line)
+                M_READ.observe(t1 - t0)
+                M_PARSE.observe(perf() - t1)
+                if record is not None:
+                    detector.process_sampled(record)
+        finally:
+            self.process.terminate()
+            self.tracker.stop()
+            if not self._stop.is_set():
+                print(f"\033[93m[ENGINE] [{serial}] Logcat stream ended (device disconnected?)\033[0m")
+
 # ==============================================================================
 # ENGINE UTAMA
 # ==============================================================================
@@ -137,106 +525,232 @@ def start_engine():
     if not os.path.exists(ADB_PATH):
         print(f"\033[91m[ERROR] ADB tidak ditemukan di {ADB_PATH}\033[0m")
         return
-    
-    try:
-        subprocess.run([ADB_PATH, 'devices'], capture_output=True)
-    except:
-        pass
 
-    init_db()
+    session = init_db("live")
+    start_bus()
+    writer.start()
+    telemetry.start()
+    coalescer.start()
+    snapshotter = start_metrics()
+    retention = RetentionManager(DB_FILE, ARCHIVE_DIR, RETENTION_MAX_AGE_HOURS, RETENTION_MAX_DB_MB,
+                                 RETENTION_INTERVAL)
+    retention.start()
     
     print("\033[92m" + "="*70)
     print("🔥 LOCSHIELD TURBO ENGINE - AUTO VERIFY MODE ACTIVATED 🔥")
     print("="*70 + "\033[0m")
     print(f"[INFO] System will auto-verify if Fake GPS is killed.")
-    
-    # --- VARIABEL STATE ---
-    IS_FAKE_GPS_ACTIVE = False 
-    last_verify_time = 0 
-
-    # 1. STARTUP SCAN
-    print("[ENGINE] Startup Scan...")
-    if check_is_process_running():
-        IS_FAKE_GPS_ACTIVE = True
-        log_event("FAKE GPS DETECTED", "Startup Scan", 9, "Cheat App Found Running in Background!")
-    else:
-        print("[INFO] Clean startup. No cheats found.")
-
-    # 2. MONITORING
-    subprocess.run([ADB_PATH, 'logcat', '-c']) 
-    
-    cmd = [ADB_PATH, 'logcat', '-v', 'threadtime']
-    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, 
-                               text=True, encoding='utf-8', errors='ignore', bufsize=1)
-
-    print("[ENGINE] Monitoring started... (Realtime)\n")
+    print(f"[INFO] Watching all devices from `adb devices` (hot-plug every {DEVICE_POLL_INTERVAL:.0f}s).")
 
+    monitors = {}
     try:
         while True:
-            line = process.stdout.readline()
-            if not line: 
-                continue 
-                
-            line_lower = line.lower()
-            now = time.time()
-
-            # --- A. DETEKSI LOG FAKE GPS ---
-            # Jika log muncul, pasti aktif
-            if any(keyword in line_lower for keyword in FAKE_KEYWORDS):
-                if any(x in line_lower for x in ["start", "service", "provider", "enabled"]):
-                    if not IS_FAKE_GPS_ACTIVE:
-                        log_event("FAKE GPS DETECTED", "System Monitor", 9, "Mock Location ACTIVATED")
-                    IS_FAKE_GPS_ACTIVE = True
-
-            # --- B. TOMBOL ATTACK ---
-            elif "LOCSHIELD_BRIDGE" in line:
-                try:
-                    json_start = line.find('{')
-                    if json_start != -1:
-                        json_str = line[json_start:].strip()
-                        json_str = re.sub(r'\x1b\[[0-9;]*m', '', json_str)
-                        data = json.loads(json_str)
-                        risk = data.get('risk', 0)
-                        event = data.get('event', '')
-                        
-                        if risk >= 8 or "THREAT" in event:
-                            status = "ATTACKED"
-                        elif "AUDIT" in event:
-                            status = "AUDIT"
-                        else:
-                            status = "INFO"
-                        
-                        log_event(status, data.get('source', 'LocShield'), risk, data.get('msg', ''))
-                except:
-                    pass
-
-            # --- C. GOOGLE MAPS (DENGAN AUTO-VERIFY) ---
-            elif "com.google.android.apps.maps" in line_lower:
-                if any(x in line_lower for x in ["location", "gps", "latitude", "longitude"]):
-                    
-                    # LOGIC BARU: Jika status ACTIVE, kita cek ulang benarkah masih jalan?
-                    # Kita throttle cek ulang tiap 2 detik biar ga berat
-                    if IS_FAKE_GPS_ACTIVE and (now - last_verify_time > 2.0):
-                        is_still_running = check_is_process_running()
-                        last_verify_time = now
-                        
-                        if not is_still_running:
-                            # TAHU-TAHU MATI? Reset status!
-                            IS_FAKE_GPS_ACTIVE = False
-                            log_event("INFO", "System Monitor", 1, "Fake GPS Process Disappeared (Normalized)")
-
-                    # LOGGING BERDASARKAN HASIL VERIFIKASI
-                    if IS_FAKE_GPS_ACTIVE:
-                        log_event("USER USED FAKE GPS TO MAPS", "Google Maps", 10, 
-                                 "SPOOFING ATTACK! Accessing Maps while FakeGPS Process is RUNNING")
-                    else:
-                        log_event("AMAN", "Google Maps", 1, "Real GPS Access Verified (System Clean)")
+            serials = list_devices()
+
+            # Device baru (atau yang stream-nya putus tapi masih terdaftar) -> monitor baru
+            for serial in serials:
+                monitor = monitors.get(serial)
+                if monitor is None or not monitor.is_alive():
+                    if monitor is None:
+                        print(f"\033[92m[ENGINE] Device connected: {serial}\033[0m")
+                    monitors[serial] = DeviceMonitor(serial)
+                    monitors[serial].start()
+
+            # Device yang dicabut
+            for serial in list(monitors):
+                if serial not in serials:
+                    print(f"\033[93m[ENGINE] Device removed: {serial}\033[0m")
+                    monitors.pop(serial).stop()
+
+            if not monitors:
+                print("[ENGINE] Waiting for device...", end="\r")
+            time.sleep(DEVICE_POLL_INTERVAL)
 
     except KeyboardInterrupt:
         print("\n\033[92m[ENGINE] Shutting down...\033[0m")
     finally:
-        process.terminate()
-        sock.close()
+        for monitor in monitors.values():
+            monitor.stop()
+        retention.stop()
+        coalescer.close()
+        writer.close()
+        stop_bus()
+        telemetry.close()
+        if snapshotter is not None:
+            snapshotter.stop()
+        if session is not None:
+            storage.end_session(DB_FILE, session)
+        print_writer_stats()
+        metrics.report()
+
+# ==============================================================================
+# REPLAY (CAPTURE LOGCAT OFFLINE)
+# ==============================================================================
+def parse_speed(value):
+    """'max' -> 0 (tanpa jeda), 'realtime' -> 1.0, '10x' -> 10.0"""
+    value = value.lower()
+    if value == "max":
+        return 0.0
+    if value == "realtime":
+        return 1.0
+    if value.endswith("x"):
+        return float(value[:-1])
+    raise argparse.ArgumentTypeError(f"speed tidak valid: {value} (max | realtime | Nx)")
+
+
+def replay(capture_file, speed=0.0):
+    """
+    Jalankan pipeline deteksi yang sama dengan start_engine di atas file capture
+    `logcat -v threadtime`. speed 0 = secepatnya, 1.0 = realtime, N = N kali lebih cepat.
+    """
+    if not os.path.exists(capture_file):
+        print(f"\033[91m[ERROR] Capture tidak ditemukan: {capture_file}\033[0m")
+        return
+
+    session = init_db("replay")
+    start_bus()
+    writer.start()
+    telemetry.start()
+    snapshotter = start_metrics()
+
+    # Window coalescing mengikuti jam device di capture, bukan jam dinding
+    device_now = [0.0]
+    coalescer.clock = lambda: device_now[0]
+    rate_detector.clock = lambda: device_now[0]
+    last_flush = 0.0
+
+    # Tidak ada device: tracker hanya dari marker ActivityManager di capture
+    detector = Detector(build_classifier(), ProcessTracker(None, FAKE_KEYWORDS), device="replay")
+    every = metrics.sample_every
+
+    print(f"[REPLAY] {capture_file} (speed={'max' if not speed else f'{speed}x'})")
+
+    lines = records = 0
+    first_ts = None
+    wall_start = time.perf_counter()
+    perf = time.perf_counter
+    try:
+        with open(capture_file, encoding='utf-8', errors='ignore') as f:
+            while True:
+                sampled = not (lines + 1) % every
+                t0 = perf()
+                line = f.readline()
+                t1 = perf()
+                if not line:
+                    break
+                lines += 1
+
+                record = parse_threadtime_line(line)
+                t2 = perf()
+                if sampled:
+                    M_READ.observe(t1 - t0)
+                    M_PARSE.observe(t2 - t1)
+                    detector.lines.inc(every)
+                if record is None:
+                    continue
+                records += 1
+
+                if speed:
+                    # Tahan sampai jarak waktu device tercapai
+                    ts = record_epoch(record)
+                    if first_ts is None:
+                        first_ts = ts
+                    delay = (ts - first_ts) / speed - (perf() - wall_start)
+                    if delay > 0:
+                        time.sleep(delay)
+                    t2 = perf()
+
+                detector.tracker.observe(record)
+                match = detector.classifier.classify_record(record)
+                t3 = perf()
+                if sampled:
+                    M_CLASSIFY.observe(t3 - t2)
+                if match is not None:
+                    ts = device_now[0] = record_epoch(record)
+                    if ts - last_flush >= 1.0:
+                        coalescer.flush_expired(ts)
+                        last_flush = ts
+                    detector.handle(match[0], record)
+                    if sampled:
+                        M_DETECT.observe(perf() - t3)
+    except KeyboardInterrupt:
+        print("\n\033[93m[REPLAY] Interrupted\033[0m")
+    finally:
+        elapsed = time.perf_counter() - wall_start
+        coalescer.close()
+        writer.close()
+        stop_bus()
+        telemetry.close()
+        if snapshotter is not None:
+            snapshotter.stop()
+        if session is not None:
+            storage.end_session(DB_FILE, session)
+
+    print("\n" + "=" * 48)
+    print("REPLAY SUMMARY")
+    print("=" * 48)
+    print(f"Lines       : {lines} ({records} parsed)")
+    print(f"Events      : {detector.events}")
+    print(f"Elapsed     : {elapsed:.3f} s")
+    print(f"Lines/sec   : {lines / elapsed if elapsed else 0:,.0f}")
+    print(f"Events/sec  : {detector.events / elapsed if elapsed else 0:,.0f}")
+    print("=" * 48)
+    # detect sudah termasuk bridge_parse / proc_verify / emit (emit termasuk dread)
+    metrics.report()
+    print_writer_stats()
+
 
 if __name__ == "__main__":
-    start_engine()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="LocShield Turbo Engine")
+    parser.add_argument("--replay", metavar="CAPTURE", help="jalankan deteksi di file capture logcat threadtime")
+    parser.add_argument("--speed", type=parse_speed, default="max", help="max | realtime | Nx (default: max)")
+    parser.add_argument("--db", default=DB_FILE, help=f"file SQLite (default: {DB_FILE})")
+    parser.add_argument("--quiet", action="store_true", help="tidak print per event ke console")
+    parser.add_argument("--telemetry", choices=["json", "binary"], default=TELEMETRY_ENCODING,
+                        help=f"encoding datagram UDP (default: {TELEMETRY_ENCODING})")
+    parser.add_argument("--coalesce", type=float, default=COALESCE_WINDOW, metavar="SECONDS",
+                        help=f"window coalescing event berulang, 0 = matikan (default: {COALESCE_WINDOW})")
+    parser.add_argument("--rate-threshold", type=int, default=RATE_THRESHOLD, metavar="PER_MINUTE",
+                        help=f"event HIGH_FREQ kalau satu (device, source, event) lebih dari ini per menit, "
+                             f"AMAN / INFO tidak dicek, 0 = matikan (default: {RATE_THRESHOLD})")
+    parser.add_argument("--rate-window", type=float, default=RATE_WINDOW, metavar="SECONDS",
+                        help=f"panjang sliding window rate detector (default: {RATE_WINDOW})")
+    parser.add_argument("--retention-hours", type=float, default=RETENTION_MAX_AGE_HOURS, metavar="HOURS",
+                        help=f"arsip event lebih tua dari ini, 0 = tanpa batas umur (default: {RETENTION_MAX_AGE_HOURS})")
+    parser.add_argument("--max-db-mb", type=float, default=RETENTION_MAX_DB_MB, metavar="MB",
+                        help=f"batas ukuran data DB sebelum event lama diarsip, 0 = tanpa batas "
+                             f"(default: {RETENTION_MAX_DB_MB})")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR, help=f"folder archive (default: {ARCHIVE_DIR})")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help=f"port endpoint Prometheus di {METRICS_BIND_IP}, 0 = matikan (default: {METRICS_PORT})")
+    parser.add_argument("--metrics-sample", type=int, default=METRICS_SAMPLE_EVERY, metavar="N",
+                        help=f"ukur 1 dari N baris logcat (default: {METRICS_SAMPLE_EVERY})")
+    parser.add_argument("--metrics-snapshot", type=float, default=METRICS_SNAPSHOT_INTERVAL, metavar="SECONDS",
+                        help=f"interval snapshot ke tabel metrics, 0 = matikan (default: {METRICS_SNAPSHOT_INTERVAL})")
+    parser.add_argument("--bus-port", type=int, default=BUS_PORT,
+                        help=f"port event bus di {BUS_BIND_IP}, 0 = matikan (default: {BUS_PORT})")
+    parser.add_argument("--bus-policy", choices=["drop_oldest", "disconnect"], default=BUS_POLICY,
+                        help=f"kalau buffer subscriber penuh (default: {BUS_POLICY})")
+    args = parser.parse_args()
+
+    DB_FILE = args.db
+    writer.db_file = args.db
+    QUIET = args.quiet
+    telemetry.quiet = args.quiet
+    telemetry.encoding = args.telemetry
+    coalescer.window = args.coalesce
+    rate_detector.threshold = args.rate_threshold
+    rate_detector.window = args.rate_window
+    RETENTION_MAX_AGE_HOURS = args.retention_hours
+    RETENTION_MAX_DB_MB = args.max_db_mb
+    ARCHIVE_DIR = args.archive_dir
+    METRICS_PORT = args.metrics_port
+    METRICS_SNAPSHOT_INTERVAL = args.metrics_snapshot
+    metrics.sample_every = max(1, args.metrics_sample)
+    BUS_PORT = args.bus_port
+    BUS_POLICY = args.bus_policy
+
+    if args.replay:
+        replay(args.replay, args.speed)
+    else:
+        start_engine()
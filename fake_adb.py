@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Fake adb untuk load-test engine tanpa HP.
+
+Pakai:
+    chmod +x fake_adb.py
+    LOCSHIELD_ADB=$PWD/fake_adb.py FAKE_ADB_RATE=20000 python engine.py
+
+Command yang didukung (sama seperti adb asli):
+    devices
+    [-s SERIAL] logcat -c
+    [-s SERIAL] logcat -v threadtime [TAG:LEVEL ... *:S]
+    [-s SERIAL] shell ps -A
+    [-s SERIAL] shell                  (sesi interaktif, dipakai ProcessTracker)
+
+Konfigurasi lewat environment:
+    FAKE_ADB_SERIALS     daftar serial dipisah koma, atau @file (dibaca ulang tiap `devices`)
+    FAKE_ADB_RATE        baris logcat per detik per device (default 10000)
+    FAKE_ADB_DURATION    detik sebelum stream berhenti, 0 = selamanya (default 0)
+    FAKE_ADB_MAPS_RATIO  porsi baris lokasi Google Maps (default 0.01)
+    FAKE_ADB_BRIDGE_RATIO porsi payload LOCSHIELD_BRIDGE (default 0.001)
+    FAKE_ADB_FAKE_PERIOD detik per fase mock app hidup / mati (default 30)
+    FAKE_ADB_SEED        seed random (default: hash serial)
+"""
+import os
+import sys
+import time
+import json
+import random
+import zlib
+from datetime import datetime
+
+DEFAULT_SERIALS = "emulator-5554"
+FAKE_APPS = [
+    "com.lexa.fakegps",
+    "com.theappninjas.gpsjoystick",
+    "com.fly.gps",
+    "com.incorporateapps.fakegps",
+]
+BRIDGE_PACKAGE = "com.locshield.turbo"
+MAPS_PACKAGE = "com.google.android.apps.maps"
+
+NOISE_TAGS = ["chatty", "ActivityTaskManager", "WifiHAL", "BatteryStatsService", "SurfaceFlinger",
+              "InputDispatcher", "NetworkMonitor", "Zygote", "audio_hw", "GnssHAL"]
+
+# Payload sama seperti MainActivity.sendToPython (urutan field Gson: event, source, msg, risk)
+BRIDGE_PAYLOADS = [
+    ("THREAT_EVENT", "HIGH_FREQ_ACCESS | DoS Attack Simulation", 10),
+    ("AUDIT_RESULT", "Apps with GPS: [com.lexa.fakegps, com.google.android.apps.maps]", 5),
+    ("INFO", "Attack Stopped", 0),
+]
+
+
+def env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def list_serials():
+    value = os.environ.get("FAKE_ADB_SERIALS", DEFAULT_SERIALS)
+    if value.startswith("@"):
+        try:
+            with open(value[1:]) as f:
+                value = f.read().replace("\n", ",")
+        except OSError:
+            return []
+    return [s.strip() for s in value.split(",") if s.strip()]
+
+
+# ==============================================================================
+# STATE DEVICE (DETERMINISTIK DARI JAM, JADI LOGCAT DAN SHELL SELALU SEPAKAT)
+# ==============================================================================
+def device_state(serial, now=None):
+    """Return (mock_app atau None, pid) untuk serial ini pada waktu now."""
+    now = time.time() if now is None else now
+    period = env_float("FAKE_ADB_FAKE_PERIOD", 30.0)
+    offset = zlib.crc32(serial.encode()) % 1000 / 1000.0 * period
+    phase = int((now + offset) // period)
+    if phase % 2 == 0:
+        return None, 0
+    app = FAKE_APPS[(phase // 2) % len(FAKE_APPS)]
+    return app, 10000 + phase % 20000
+
+
+def ps_output(serial):
+    lines = ["USER           PID  PPID     VSZ    RSS WCHAN            ADDR S NAME",
+             "root             1     0 2170864   5964 0                   0 S init",
+             "system        1000     1 4512304 212340 0                   0 S system_server",
+             "u0_a150       2000  1000 1620452  98304 0                   0 S " + MAPS_PACKAGE]
+    app, pid = device_state(serial)
+    if app:
+        lines.append(f"u0_a201      {pid:>5}  1000 1320452  65536 0                   0 S {app}")
+    return "\n".join(lines) + "\n"
+
+
+# ==============================================================================
+# LOGCAT
+# ==============================================================================
+LEVEL_ORDER = "VDIWEFS"
+
+
+def parse_filters(args):
+    """["TAG:E", "*:S"] -> (dict tag->level, default level)"""
+    filters, default = {}, "V"
+    for spec in args:
+        tag, _, level = spec.partition(":")
+        level = (level or "V").upper()
+        if tag == "*":
+            default = level
+        else:
+            filters[tag] = level
+    return filters, default
+
+
+def logcat_stream(serial, filter_args):
+    rate = env_float("FAKE_ADB_RATE", 10000.0)
+    duration = env_float("FAKE_ADB_DURATION", 0.0)
+    maps_ratio = env_float("FAKE_ADB_MAPS_RATIO", 0.01)
+    bridge_ratio = env_float("FAKE_ADB_BRIDGE_RATIO", 0.001)
+    seed = os.environ.get("FAKE_ADB_SEED")
+    rng = random.Random(int(seed) if seed else zlib.crc32(serial.encode()))
+    filters, default_level = parse_filters(filter_args)
+
+    def allowed(tag, level):
+        minimum = filters.get(tag, default_level)
+        return minimum != "S" and LEVEL_ORDER.index(level) >= LEVEL_ORDER.index(minimum)
+
+    out = sys.stdout
+    out.write("--------- beginning of main\n")
+    start = time.time()
+    sent = 0
+    prev_app, prev_pid = device_state(serial, start)
+    tick = 0.01
+
+    while True:
+        now = time.time()
+        if duration and now - start >= duration:
+            break
+        header = datetime.fromtimestamp(now).strftime("%m-%d %H:%M:%S.%f")[:-3]
+        batch = []
+
+        # Lifecycle mock app (start / died) mengikuti device_state
+        app, pid = device_state(serial, now)
+        if app != prev_app:
+            if prev_app:
+                batch.append(("ActivityManager", "I", 1000,
+                              f"Process {prev_app} (pid {prev_pid}) has died: fg SVC"))
+            if app:
+                batch.append(("ActivityManager", "I", 1000,
+                              f"Start proc {pid}:{app}/u0a201 for service {app}/.MockLocationService"))
+                batch.append(("LocationManagerService", "I", 1000,
+                              f"test provider gps enabled by {app}"))
+            prev_app, prev_pid = app, pid
+
+        # Jumlah baris yang harus sudah terkirim sampai detik ini
+        due = int((now - start) * rate) - sent
+        for _ in range(max(due, 0)):
+            r = rng.random()
+            if r < maps_ratio:
+                lat = -6.2 + rng.random() / 100
+                lon = 106.8 + rng.random() / 100
+                batch.append(("LocationManagerService", "D", 1000,
+                              f"location request from {MAPS_PACKAGE} provider=gps "
+                              f"latitude={lat:.6f} longitude={lon:.6f}"))
+            elif r < maps_ratio + bridge_ratio:
+                event, msg, risk = rng.choice(BRIDGE_PAYLOADS)
+                payload = json.dumps({"event": event, "source": BRIDGE_PACKAGE, "msg": msg, "risk": risk})
+                batch.append(("LOCSHIELD_BRIDGE", "E", 3000, payload))
+            else:
+                tag = rng.choice(NOISE_TAGS)
+                batch.append((tag, "D", rng.randint(100, 9999),
+                              f"routine status update seq={sent + len(batch)} value={rng.randint(0, 99999)}"))
+
+        lines = []
+        for tag, level, pid_, message in batch:
+            if not allowed(tag, level):
+                continue
+            lines.append(f"{header} {pid_:>5} {pid_ + 7:>5} {level} {tag:<8}: {message}\n")
+        sent += max(due, 0)
+
+        try:
+            out.write("".join(lines))
+            out.flush()
+        except BrokenPipeError:
+            return
+        time.sleep(tick)
+
+
+# ==============================================================================
+# SHELL
+# ==============================================================================
+def run_shell_command(serial, command):
+    out = []
+    for part in command.split(";"):
+        argv = part.split()
+        if not argv:
+            continue
+        if argv[0] == "ps":
+            out.append(ps_output(serial))
+        elif argv[0] == "echo":
+            out.append(" ".join(argv[1:]) + "\n")
+        else:
+            out.append(f"/system/bin/sh: {argv[0]}: not found\n")
+    return "".join(out)
+
+
+def interactive_shell(serial):
+    for line in sys.stdin:
+        try:
+            sys.stdout.write(run_shell_command(serial, line.strip()))
+            sys.stdout.flush()
+        except BrokenPipeError:
+            return
+
+
+# ==============================================================================
+# MAIN
+# ==============================================================================
+def main(argv):
+    serial = None
+    if len(argv) >= 2 and argv[0] == "-s":
+        serial, argv = argv[1], argv[2:]
+
+    if not argv:
+        print("Android Debug Bridge (fake)")
+        return 0
+
+    serials = list_serials()
+    if argv[0] == "devices":
+        print("List of devices attached")
+        for s in serials:
+            print(f"{s}\tdevice")
+        print()
+        return 0
+
+    if serial is None:
+        if len(serials) > 1:
+            sys.stderr.write("adb: more than one device/emulator\n")
+            return 1
+        if not serials:
+            sys.stderr.write("adb: no devices/emulators found\n")
+            return 1
+        serial = serials[0]
+    elif serial not in serials:
+        sys.stderr.write(f"adb: device '{serial}' not found\n")
+        return 1
+
+    if argv[0] == "logcat":
+        if "-c" in argv:
+            return 0
+        filter_args = [a for a in argv[1:] if ":" in a]
+        try:
+            logcat_stream(serial, filter_args)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if argv[0] == "shell":
+        if len(argv) == 1:
+            interactive_shell(serial)
+        else:
+            sys.stdout.write(run_shell_command(serial, " ".join(argv[1:])))
+        return 0
+
+    sys.stderr.write(f"fake adb: unsupported command: {' '.join(argv)}\n")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
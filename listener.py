@@ -1,50 +1,299 @@
+import asyncio
+import heapq
 import socket
-import json
+import argparse
+import time
 from datetime import datetime
 
-# Create UDP socket
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.bind(('127.0.0.1', 9999))
+from telemetry import decode_datagram
+from bus import BusSubscriber
+from pcapng import PcapngWriter
 
-print("\033[92m" + "="*70)
-print("🎧 UDP LISTENER STARTED - Port 9999")
-print("="*70 + "\033[0m")
-print("Waiting for packets from engine.py...\n")
+parser = argparse.ArgumentParser(description="LocShield listener: subscriber event bus engine (atau UDP lama)")
+parser.add_argument("--host", default="127.0.0.1", help="host event bus / bind UDP (default: 127.0.0.1)")
+parser.add_argument("--port", type=int, default=None, help="port event bus (9200) atau UDP (9999)")
+parser.add_argument("--udp", action="store_true", help="terima datagram UDP telemetry seperti versi lama")
+parser.add_argument("--resume", type=int, default=None, metavar="ID",
+                    help="mulai dari event sesudah id ini (bus saja, default: hanya event baru)")
+parser.add_argument("--rcvbuf", type=int, default=8 * 1024 * 1024, metavar="BYTES",
+                    help="SO_RCVBUF socket UDP (default: 8 MiB; Linux dibatasi net.core.rmem_max)")
+parser.add_argument("--interval", type=float, default=1.0, metavar="SECONDS",
+                    help="interval ringkasan console (default: 1)")
+parser.add_argument("--top", type=int, default=5, help="jumlah event risk tertinggi per ringkasan (default: 5)")
+parser.add_argument("--verbose", action="store_true", help="print semua event seperti versi lama")
+parser.add_argument("--pcap", metavar="PREFIX", help="mode UDP: tulis datagram ke PREFIX-*.pcapng (rotating)")
+parser.add_argument("--pcap-max-mb", type=float, default=64.0, help="ukuran per file pcapng (default: 64)")
+parser.add_argument("--pcap-keep", type=int, default=10, help="jumlah file pcapng disimpan (default: 10)")
+args = parser.parse_args()
 
-packet_count = 0
+event_count = 0
+lost_packets = 0
 
-try:
+
+def print_event(number, label, timestamp, status, app, risk, details):
+    # Color based on risk
+    if risk >= 8:
+        color = "\033[91m"  # Red
+    elif risk >= 5:
+        color = "\033[93m"  # Yellow
+    else:
+        color = "\033[92m"  # Green
+
+    # Print formatted
+    print(f"{color}[Event #{number} | {label}] {timestamp}")
+    print(f"  Status: {status}")
+    print(f"  App: {app}")
+    print(f"  Risk: {risk}/10")
+    print(f"  Details: {details[:80]}...")
+    print("\033[0m")
+
+
+class TopEvents:
+    """
+    Ringkasan console per interval (mode bus dan UDP): jumlah event di interval ini
+    dan top-N event berdasarkan risk (heap kecil, O(log N) per event).
+    """
+
+    def __init__(self, top=5):
+        self.top = top
+        self.events = 0
+        self._heap = []     # (risk, n, (timestamp, status, app, details))
+        self._n = 0
+
+    def add(self, risk, timestamp, status, app, details):
+        self.events += 1
+        self._n += 1
+        heap = self._heap
+        if len(heap) < self.top:
+            heapq.heappush(heap, (risk, self._n, (timestamp, status, app, details)))
+        elif self.top and risk > heap[0][0]:
+            heapq.heapreplace(heap, (risk, self._n, (timestamp, status, app, details)))
+
+    def print_and_reset(self):
+        for risk, _, (timestamp, status, app, details) in sorted(self._heap, key=lambda item: (-item[0], item[1])):
+            if risk >= 8:
+                color = "\033[91m"
+            elif risk >= 5:
+                color = "\033[93m"
+            else:
+                color = "\033[92m"
+            print(f"  {color}risk {risk:>2} {timestamp} {status} | {app} | {(details or '')[:60]}\033[0m")
+        self._heap = []
+        self.events = 0
+
+
+def run_bus():
+    """
+    Subscriber event bus: event didorong engine begitu di-commit, tanpa polling.
+    poll() sudah menguras semua yang antre di socket (satu batch); console hanya
+    ringkasan per `--interval` (event/s + top-N risk), atau semua event dengan --verbose.
+    """
+    global event_count, lost_packets
+    port = args.port or 9200
+    sub = BusSubscriber(args.host, port, resume_from=args.resume)
+    summary = TopEvents(args.top)
+
+    print("\033[92m" + "="*70)
+    print(f"🎧 EVENT BUS LISTENER STARTED - {args.host}:{port}")
+    print("="*70 + "\033[0m")
+    print("Waiting for events from engine.py...\n")
+
+    connected = False
+    last = time.perf_counter()
     while True:
-        # Receive data
-        data, addr = sock.recvfrom(4096)
-        packet_count += 1
-        
+        events = sub.poll(min(1.0, args.interval))
+        if events is None:
+            if connected:
+                print("\033[93m[Bus] Disconnected, reconnecting...\033[0m")
+                connected = False
+            time.sleep(1.0)
+            continue
+        if not connected:
+            print(f"\033[92m[Bus] Connected (last id {sub.last_id})\033[0m")
+            connected = True
+        if sub.dropped > lost_packets:
+            print(f"\033[91m[Gap] {sub.dropped - lost_packets} event(s) dropped by engine (slow consumer)\033[0m")
+            lost_packets = sub.dropped
+
+        for payload in events:
+            event_count += 1
+            risk = payload['risk'] or 0
+            summary.add(risk, payload['timestamp'], payload['event'], payload['source'], payload['msg'])
+            if args.verbose:
+                print_event(event_count, f"id {payload['id']}", payload['timestamp'], payload['event'],
+                            payload['source'], risk, payload['msg'])
+
+        now = time.perf_counter()
+        if now - last >= args.interval:
+            if summary.events:
+                print(f"\033[96m[{datetime.now().strftime('%H:%M:%S')}] {summary.events / (now - last):,.0f} events/s"
+                      f" | total {event_count} events, dropped by engine {lost_packets}, last id {sub.last_id}\033[0m")
+                summary.print_and_reset()
+            last = now
+
+
+# ==============================================================================
+# UDP (TELEMETRY ENGINE) - ASYNCIO
+# ==============================================================================
+def kernel_drops(port):
+    """Datagram yang dibuang kernel (buffer penuh) untuk socket UDP di `port`, None kalau tidak tersedia."""
+    try:
+        with open("/proc/net/udp") as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if int(fields[1].split(":")[1], 16) == port:
+                    return int(fields[-1])
+    except (OSError, ValueError, IndexError, StopIteration):
+        pass
+    return None
+
+
+class UdpListener(asyncio.DatagramProtocol):
+    """
+    datagram_received() lalu kuras semua datagram yang sudah antre di socket (non-blocking)
+    sampai `batch` paket, proses satu batch sekaligus. Console hanya ringkasan per
+    `interval` detik: paket / event per detik, gap sequence, top-N event berdasarkan risk.
+    """
+
+    def __init__(self, sock, top=5, interval=1.0, pcap=None, verbose=False, batch=1024):
+        self.sock = sock
+        self.local = sock.getsockname()
+        self.top = top
+        self.interval = interval
+        self.pcap = pcap
+        self.verbose = verbose
+        self.batch = batch
+
+        self.packets = 0
+        self.events = 0
+        self.lost = 0
+        self.restarts = 0
+        self.errors = 0
+        self.expected_seq = None
+        self.kernel_drops_start = kernel_drops(self.local[1])
+        self.summary = TopEvents(top)
+        self._window_packets = 0
+        self._window_lost = 0
+        self._n = 0
+
+    def datagram_received(self, data, addr):
+        now = time.time()
+        batch = [(data, addr)]
+        recvfrom = self.sock.recvfrom
         try:
-            # Decode and parse JSON
-            payload = json.loads(data.decode('utf-8'))
-            
-            # Color based on risk
-            if payload['risk'] >= 8:
-                color = "\033[91m"  # Red
-            elif payload['risk'] >= 5:
-                color = "\033[93m"  # Yellow
-            else:
-                color = "\033[92m"  # Green
-            
-            # Print formatted
-            print(f"{color}[Packet #{packet_count}] {payload['timestamp']}")
-            print(f"  Status: {payload['status']}")
-            print(f"  App: {payload['app']}")
-            print(f"  Risk: {payload['risk']}/10")
-            print(f"  Details: {payload['details'][:80]}...")
-            print("\033[0m")
-            
-        except json.JSONDecodeError:
-            print(f"\033[91m[Error] Invalid JSON: {data[:100]}\033[0m")
-        except Exception as e:
-            print(f"\033[91m[Error] {e}\033[0m")
-
-except KeyboardInterrupt:
-    print(f"\n\033[92mStopped. Total packets received: {packet_count}\033[0m")
-finally:
-    sock.close()
\ No newline at end of file
+            while len(batch) < self.batch:
+                batch.append(recvfrom(65535))
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            pass
+        self.process(batch, now)
+
+    def error_received(self, exc):
+        self.errors += 1
+
+    def process(self, batch, now):
+        summary = self.summary
+        for data, addr in batch:
+            self.packets += 1
+            self._window_packets += 1
+            if self.pcap is not None:
+                self.pcap.write(data, addr, self.local, now)
+            try:
+                # Decode batch (JSON / binary / format lama)
+                header, events = decode_datagram(data)
+            except Exception as e:
+                self.errors += 1
+                if self.verbose:
+                    print(f"\033[91m[Error] {e}: {data[:100]}\033[0m")
+                continue
+
+            # Loss accounting dari sequence number engine
+            seq = header['seq']
+            if seq is not None:
+                if self.expected_seq is not None and seq > self.expected_seq:
+                    self.lost += seq - self.expected_seq
+                    self._window_lost += seq - self.expected_seq
+                elif self.expected_seq is not None and seq < self.expected_seq:
+                    # seq < expected -> engine restart, mulai hitung dari awal
+                    self.restarts += 1
+                self.expected_seq = seq + 1
+
+            self.events += len(events)
+            for payload in events:
+                self._n += 1
+                risk = payload.get('risk') or 0
+                summary.add(risk, payload['timestamp'], payload['status'], payload['app'], payload['details'])
+                if self.verbose:
+                    print_event(self._n, f"Packet #{self.packets} seq {seq}", payload['timestamp'], payload['status'],
+                                payload['app'], risk, payload['details'])
+        if self.pcap is not None:
+            self.pcap.flush()
+
+    def report(self, elapsed):
+        drops = kernel_drops(self.local[1])
+        kernel = ""
+        if drops is not None and self.kernel_drops_start is not None:
+            kernel = f", kernel drops {drops - self.kernel_drops_start}"
+        loss_pct = self.lost / (self.packets + self.lost) * 100 if self.packets + self.lost else 0.0
+        color = "\033[91m" if self._window_lost else "\033[96m"
+        print(f"{color}[{datetime.now().strftime('%H:%M:%S')}] {self._window_packets / elapsed:,.0f} pkt/s, "
+              f"{self.summary.events / elapsed:,.0f} events/s | gap {self._window_lost} | "
+              f"total {self.packets} packets, {self.events} events, lost {self.lost} ({loss_pct:.2f}%)"
+              f"{kernel}\033[0m")
+        self.summary.print_and_reset()
+        self._window_packets = self._window_lost = 0
+
+
+async def serve_udp(host, port, rcvbuf, protocol_args):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if rcvbuf:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    sock.bind((host, port))
+    sock.setblocking(False)
+    listener = UdpListener(sock, **protocol_args)
+
+    print("\033[92m" + "="*70)
+    print(f"🎧 UDP LISTENER STARTED - Port {port}")
+    print("="*70 + "\033[0m")
+    print(f"SO_RCVBUF {sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)} bytes"
+          + (f", pcapng -> {listener.pcap.prefix}-*.pcapng" if listener.pcap is not None else ""))
+    print("Waiting for packets from engine.py...\n")
+
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(lambda: listener, sock=sock)
+    try:
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(listener.interval)
+            now = time.perf_counter()
+            if listener._window_packets:
+                listener.report(now - last)
+            last = now
+    finally:
+        transport.close()
+        if listener.pcap is not None:
+            listener.pcap.close()
+        print(f"\n\033[92mStopped. Total packets received: {listener.packets}, events: {listener.events}, "
+              f"lost packets: {listener.lost}\033[0m")
+
+
+def run_udp():
+    pcap = None
+    if args.pcap:
+        pcap = PcapngWriter(args.pcap, int(args.pcap_max_mb * 1024 * 1024), args.pcap_keep)
+    protocol_args = {"top": args.top, "interval": args.interval, "pcap": pcap, "verbose": args.verbose}
+    try:
+        asyncio.run(serve_udp(args.host, args.port or 9999, args.rcvbuf, protocol_args))
+    except KeyboardInterrupt:
+        pass
+
+
+if args.udp:
+    run_udp()
+else:
+    try:
+        run_bus()
+    except KeyboardInterrupt:
+        print(f"\n\033[92mStopped. Total events: {event_count}, dropped by engine: {lost_packets}\033[0m")
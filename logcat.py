@@ -0,0 +1,189 @@
+import re
+from datetime import datetime
+
+# ==============================================================================
+# KATEGORI
+# ==============================================================================
+CATEGORY_FAKE = "FAKE"
+CATEGORY_BRIDGE = "BRIDGE"
+CATEGORY_MAPS = "MAPS"
+
+LOG_LEVELS = frozenset("VDIWEFS")
+
+
+# ==============================================================================
+# PARSER THREADTIME
+# ==============================================================================
+class LogRecord:
+    """Satu baris `logcat -v threadtime` yang sudah dipecah."""
+
+    __slots__ = ("date", "time", "pid", "tid", "level", "tag", "message")
+
+    def __init__(self, date, time, pid, tid, level, tag, message):
+        self.date = date
+        self.time = time
+        self.pid = pid
+        self.tid = tid
+        self.level = level
+        self.tag = tag
+        self.message = message
+
+    def __repr__(self):
+        return (f"LogRecord({self.date} {self.time} {self.pid}/{self.tid} "
+                f"{self.level}/{self.tag}: {self.message[:40]!r})")
+
+
+def parse_threadtime_line(line):
+    """
+    Parse satu baris threadtime:
+        10-18 12:34:56.789  1234  5678 E LOCSHIELD_BRIDGE: {"event": ...}
+    Return LogRecord, atau None untuk baris yang bukan log (mis. "--------- beginning of main").
+    """
+    parts = line.rstrip("\r\n").split(None, 5)
+    if len(parts) < 6:
+        return None
+    date, time_, pid, tid, level, rest = parts
+    if level not in LOG_LEVELS or not pid.isdigit() or not tid.isdigit():
+        return None
+    tag, sep, message = rest.partition(": ")
+    if not sep:
+        tag, sep, message = rest.partition(":")
+        if not sep:
+            return None
+    return LogRecord(date, time_, int(pid), int(tid), level, tag.rstrip(), message)
+
+
+def parse_threadtime(lines):
+    """Generator: iterable baris mentah -> LogRecord (baris yang tidak valid dilewati)."""
+    for line in lines:
+        record = parse_threadtime_line(line)
+        if record is not None:
+            yield record
+
+
+_midnight_cache = {}
+
+
+def record_epoch(record, year=None):
+    """
+    Timestamp device (epoch detik) dari LogRecord. threadtime tidak punya tahun,
+    jadi dipakai tahun berjalan. Epoch tengah malam di-cache per tanggal.
+    """
+    key = (year, record.date)
+    midnight = _midnight_cache.get(key)
+    if midnight is None:
+        month, day = record.date.split("-")
+        midnight = datetime(year or datetime.now().year, int(month), int(day)).timestamp()
+        _midnight_cache[key] = midnight
+    hh, mm, ss = record.time.split(":")
+    return midnight + int(hh) * 3600 + int(mm) * 60 + float(ss)
+
+
+def build_logcat_cmd(adb_path, tag_filters=None, serial=None):
+    """
+    Command `adb logcat -v threadtime`. Kalau tag_filters diisi (mis. ["LOCSHIELD_BRIDGE:E"]),
+    filter dikirim ke device dan sisanya di-silence dengan `*:S`.
+    """
+    cmd = [adb_path]
+    if serial:
+        cmd += ["-s", serial]
+    cmd += ["logcat", "-v", "threadtime"]
+    if tag_filters:
+        cmd += list(tag_filters) + ["*:S"]
+    return cmd
+
+
+# ==============================================================================
+# KLASIFIKASI BARIS LOGCAT
+# ==============================================================================
+def trie_pattern(words):
+    """
+    Bangun regex dari trie kata-kata (prefix yang sama digabung).
+    Hasilnya tidak melakukan backtracking per kata, jadi biaya scan
+    hampir tidak tergantung jumlah kata di watchlist.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node):
+        end = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch != ""]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not end:
+            return branches[0]
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if end else body
+
+    return build(trie)
+
+
+class LineClassifier:
+    """
+    Classifier baris logcat, dibangun sekali saat startup.
+    Semua package (watchlist + Maps) digabung jadi satu regex trie, jadi satu
+    kali scan sudah cukup untuk menentukan kategori FAKE / BRIDGE / MAPS.
+    """
+
+    def __init__(self, fake_keywords, fake_triggers, maps_package, maps_triggers,
+                 bridge_tag="LOCSHIELD_BRIDGE", watch_tags=None):
+        self.bridge_tag = bridge_tag
+        self.maps_package = maps_package
+        # None = semua tag di-scan; selain itu hanya tag di set ini yang body-nya dibaca
+        self.watch_tags = frozenset(watch_tags) if watch_tags else None
+
+        # keyword (lowercase) -> (kategori, nama asli)
+        self._lookup = {k.lower(): (CATEGORY_FAKE, k) for k in fake_keywords}
+        self._lookup.setdefault(maps_package.lower(), (CATEGORY_MAPS, maps_package))
+
+        # Case-sensitive di atas line.lower(): dengan IGNORECASE sre kehilangan
+        # optimasi literal-prefix dan jadi ~3x lebih lambat.
+        self._scan = re.compile(trie_pattern(sorted(self._lookup)))
+        self._fake_trigger = re.compile(trie_pattern([w.lower() for w in fake_triggers]))
+        self._maps_trigger = re.compile(trie_pattern([w.lower() for w in maps_triggers]))
+
+    def classify(self, line):
+        """
+        Return (kategori, keyword) atau None.
+        Prioritas sama seperti loop lama: FAKE > BRIDGE > MAPS.
+        Baris FAKE / MAPS tanpa trigger word dianggap tidak relevan.
+        """
+        line_lower = line.lower()
+        fake = maps = None
+        for m in self._scan.finditer(line_lower):
+            category, keyword = self._lookup[m.group()]
+            if category == CATEGORY_FAKE:
+                fake = keyword
+                break
+            maps = keyword
+
+        if fake is not None:
+            if self._fake_trigger.search(line_lower):
+                return CATEGORY_FAKE, fake
+            return None
+        # Tag bridge case-sensitive, dicek di baris asli
+        if self.bridge_tag in line:
+            return CATEGORY_BRIDGE, self.bridge_tag
+        if maps is not None and self._maps_trigger.search(line_lower):
+            return CATEGORY_MAPS, maps
+        return None
+
+    def classify_record(self, record):
+        """
+        Versi LogRecord: routing berdasarkan tag dulu, body baru di-scan kalau perlu.
+        Tag bridge langsung jadi BRIDGE tanpa menyentuh isi JSON.
+        """
+        tag = record.tag
+        if tag == self.bridge_tag:
+            return CATEGORY_BRIDGE, self.bridge_tag
+        if self.watch_tags is not None and tag not in self.watch_tags:
+            return None
+        match = self.classify(record.message)
+        if match is None or match[0] == CATEGORY_BRIDGE:
+            # Bridge hanya dipercaya dari tag-nya sendiri
+            return None
+        return match
@@ -0,0 +1,302 @@
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import storage
+
+# ==============================================================================
+# HISTOGRAM / COUNTER / GAUGE
+# ==============================================================================
+# Bucket stage pipeline: 1 us .. ~4 s (kelipatan 2)
+STAGE_BUCKETS = tuple(1e-6 * 2 ** i for i in range(23))
+# Bucket lag logcat (jam device vs jam dinding): 1 ms .. ~17 menit
+LAG_BUCKETS = tuple(1e-3 * 2 ** i for i in range(21))
+
+
+class Histogram:
+    """
+    Histogram bucket tetap ala Prometheus. Satu histogram stage dipakai bersama
+    oleh semua thread DeviceMonitor (satu per device), dan `+=` bukan operasi
+    atomik, jadi observe() pakai lock. Murah: hot path hanya mengukur 1 dari
+    `sample_every` baris. snapshot() membaca counts / sum / count di lock yang sama.
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # slot terakhir = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        """(counts, sum, count) yang konsisten satu sama lain."""
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def quantile(self, q):
+        """Perkiraan kuantil (batas atas bucket tempat kuantil jatuh)."""
+        counts, _, count = self.snapshot()
+        if not count:
+            return 0.0
+        target = q * count
+        seen = 0
+        for i, n in enumerate(counts):
+            seen += n
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+        return self.buckets[-1]
+
+
+class Counter:
+    """Counter bisa di-inc dari beberapa thread (mis. events_total dari tiap monitor), jadi pakai lock."""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+
+def _labels(labels, le=None):
+    parts = [f'{k}="{v}"' for k, v in sorted(labels.items())]
+    if le is not None:
+        parts.append(f'le="{le}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _le(bound):
+    return f"{bound:.6g}"
+
+# ==============================================================================
+# REGISTRY
+# ==============================================================================
+class MetricsRegistry:
+    """
+    Kumpulan metric engine. Hot path memegang objek Histogram / Counter langsung
+    (tanpa lookup dict per baris) dan hanya mengukur 1 dari `sample_every` baris
+    logcat supaya overhead perf_counter tetap beberapa persen dari waktu loop.
+    """
+
+    def __init__(self, prefix="locshield", sample_every=16):
+        self.prefix = prefix
+        self.sample_every = max(1, int(sample_every))
+        self.metrics = {}       # (name, labels tuple) -> (type, help, labels dict, obj)
+        self.collectors = []    # fn() -> iterable (name, type, help, labels dict, value)
+        self._lock = threading.Lock()
+
+    def _get(self, kind, factory, name, help_text, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            entry = self.metrics.get(key)
+            if entry is None:
+                entry = self.metrics[key] = (kind, help_text, labels, factory())
+        return entry[3]
+
+    def histogram(self, name, help_text="", buckets=STAGE_BUCKETS, **labels):
+        return self._get("histogram", lambda: Histogram(buckets), name, help_text, labels)
+
+    def counter(self, name, help_text="", **labels):
+        return self._get("counter", Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text="", **labels):
+        return self._get("gauge", Gauge, name, help_text, labels)
+
+    def stage(self, stage):
+        """Histogram durasi (detik) untuk satu stage pipeline."""
+        return self.histogram("stage_seconds", "Durasi per stage pipeline engine", stage=stage)
+
+    def lag(self, device):
+        return self.histogram("logcat_lag_seconds", "Jam dinding dikurangi timestamp device per baris logcat",
+                              LAG_BUCKETS, device=device or "")
+
+    def add_collector(self, fn):
+        """fn dipanggil saat scrape / snapshot, untuk stats yang sudah dihitung modul lain."""
+        self.collectors.append(fn)
+
+    def stages(self):
+        """(stage, Histogram) untuk semua stage, urut sesuai pertama kali dibuat."""
+        return [(labels["stage"], obj) for (name, _), (kind, _, labels, obj) in list(self.metrics.items())
+                if name == "stage_seconds"]
+
+    # --------------------------------------------------------------------------
+    def samples(self):
+        """Semua metric datar: (name, type, help, labels, obj_or_value)."""
+        out = [(name, kind, help_text, labels, obj)
+               for (name, _), (kind, help_text, labels, obj) in list(self.metrics.items())]
+        for fn in self.collectors:
+            try:
+                out.extend(fn())
+            except Exception:
+                pass
+        return out
+
+    def render(self):
+        """Prometheus text exposition format 0.0.4."""
+        lines = []
+        declared = set()
+        for name, kind, help_text, labels, obj in sorted(self.samples(), key=lambda s: s[0]):
+            full = f"{self.prefix}_{name}"
+            if full not in declared:
+                declared.add(full)
+                lines.append(f"# HELP {full} {help_text}")
+                lines.append(f"# TYPE {full} {kind}")
+            if kind == "histogram":
+                counts, total, count = obj.snapshot()
+                cumulative = 0
+                for bound, n in zip(obj.buckets, counts):
+                    cumulative += n
+                    lines.append(f"{full}_bucket{_labels(labels, _le(bound))} {cumulative}")
+                lines.append(f"{full}_bucket{_labels(labels, '+Inf')} {count}")
+                lines.append(f"{full}_sum{_labels(labels)} {total:.9g}")
+                lines.append(f"{full}_count{_labels(labels)} {count}")
+            else:
+                value = obj.value if isinstance(obj, (Counter, Gauge)) else obj
+                lines.append(f"{full}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        """Tabel stage untuk console (replay / shutdown)."""
+        print(f"{'Stage':<14} {'Samples':>10} {'Total ms':>12} {'Avg us':>10} {'p50 us':>9} {'p99 us':>9}")
+        print("-" * 68)
+        for stage, h in self.stages():
+            if not h.count:
+                continue
+            print(f"{stage:<14} {h.count:>10} {h.sum * 1000:>12.1f} {h.sum / h.count * 1e6:>10.2f} "
+                  f"{h.quantile(0.5) * 1e6:>9.0f} {h.quantile(0.99) * 1e6:>9.0f}")
+
+# ==============================================================================
+# HTTP ENDPOINT
+# ==============================================================================
+class MetricsServer:
+    """GET /metrics di localhost, format Prometheus. Jalan di daemon thread."""
+
+    def __init__(self, registry, host="127.0.0.1", port=9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # jangan spam console engine
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            print(f"\033[93m[METRICS] Endpoint tidak bisa dibuka di {self.host}:{self.port}: {e}\033[0m")
+            return False
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True).start()
+        print(f"[METRICS] Prometheus endpoint: http://{self.host}:{self.port}/metrics")
+        return True
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+# ==============================================================================
+# SNAPSHOT KE SQLITE (UNTUK DASHBOARD)
+# ==============================================================================
+# Tabel `metrics` dibuat migrasi schema v5 (storage.py), ts = epoch ms
+METRICS_INSERT_SQL = ("INSERT INTO metrics (ts, name, labels, count, value, p50, p95, p99) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+
+class MetricsSnapshotter:
+    """
+    Tiap `interval` detik tulis snapshot registry ke tabel `metrics` (schema v5, DB
+    sudah di-migrate engine):
+    histogram -> count, value = avg, p50/p95/p99 (detik); counter / gauge -> value.
+    Koneksi sendiri, jarang commit, jadi tidak mengganggu EventWriter.
+    """
+
+    def __init__(self, registry, db_file, interval=10.0):
+        self.registry = registry
+        self.db_file = db_file
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="MetricsSnapshotter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5.0)
+            self._thread = None
+
+    def rows(self):
+        ts = int(time.time() * 1000)
+        rows = []
+        for name, kind, _, labels, obj in self.registry.samples():
+            label_str = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+            if kind == "histogram":
+                _, total, count = obj.snapshot()
+                avg = total / count if count else 0.0
+                rows.append((ts, name, label_str, count, avg,
+                             obj.quantile(0.5), obj.quantile(0.95), obj.quantile(0.99)))
+            else:
+                value = obj.value if isinstance(obj, (Counter, Gauge)) else obj
+                rows.append((ts, name, label_str, None, value, None, None, None))
+        return rows
+
+    def snapshot(self, conn):
+        try:
+            conn.executemany(METRICS_INSERT_SQL, self.rows())
+            conn.commit()
+        except Exception as e:
+            print(f"[METRICS ERROR] {e}")
+
+    def _run(self):
+        conn = storage.connect(self.db_file, timeout=5.0)
+        try:
+            while not self._stop.wait(self.interval):
+                self.snapshot(conn)
+            self.snapshot(conn)
+        finally:
+            conn.close()
@@ -0,0 +1,123 @@
+import os
+import socket
+import struct
+import time
+from datetime import datetime
+
+# ==============================================================================
+# PCAPNG WRITER (ROTATING)
+# ==============================================================================
+# Payload UDP yang diterima listener dibungkus header IPv4 + UDP sintetis supaya
+# Wireshark langsung mendissect sebagai UDP (port engine -> port listener).
+# Section Header + Interface Description (LINKTYPE_IPV4) di awal tiap file,
+# lalu satu Enhanced Packet Block per datagram (timestamp mikrodetik).
+LINKTYPE_IPV4 = 228
+BYTE_ORDER_MAGIC = 0x1A2B3C4D
+SNAPLEN = 65535
+
+
+def _block(block_type, body):
+    pad = (-len(body)) % 4
+    length = 12 + len(body) + pad
+    return struct.pack("<II", block_type, length) + body + b"\0" * pad + struct.pack("<I", length)
+
+
+def section_header():
+    return _block(0x0A0D0D0A, struct.pack("<IHHq", BYTE_ORDER_MAGIC, 1, 0, -1))
+
+
+def interface_description(linktype=LINKTYPE_IPV4, snaplen=SNAPLEN):
+    return _block(0x00000001, struct.pack("<HHI", linktype, 0, snaplen))
+
+
+def _checksum(header):
+    total = sum(struct.unpack("!10H", header))
+    total = (total & 0xFFFF) + (total >> 16)
+    total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+def ipv4_udp_header(size, src, dst):
+    """Header IPv4 (DF, id 0) + UDP untuk payload `size` byte. Checksum UDP 0 = tidak dihitung, sah di IPv4."""
+    length = 28 + size
+    header = struct.pack("!BBHHHBBH4s4s", 0x45, 0, length, 0, 0x4000, 64, socket.IPPROTO_UDP, 0,
+                         socket.inet_aton(src[0]), socket.inet_aton(dst[0]))
+    header = header[:10] + struct.pack("!H", _checksum(header)) + header[12:]
+    return header + struct.pack("!HHHH", src[1], dst[1], 8 + size, 0)
+
+
+EPB_HEAD = struct.Struct("<IIIIIII")
+
+
+def enhanced_packet(packet, ts=None):
+    us = int((time.time() if ts is None else ts) * 1_000_000)
+    pad = (-len(packet)) % 4
+    length = 32 + len(packet) + pad
+    return (EPB_HEAD.pack(0x00000006, length, 0, us >> 32, us & 0xFFFFFFFF, len(packet), len(packet))
+            + packet + b"\0" * pad + struct.pack("<I", length))
+
+
+class PcapngWriter:
+    """
+    Tulis datagram ke <prefix>-YYYYmmdd-HHMMSS-NNN.pcapng, ganti file kalau sudah
+    `max_bytes`, simpan paling banyak `keep` file (yang paling lama dihapus).
+    write() hanya buffer; flush() dipanggil listener sekali per batch.
+    """
+
+    def __init__(self, prefix, max_bytes=64 * 1024 * 1024, keep=10):
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.files = []
+        self.path = None
+        self._f = None
+        self._size = 0
+        self._index = 0
+        self._headers = {}  # (src, dst, size) -> header IPv4 + UDP (engine kirim dari satu port)
+
+        # Counters
+        self.packets = 0
+        self.bytes = 0
+
+    def _open(self):
+        directory = os.path.dirname(self.prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._index += 1
+        path = f"{self.prefix}-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{self._index:03d}.pcapng"
+        self._f = open(path, "wb", buffering=1024 * 1024)
+        self.path = path
+        self.files.append(path)
+        header = section_header() + interface_description()
+        self._f.write(header)
+        self._size = len(header)
+        while self.keep and len(self.files) > self.keep:
+            try:
+                os.remove(self.files.pop(0))
+            except OSError:
+                pass
+
+    def write(self, payload, src, dst, ts=None):
+        if self._f is None or self._size >= self.max_bytes:
+            self.close()
+            self._open()
+        key = (src, dst, len(payload))
+        header = self._headers.get(key)
+        if header is None:
+            if len(self._headers) > 4096:
+                self._headers.clear()
+            header = self._headers[key] = ipv4_udp_header(len(payload), src, dst)
+        block = enhanced_packet(header + payload, ts)
+        self._f.write(block)
+        self._size += len(block)
+        self.packets += 1
+        self.bytes += len(block)
+
+    def flush(self):
+        if self._f is not None:
+            self._f.flush()
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import OrderedDict
+
+# ==============================================================================
+# RATE DETECTOR (SLIDING WINDOW PER DEVICE / SOURCE / EVENT)
+# ==============================================================================
+# Event yang keluar dari Detector dihitung per (device, source, event) di window
+# `window` detik (default 60) memakai timestamp event (jam dinding, atau jam device
+# saat replay). Window dibagi `buckets` ember; tiap event O(1): geser ring ke
+# ember sekarang (paling banyak `buckets` ember di-nol-kan) lalu +1.
+# Kalau jumlah di window >= threshold, satu event HIGH_FREQ dikirim ke sink; alarm
+# aktif lagi sesudah rate turun di bawah setengah threshold (tidak flapping).
+HIGH_FREQ_STATUS = "HIGH FREQUENCY ACCESS"
+HIGH_FREQ_TAG = "HIGH_FREQ_ACCESS"
+# Event rutin yang tidak dicek rate-nya kecuali di-override lewat `thresholds`
+DEFAULT_THRESHOLDS = {"AMAN": 0, "INFO": 0}
+
+
+class _Window:
+    """Ring ember untuk satu (device, source, event)."""
+
+    __slots__ = ("counts", "bucket", "total", "alerted")
+
+    def __init__(self, buckets, bucket):
+        self.counts = [0] * buckets
+        self.bucket = bucket     # index absolut ember terbaru (waktu // lebar ember)
+        self.total = 0
+        self.alerted = False
+
+
+class RateDetector:
+    """
+    Tahap sebelum coalescer: submit() meneruskan event apa adanya ke `forward`
+    lalu menghitung rate-nya. Alarm HIGH_FREQ dikirim ke `alert`
+    (EventCoalescer.alert: flush ringkasan device dulu, tidak dilipat, dan tidak
+    mengubah status terakhir per source).
+
+    thresholds: {event: batas per menit} untuk override `threshold` (0 = tidak dicek).
+    Default DEFAULT_THRESHOLDS: AMAN / INFO tidak dicek (traffic Maps / bridge normal
+    sudah puluhan baris per detik, bukan akses berlebihan).
+    Memori terbatas: paling banyak `max_keys` window, yang paling lama tidak
+    dipakai dibuang (LRU).
+
+    alert(status, source, risk, msg, device, count, first_seen, last_seen)
+    dipanggil di luar lock; first_seen / last_seen dalam epoch detik.
+    """
+
+    def __init__(self, forward, alert, window=60.0, threshold=50, thresholds=None, buckets=12,
+                 max_keys=4096, risk=7, clock=time.time):
+        self.forward = forward
+        self.alert = alert
+        self.window = window
+        self.threshold = threshold
+        self.thresholds = dict(DEFAULT_THRESHOLDS)
+        self.thresholds.update(thresholds or {})
+        self.buckets = buckets
+        self.max_keys = max_keys
+        self.risk = risk
+        self.clock = clock
+        self.windows = OrderedDict()    # (device, source, status) -> _Window
+        self._lock = threading.Lock()
+
+        # Counters
+        self.events_in = 0
+        self.alerts = 0
+        self.evicted = 0
+
+    def stats(self):
+        return {"events_in": self.events_in, "alerts": self.alerts, "keys": len(self.windows),
+                "evicted": self.evicted}
+
+    def limit(self, status):
+        """Batas jumlah event di window (threshold per menit diskalakan ke panjang window)."""
+        per_minute = self.thresholds.get(status, self.threshold)
+        return per_minute * self.window / 60.0 if per_minute else 0
+
+    # --------------------------------------------------------------------------
+    def submit(self, status, source, risk, msg, device=None):
+        self.forward(status, source, risk, msg, device)
+        if self.window <= 0:
+            return
+        now = self.clock()
+        limit = self.limit(status)
+        if not limit:
+            return
+        total = self.observe((device, source, status), now, limit)
+        if total is not None:
+            per_minute = self.thresholds.get(status, self.threshold)
+            msg = (f"{HIGH_FREQ_TAG} | {status} x{total} in {self.window:g}s "
+                   f"({total * 60.0 / self.window:.0f}/min, threshold {per_minute}/min)")
+            self.alert(HIGH_FREQ_STATUS, source, self.risk, msg, device, 1, now, now)
+
+    def observe(self, key, now, limit):
+        """Hitung satu event; return jumlah di window kalau threshold baru saja terlewati."""
+        width = self.window / self.buckets
+        bucket = int(now // width)
+        with self._lock:
+            self.events_in += 1
+            w = self.windows.get(key)
+            if w is None:
+                if len(self.windows) >= self.max_keys:
+                    self.windows.popitem(last=False)
+                    self.evicted += 1
+                w = self.windows[key] = _Window(self.buckets, bucket)
+            else:
+                self.windows.move_to_end(key)
+                self._advance(w, bucket)
+
+            w.counts[bucket % self.buckets] += 1
+            w.total += 1
+            if w.alerted:
+                if w.total < limit / 2:
+                    w.alerted = False
+                return None
+            if w.total >= limit:
+                w.alerted = True
+                self.alerts += 1
+                return w.total
+            return None
+
+    def _advance(self, w, bucket):
+        steps = bucket - w.bucket
+        if steps <= 0:
+            if steps < 0 and -steps >= self.buckets:
+                # Jam mundur jauh (capture baru saat replay): mulai dari nol
+                w.counts = [0] * self.buckets
+                w.total = 0
+                w.bucket = bucket
+            return
+        if steps >= self.buckets:
+            w.counts = [0] * self.buckets
+            w.total = 0
+        else:
+            counts = w.counts
+            for b in range(w.bucket + 1, bucket + 1):
+                i = b % self.buckets
+                w.total -= counts[i]
+                counts[i] = 0
+        w.bucket = bucket
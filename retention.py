@@ -0,0 +1,282 @@
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import storage
+
+# ==============================================================================
+# RETENTION & ARCHIVE
+# ==============================================================================
+# Event lebih tua dari max_age_hours (atau yang paling lama kalau DB melewati
+# max_db_mb) dipindah ke archive/events-YYYYMMDD-HH.jsonl.gz lalu dihapus dari DB.
+# Segment append-only: tiap run menambah satu member gzip baru (gzip.open membaca
+# semua member berurutan). Index chunk ada di tabel archive_segments.
+# Bucket rollup_minute lebih tua dari rollup_minute_days (dihitung dari menit
+# terbaru, bukan jam dinding, supaya DB replay tidak langsung kosong) ikut dibuang;
+# rollup_totals / rollup_events tetap menghitung semua event. Snapshot tabel
+# metrics (jam dinding) lebih tua dari metrics_hours juga dibuang.
+ARCHIVE_COLUMNS = ("id", "session", "ts", "event", "source", "risk", "msg", "dread_score",
+                   "device", "count", "first_ts", "last_ts")
+
+SELECT_OLD_SQL = f"""
+    SELECT {", ".join(ARCHIVE_COLUMNS)} FROM logs
+    WHERE id > ? AND ts < ? ORDER BY id LIMIT ?
+"""
+SELECT_OLDEST_SQL = f"""
+    SELECT {", ".join(ARCHIVE_COLUMNS)} FROM logs
+    WHERE id > ? ORDER BY id LIMIT ?
+"""
+
+
+def segment_name(ts_ms):
+    return datetime.fromtimestamp(ts_ms / 1000).strftime("events-%Y%m%d-%H.jsonl.gz")
+
+
+def hour_start_ms(ts_ms):
+    hour = datetime.fromtimestamp(ts_ms / 1000).replace(minute=0, second=0, microsecond=0)
+    return int(hour.timestamp() * 1000)
+
+
+def live_size_bytes(conn):
+    """Ukuran data yang terpakai (page dikurangi freelist), bukan ukuran file."""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return (pages - free) * page_size
+
+
+def ensure_incremental_vacuum(conn):
+    """DB yang dibuat sebelum retention belum auto_vacuum=INCREMENTAL; ubah sekali lewat VACUUM penuh."""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    print("[RETENTION] Switching database to incremental auto-vacuum (one-time VACUUM)...")
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+
+class RetentionManager:
+    """
+    Jalan di background thread (engine) atau sekali lewat CLI. Tiap run:
+    1. arsip event dengan ts < sekarang - max_age_hours
+    2. kalau data DB masih > max_db_mb, arsip event paling lama sampai di bawah batas
+    3. buang bucket rollup_minute dan snapshot metrics lama
+    4. PRAGMA incremental_vacuum supaya page kosong dikembalikan ke OS
+    File archive ditulis + fsync dulu, baru DELETE + index di satu transaksi.
+    Kalau crash di antaranya, chunk bisa terarsip dua kali; pembaca dedupe per id.
+    """
+
+    def __init__(self, db_file, archive_dir="archive", max_age_hours=24.0, max_db_mb=512.0,
+                 interval=300.0, batch_size=20000, rollup_minute_days=7.0,
+                 metrics_hours=24.0):
+        self.db_file = db_file
+        self.archive_dir = archive_dir
+        self.max_age_hours = max_age_hours
+        self.max_db_mb = max_db_mb
+        self.interval = interval
+        self.batch_size = batch_size
+        self.rollup_minute_days = rollup_minute_days
+        self.metrics_hours = metrics_hours
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Counters
+        self.rows_archived = 0
+        self.bytes_archived = 0
+        self.pages_freed = 0
+        self.rollup_minutes_pruned = 0
+        self.metrics_pruned = 0
+        self.runs = 0
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="RetentionManager", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(10.0)
+            self._thread = None
+
+    def stats(self):
+        return {"runs": self.runs, "rows_archived": self.rows_archived,
+                "bytes_archived": self.bytes_archived, "pages_freed": self.pages_freed,
+                "rollup_minutes_pruned": self.rollup_minutes_pruned, "metrics_pruned": self.metrics_pruned}
+
+    # --------------------------------------------------------------------------
+    def run_once(self):
+        conn = storage.connect(self.db_file, timeout=30.0)
+        try:
+            storage.migrate(conn)
+            archived = 0
+            if self.max_age_hours and self.max_age_hours > 0:
+                cutoff = int((time.time() - self.max_age_hours * 3600) * 1000)
+                archived += self._archive_while(conn, SELECT_OLD_SQL, lambda last: (last, cutoff, self.batch_size))
+            if self.max_db_mb and self.max_db_mb > 0:
+                cap = self.max_db_mb * 1024 * 1024
+                archived += self._archive_while(conn, SELECT_OLDEST_SQL, lambda last: (last, self.batch_size),
+                                                until=lambda: live_size_bytes(conn) <= cap)
+            self._prune_rollups(conn)
+            self._vacuum(conn)
+            self.runs += 1
+            return archived
+        finally:
+            conn.close()
+
+    def _archive_while(self, conn, sql, params, until=None):
+        total = 0
+        last_id = 0
+        while not self._stop.is_set():
+            if until is not None and until():
+                break
+            rows = conn.execute(sql, params(last_id)).fetchall()
+            if not rows:
+                break
+            self._archive_chunk(conn, rows)
+            total += len(rows)
+            last_id = rows[-1][0]
+            if len(rows) < self.batch_size:
+                break
+        return total
+
+    def _archive_chunk(self, conn, rows):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        by_hour = {}
+        for row in rows:
+            by_hour.setdefault(hour_start_ms(row[2]), []).append(row)
+
+        index = []
+        for hour_ms, chunk in sorted(by_hour.items()):
+            name = segment_name(hour_ms)
+            payload = "".join(json.dumps(dict(zip(ARCHIVE_COLUMNS, row)), separators=(",", ":")) + "\n"
+                              for row in chunk).encode("utf-8")
+            data = gzip.compress(payload)
+            path = os.path.join(self.archive_dir, name)
+            with open(path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            ids = [row[0] for row in chunk]
+            ts = [row[2] for row in chunk]
+            index.append((name, hour_ms, min(ids), max(ids), min(ts), max(ts), len(chunk), len(data),
+                          int(time.time() * 1000)))
+            self.bytes_archived += len(data)
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT INTO archive_segments (path, hour_ms, min_id, max_id, min_ts, max_ts, "
+                             "rows, bytes, created_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", index)
+            conn.executemany("DELETE FROM events WHERE id = ?", ((row[0],) for row in rows))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        self.rows_archived += len(rows)
+
+    def _prune_rollups(self, conn):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self.rollup_minute_days and self.rollup_minute_days > 0:
+                cur = conn.execute("DELETE FROM rollup_minute "
+                                   "WHERE minute < (SELECT MAX(minute) FROM rollup_minute) - ?",
+                                   (int(self.rollup_minute_days * 1440),))
+                self.rollup_minutes_pruned += cur.rowcount
+            if self.metrics_hours and self.metrics_hours > 0:
+                cutoff = int((time.time() - self.metrics_hours * 3600) * 1000)
+                self.metrics_pruned += conn.execute("DELETE FROM metrics WHERE ts < ?", (cutoff,)).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _vacuum(self, conn):
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free and conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            # executescript (sqlite3_exec) supaya pragma jalan sampai selesai; execute() hanya 1 step = 1 page
+            conn.executescript("PRAGMA incremental_vacuum;")
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            self.pages_freed += free
+
+    def _run(self):
+        while True:
+            try:
+                archived = self.run_once()
+                if archived:
+                    print(f"\033[96m[RETENTION] Archived {archived} events to {self.archive_dir}/ "
+                          f"(total {self.rows_archived})\033[0m")
+            except Exception as e:
+                print(f"[RETENTION ERROR] {e}")
+            if self._stop.wait(self.interval):
+                break
+
+# ==============================================================================
+# BACA ARCHIVE
+# ==============================================================================
+def archived_segments(conn, archive_dir="archive", start_ms=None, end_ms=None):
+    """Path segment (urut waktu) yang punya chunk di rentang [start_ms, end_ms]."""
+    sql = "SELECT DISTINCT path, hour_ms FROM archive_segments WHERE 1 = 1"
+    params = []
+    if start_ms is not None:
+        sql += " AND max_ts >= ?"
+        params.append(start_ms)
+    if end_ms is not None:
+        sql += " AND min_ts <= ?"
+        params.append(end_ms)
+    try:
+        rows = conn.execute(sql + " ORDER BY hour_ms", params).fetchall()
+    except Exception:
+        return []  # DB sebelum schema v3
+    return [os.path.join(archive_dir, path) for path, _ in rows]
+
+
+def read_archive(paths, start_ms=None, end_ms=None):
+    """
+    Generator dict event dari segment gzip JSONL, dedupe per id (lihat RetentionManager).
+    Chunk yang terarsip dua kali selalu masuk segment yang sama (nama dari jam ts),
+    jadi set id cukup per segment: memori sebesar satu segment, bukan seluruh archive.
+    """
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        seen = set()
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                event = json.loads(line)
+                ts = event["ts"]
+                if (start_ms is not None and ts < start_ms) or (end_ms is not None and ts > end_ms):
+                    continue
+                if event["id"] in seen:
+                    continue
+                seen.add(event["id"])
+                yield event
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="LocShield retention: arsip event lama + incremental vacuum")
+    parser.add_argument("--db", default="locshield.db", help="file SQLite (default: locshield.db)")
+    parser.add_argument("--archive-dir", default="archive", help="folder segment archive (default: archive)")
+    parser.add_argument("--max-age", type=float, default=24.0, metavar="HOURS",
+                        help="arsip event lebih tua dari ini, 0 = tanpa batas umur (default: 24)")
+    parser.add_argument("--max-mb", type=float, default=512.0,
+                        help="batas ukuran data DB, 0 = tanpa batas (default: 512)")
+    args = parser.parse_args()
+
+    conn = storage.connect(args.db)
+    storage.migrate(conn)
+    ensure_incremental_vacuum(conn)
+    conn.close()
+
+    manager = RetentionManager(args.db, args.archive_dir, args.max_age, args.max_mb)
+    t0 = time.perf_counter()
+    archived = manager.run_once()
+    stats = manager.stats()
+    print(f"[RETENTION] Archived {archived} events ({stats['bytes_archived'] / 1024:.1f} KiB gzip), "
+          f"pruned {stats['rollup_minutes_pruned']} rollup minutes / {stats['metrics_pruned']} metrics rows, "
+          f"freed {stats['pages_freed']} pages in {time.perf_counter() - t0:.2f} s")
@@ -0,0 +1,207 @@
+import sqlite3
+import threading
+import time
+from collections import deque, namedtuple
+
+import pandas as pd
+
+import storage
+from bus import BusSubscriber
+
+# ==============================================================================
+# SNAPSHOT DASHBOARD (SATU PRODUCER PER PROSES STREAMLIT)
+# ==============================================================================
+# Satu thread query DB sekali per tick lalu publish Snapshot; semua sesi browser
+# hanya membaca snapshot terbaru. Beban DB tetap sama berapa pun jumlah viewer.
+RING_SIZE = 100
+EVENT_COLUMNS = ['id', 'timestamp', 'device', 'event', 'source', 'risk', 'msg', 'dread_score', 'count']
+
+EVENTS_SQL = """
+    SELECT id, timestamp, device, event, source, risk, msg, dread_score, count
+    FROM logs
+    WHERE id > ?
+    ORDER BY id DESC
+    LIMIT ?
+"""
+# Statistik dari rollup (satu baris, di-update writer engine tiap commit)
+STATS_SQL = """
+    SELECT
+        total,
+        high as high_threats,
+        medium as medium_threats,
+        CASE WHEN total > 0 THEN 1.0 * risk_sum / total ELSE 0 END as avg_risk,
+        CASE WHEN total > 0 THEN 1.0 * dread_sum / total ELSE 0 END as avg_dread
+    FROM rollup_totals
+"""
+# Jumlah per event type (semua history, satu baris per tipe)
+EVENT_STATS_SQL = """
+    SELECT t.name as event, r.count
+    FROM rollup_events r JOIN event_types t ON t.id = r.event_id
+    ORDER BY r.count DESC
+"""
+# Time-based analysis (last 60 minutes, bucket per menit per event type)
+TIME_SQL = """
+    SELECT r.minute, t.name as event, r.count, r.risk_max
+    FROM rollup_minute r JOIN event_types t ON t.id = r.event_id
+    WHERE r.minute >= (SELECT MAX(minute) - 60 FROM rollup_minute)
+    ORDER BY r.minute
+"""
+# Snapshot metrics engine (schema v5, ditulis MetricsSnapshotter)
+METRICS_SQL = """
+    SELECT strftime('%Y-%m-%d %H:%M:%S', ts / 1000, 'unixepoch', 'localtime') AS timestamp,
+           name, labels, value, p95
+    FROM metrics
+    WHERE name IN ('stage_seconds', 'logcat_lag_seconds')
+      AND id > (SELECT MAX(id) - 600 FROM metrics)
+"""
+
+# DataFrame di dalam Snapshot dipakai bersama semua sesi: jangan diubah in-place
+Snapshot = namedtuple("Snapshot", ["version", "events", "stats", "event_stats", "time_df", "metrics_df",
+                                   "last_id", "bus_live", "error"])
+
+
+def empty_stats():
+    return pd.DataFrame({'total': [0], 'high_threats': [0], 'medium_threats': [0],
+                         'avg_risk': [0], 'avg_dread': [0]})
+
+
+class SnapshotProducer:
+    """
+    Background thread: event baru dari event bus (atau polling SQLite kalau bus mati),
+    rollup / metrics di-query ulang hanya kalau ada event atau snapshot metrics baru,
+    dan paling sering sekali per `interval`: event bus masuk ring tiap poll, tapi
+    agregat + publish tidak ikut rate commit engine.
+    Koneksi dari ReadOnlyPool (mode=ro, busy_timeout), tidak pernah bersaing dengan writer.
+    wait(version) dipakai sesi browser untuk tidur sampai ada snapshot baru.
+    """
+
+    def __init__(self, db_file, bus_host="127.0.0.1", bus_port=9200, interval=0.5, pool_size=4,
+                 busy_timeout_ms=5000):
+        self.db_file = db_file
+        self.interval = interval
+        self.pool = storage.ReadOnlyPool(db_file, pool_size, busy_timeout_ms)
+        self.bus = BusSubscriber(bus_host, bus_port) if bus_port else None
+        self.ring = deque(maxlen=RING_SIZE)
+        self.last_id = 0
+        self.last_metrics_id = None
+        self.snapshot = None
+        self._last_refresh = 0.0    # time.monotonic() agregat terakhir di-query
+        self._pending = False       # ring berubah sejak snapshot terakhir
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Counters
+        self.ticks = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="SnapshotProducer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5.0)
+            self._thread = None
+        if self.bus is not None:
+            self.bus.close()
+        self.pool.close()
+
+    def wait(self, version=None, timeout=1.0):
+        """Snapshot dengan version != `version` (atau snapshot sekarang kalau timeout)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.snapshot is not None and self.snapshot.version != version,
+                                timeout)
+            return self.snapshot
+
+    # --------------------------------------------------------------------------
+    def _publish(self, **fields):
+        version = self.snapshot.version + 1 if self.snapshot is not None else 1
+        snapshot = Snapshot(version=version, **fields)
+        with self._cond:
+            self.snapshot = snapshot
+            self._cond.notify_all()
+
+    def _poll_bus(self):
+        """Event baru dari bus (terbaru dulu), None kalau bus tidak tersedia."""
+        if self.bus is None or self.snapshot is None:
+            return None  # render pertama selalu dari SQLite (isi ring)
+        if not self.bus.connected:
+            # (Re)connect: minta bus kirim semua event sesudah yang terakhir ada di ring
+            self.bus.last_id = self.last_id
+        # Tunggu paling lama sampai jadwal refresh berikutnya
+        wait = self._last_refresh + self.interval - time.monotonic()
+        events = self.bus.poll(min(self.interval, max(0.01, wait)))
+        if events is None:
+            return None
+        return [tuple(event[c] for c in EVENT_COLUMNS) for event in reversed(events) if event['id'] > self.last_id]
+
+    def tick(self):
+        self.ticks += 1
+        new_rows = self._poll_bus()
+        bus_live = new_rows is not None
+        if new_rows:
+            self._append(new_rows)
+        if bus_live and self.snapshot is not None and time.monotonic() - self._last_refresh < self.interval:
+            return bus_live
+
+        with self.pool.connection() as conn:
+            if not bus_live:
+                new_rows = conn.execute(EVENTS_SQL, (self.last_id, RING_SIZE)).fetchall()
+                if new_rows:
+                    self._append(new_rows)
+            self._last_refresh = time.monotonic()
+            try:
+                metrics_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM metrics").fetchone()[0]
+            except sqlite3.Error:
+                metrics_id = 0
+
+            # Idle: tidak ada event / snapshot metrics baru -> tidak query apa pun
+            if (self.snapshot is not None and self.snapshot.error is None and not self._pending
+                    and metrics_id == self.last_metrics_id):
+                return bus_live
+
+            self._pending = False
+            self.last_metrics_id = metrics_id
+
+            stats = pd.read_sql_query(STATS_SQL, conn)
+            event_stats = pd.read_sql_query(EVENT_STATS_SQL, conn)
+            time_df = pd.read_sql_query(TIME_SQL, conn)
+            try:
+                metrics_df = pd.read_sql_query(METRICS_SQL, conn)
+            except Exception:
+                metrics_df = pd.DataFrame()
+
+        if stats.empty:
+            # DB belum pernah dipakai engine (rollup kosong)
+            stats = empty_stats()
+        self.refreshes += 1
+        self._publish(events=pd.DataFrame(list(reversed(self.ring)), columns=EVENT_COLUMNS), stats=stats,
+                      event_stats=event_stats, time_df=time_df, metrics_df=metrics_df, last_id=self.last_id,
+                      bus_live=bus_live, error=None)
+        return bus_live
+
+    def _append(self, new_rows):
+        """new_rows terbaru dulu -> ring (urut id naik)."""
+        self.ring.extend(reversed(new_rows[:RING_SIZE]))
+        self.last_id = new_rows[0][0]
+        self._pending = True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                bus_live = self.tick()
+            except Exception as e:
+                self.errors += 1
+                bus_live = False
+                if self.snapshot is None or self.snapshot.error != str(e):
+                    self._publish(events=pd.DataFrame(columns=EVENT_COLUMNS), stats=empty_stats(),
+                                  event_stats=pd.DataFrame({'event': [], 'count': []}), time_df=pd.DataFrame(),
+                                  metrics_df=pd.DataFrame(), last_id=self.last_id, bus_live=False, error=str(e))
+            if not bus_live:
+                # Polling SQLite; dengan bus, poll() yang menunggu event
+                self._stop.wait(self.interval)
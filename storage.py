@@ -0,0 +1,761 @@
+import contextlib
+import os
+import socket
+import sqlite3
+import threading
+import queue
+import time
+from datetime import datetime
+
+# ==============================================================================
+# SKEMA (VERSIONED, PRAGMA user_version)
+# ==============================================================================
+# events menyimpan ts epoch ms + id kamus untuk event / source; view `logs`
+# menyediakan kolom lama (timestamp HH:MM:SS, event, source, ...) untuk pembaca lama.
+SCHEMA_V1 = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_ms INTEGER NOT NULL,
+        ended_ms INTEGER,
+        mode TEXT,
+        host TEXT
+    );
+    CREATE TABLE IF NOT EXISTS event_types (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    );
+    CREATE TABLE IF NOT EXISTS sources (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    );
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session INTEGER NOT NULL REFERENCES sessions(id),
+        ts INTEGER NOT NULL,
+        event_id INTEGER NOT NULL REFERENCES event_types(id),
+        source_id INTEGER NOT NULL REFERENCES sources(id),
+        risk INTEGER,
+        msg TEXT,
+        dread_score INTEGER DEFAULT 0,
+        device TEXT,
+        count INTEGER DEFAULT 1,
+        first_ts INTEGER,
+        last_ts INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts);
+    CREATE INDEX IF NOT EXISTS idx_events_risk_ts ON events(risk, ts);
+    CREATE INDEX IF NOT EXISTS idx_events_session_id ON events(session, id);
+    CREATE VIEW IF NOT EXISTS logs AS
+        SELECT e.id, e.session, e.ts,
+               strftime('%H:%M:%S', e.ts / 1000, 'unixepoch', 'localtime') AS timestamp,
+               t.name AS event, s.name AS source, e.risk, e.msg, e.dread_score, e.device, e.count,
+               strftime('%H:%M:%S', e.first_ts / 1000, 'unixepoch', 'localtime') AS first_seen,
+               strftime('%H:%M:%S', e.last_ts / 1000, 'unixepoch', 'localtime') AS last_seen,
+               e.first_ts, e.last_ts
+        FROM events e
+        JOIN event_types t ON t.id = e.event_id
+        JOIN sources s ON s.id = e.source_id;
+"""
+
+
+def _legacy_ms(day_ms, hhmmss):
+    """'HH:MM:SS' tabel lama (tanpa tanggal) -> epoch ms pada hari `day_ms`."""
+    try:
+        h, m, sec = (int(x) for x in hhmmss.split(":"))
+    except (AttributeError, ValueError):
+        return day_ms
+    return day_ms + ((h * 60 + m) * 60 + sec) * 1000
+
+
+def _migrate_v1(conn):
+    """Skema events + sessions. Tabel `logs` lama (sebelum versioning) diimpor jadi satu sesi 'legacy'."""
+    legacy = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'logs'").fetchone()
+    if legacy:
+        conn.execute("ALTER TABLE logs RENAME TO logs_legacy")
+    _execute_script(conn, SCHEMA_V1)
+    if not legacy:
+        return
+
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(logs_legacy)")}
+    pick = lambda name, default: name if name in columns else default
+    rows = conn.execute(f"""
+        SELECT timestamp, event, source, risk, msg, {pick('dread_score', '0')}, {pick('device', 'NULL')},
+               {pick('count', '1')}, {pick('first_seen', 'timestamp')}, {pick('last_seen', 'timestamp')}
+        FROM logs_legacy ORDER BY id
+    """).fetchall()
+    if rows:
+        # Tabel lama hanya berisi run terakhir; tanggalnya diambil dari jam pertama di hari migrasi
+        midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        day_ms = int(midnight.timestamp() * 1000)
+        session = conn.execute("INSERT INTO sessions (started_ms, ended_ms, mode, host) VALUES (?, ?, 'legacy', ?)",
+                               (_legacy_ms(day_ms, rows[0][0]), _legacy_ms(day_ms, rows[-1][0]),
+                                socket.gethostname())).lastrowid
+        ids = DictionaryCache(conn)
+        conn.executemany(INSERT_SQL, (
+            (session, _legacy_ms(day_ms, ts), ids.event(event or ""), ids.source(source or ""), risk, msg,
+             dread, device, count, _legacy_ms(day_ms, first), _legacy_ms(day_ms, last))
+            for ts, event, source, risk, msg, dread, device, count, first, last in rows))
+    conn.execute("DROP TABLE logs_legacy")
+
+
+def _execute_script(conn, script):
+    # Bukan executescript: itu commit duluan dan memecah transaksi migrasi
+    for statement in script.split(";"):
+        if statement.strip():
+            conn.execute(statement)
+
+# ==============================================================================
+# ROLLUP (STATISTIK DASHBOARD)
+# ==============================================================================
+# Di-update di transaksi yang sama dengan INSERT events, jadi selalu konsisten.
+# Semua angka berbobot `count` (satu baris coalesced = count event).
+SCHEMA_V2 = """
+    CREATE TABLE IF NOT EXISTS rollup_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total INTEGER NOT NULL DEFAULT 0,
+        high INTEGER NOT NULL DEFAULT 0,
+        medium INTEGER NOT NULL DEFAULT 0,
+        low INTEGER NOT NULL DEFAULT 0,
+        risk_sum INTEGER NOT NULL DEFAULT 0,
+        dread_sum INTEGER NOT NULL DEFAULT 0,
+        rows INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS rollup_events (
+        event_id INTEGER PRIMARY KEY REFERENCES event_types(id),
+        count INTEGER NOT NULL DEFAULT 0,
+        risk_sum INTEGER NOT NULL DEFAULT 0,
+        dread_sum INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS rollup_minute (
+        minute INTEGER NOT NULL,
+        event_id INTEGER NOT NULL REFERENCES event_types(id),
+        count INTEGER NOT NULL DEFAULT 0,
+        risk_sum INTEGER NOT NULL DEFAULT 0,
+        risk_max INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (minute, event_id)
+    ) WITHOUT ROWID
+"""
+
+ROLLUP_TOTALS_SQL = """
+    INSERT INTO rollup_totals (id, total, high, medium, low, risk_sum, dread_sum, rows)
+    VALUES (1, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        total = total + excluded.total, high = high + excluded.high, medium = medium + excluded.medium,
+        low = low + excluded.low, risk_sum = risk_sum + excluded.risk_sum,
+        dread_sum = dread_sum + excluded.dread_sum, rows = rows + excluded.rows
+"""
+ROLLUP_EVENTS_SQL = """
+    INSERT INTO rollup_events (event_id, count, risk_sum, dread_sum) VALUES (?, ?, ?, ?)
+    ON CONFLICT (event_id) DO UPDATE SET
+        count = count + excluded.count, risk_sum = risk_sum + excluded.risk_sum,
+        dread_sum = dread_sum + excluded.dread_sum
+"""
+ROLLUP_MINUTE_SQL = """
+    INSERT INTO rollup_minute (minute, event_id, count, risk_sum, risk_max) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (minute, event_id) DO UPDATE SET
+        count = count + excluded.count, risk_sum = risk_sum + excluded.risk_sum,
+        risk_max = MAX(risk_max, excluded.risk_max)
+"""
+
+
+def apply_rollups(conn, rows):
+    """
+    Tambahkan satu batch baris events (bentuk INSERT_SQL) ke tabel rollup.
+    Agregasi dulu di Python, jadi upsert per batch = 1 + jumlah event type + jumlah menit.
+    """
+    total = high = medium = low = risk_sum = dread_sum = 0
+    per_event = {}
+    per_minute = {}
+    for session, ts, event_id, source_id, risk, msg, dread, device, count, first, last in rows:
+        risk = risk or 0
+        dread = dread or 0
+        count = count or 1
+        total += count
+        if risk >= 8:
+            high += count
+        elif risk >= 5:
+            medium += count
+        else:
+            low += count
+        risk_sum += risk * count
+        dread_sum += dread * count
+
+        e = per_event.get(event_id)
+        if e is None:
+            e = per_event[event_id] = [0, 0, 0]
+        e[0] += count
+        e[1] += risk * count
+        e[2] += dread * count
+
+        key = (ts // 60000, event_id)
+        m = per_minute.get(key)
+        if m is None:
+            m = per_minute[key] = [0, 0, 0]
+        m[0] += count
+        m[1] += risk * count
+        if risk > m[2]:
+            m[2] = risk
+
+    if not total:
+        return
+    conn.execute(ROLLUP_TOTALS_SQL, (total, high, medium, low, risk_sum, dread_sum, len(rows)))
+    conn.executemany(ROLLUP_EVENTS_SQL, [(k, *v) for k, v in per_event.items()])
+    conn.executemany(ROLLUP_MINUTE_SQL, [(k[0], k[1], *v) for k, v in per_minute.items()])
+
+
+def rebuild_rollups(conn, archive_dir=None):
+    """
+    Hitung ulang semua rollup dari tabel events (satu pass GROUP BY per tabel),
+    lalu tambahkan event yang sudah dipindah retention ke segment archive.
+    Kalau ada segment terindex tapi archive_dir tidak diberikan / file hilang,
+    rebuild ditolak (RuntimeError): hasilnya akan kehilangan hitungan event arsip.
+    Return jumlah baris archive yang ikut dihitung.
+    """
+    segments = _archive_paths(conn, archive_dir)
+    conn.execute("DELETE FROM rollup_totals")
+    conn.execute("DELETE FROM rollup_events")
+    conn.execute("DELETE FROM rollup_minute")
+    conn.execute("""
+        INSERT INTO rollup_totals (id, total, high, medium, low, risk_sum, dread_sum, rows)
+        SELECT 1, COALESCE(SUM(count), 0),
+               COALESCE(SUM(CASE WHEN risk >= 8 THEN count ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN risk >= 5 AND risk < 8 THEN count ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN COALESCE(risk, 0) < 5 THEN count ELSE 0 END), 0),
+               COALESCE(SUM(COALESCE(risk, 0) * count), 0), COALESCE(SUM(COALESCE(dread_score, 0) * count), 0),
+               COUNT(*)
+        FROM events
+    """)
+    conn.execute("""
+        INSERT INTO rollup_events (event_id, count, risk_sum, dread_sum)
+        SELECT event_id, SUM(count), SUM(COALESCE(risk, 0) * count), SUM(COALESCE(dread_score, 0) * count)
+        FROM events GROUP BY event_id
+    """)
+    conn.execute("""
+        INSERT INTO rollup_minute (minute, event_id, count, risk_sum, risk_max)
+        SELECT ts / 60000, event_id, SUM(count), SUM(COALESCE(risk, 0) * count), MAX(COALESCE(risk, 0))
+        FROM events GROUP BY ts / 60000, event_id
+    """)
+    return _apply_archived_rollups(conn, segments)
+
+
+def _archive_paths(conn, archive_dir):
+    """Path segment archive yang harus ikut di-rebuild; cek dulu sebelum rollup dihapus."""
+    try:
+        names = [row[0] for row in conn.execute("SELECT DISTINCT path FROM archive_segments")]
+    except sqlite3.OperationalError:
+        return []  # DB sebelum schema v3 (dipanggil dari _migrate_v2)
+    if not names:
+        return []
+    if archive_dir is None:
+        raise RuntimeError(f"{len(names)} segment archive terindex; rebuild tanpa archive_dir "
+                           f"akan membuang hitungan event yang sudah diarsip")
+    paths = [os.path.join(archive_dir, name) for name in names]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise RuntimeError(f"segment archive hilang ({len(missing)}), mis. {missing[0]}; "
+                           f"rollup tidak bisa dihitung ulang tanpa event arsip")
+    return paths
+
+
+def _apply_archived_rollups(conn, paths, batch_size=20000):
+    """Event dari segment archive ke apply_rollups (bentuk INSERT_SQL, nama event -> id)."""
+    if not paths:
+        return 0
+    import retention
+    names = DictionaryCache(conn)
+    archived = 0
+    rows = []
+    for e in retention.read_archive(paths):
+        rows.append((e["session"], e["ts"], names.event(e["event"]), None, e["risk"], None,
+                     e["dread_score"], e["device"], e["count"], e["first_ts"], e["last_ts"]))
+        if len(rows) >= batch_size:
+            apply_rollups(conn, rows)
+            archived += len(rows)
+            rows = []
+    apply_rollups(conn, rows)
+    return archived + len(rows)
+
+
+def _migrate_v2(conn):
+    """Tabel rollup, diisi dari events yang sudah ada."""
+    _execute_script(conn, SCHEMA_V2)
+    rebuild_rollups(conn)
+
+
+# ==============================================================================
+# ARCHIVE INDEX (RETENTION)
+# ==============================================================================
+# Satu baris per chunk yang di-append retention.py ke segment gzip JSONL per jam.
+SCHEMA_V3 = """
+    CREATE TABLE IF NOT EXISTS archive_segments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        path TEXT NOT NULL,
+        hour_ms INTEGER NOT NULL,
+        min_id INTEGER NOT NULL,
+        max_id INTEGER NOT NULL,
+        min_ts INTEGER NOT NULL,
+        max_ts INTEGER NOT NULL,
+        rows INTEGER NOT NULL,
+        bytes INTEGER NOT NULL,
+        created_ms INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_archive_segments_ts ON archive_segments(min_ts, max_ts)
+"""
+
+
+def _migrate_v3(conn):
+    """Index segment archive (rollup tetap menghitung event yang sudah diarsip)."""
+    _execute_script(conn, SCHEMA_V3)
+
+
+# ==============================================================================
+# HISTORY (DRILL-DOWN DASHBOARD)
+# ==============================================================================
+# Filter event type + urutan waktu: (event_id, ts) supaya halaman history per tipe
+# tidak perlu scan semua event di rentang waktu.
+SCHEMA_V4 = """
+    CREATE INDEX IF NOT EXISTS idx_events_event_ts ON events(event_id, ts)
+"""
+
+
+def _migrate_v4(conn):
+    _execute_script(conn, SCHEMA_V4)
+
+
+# ==============================================================================
+# METRICS ENGINE (SNAPSHOT PER INTERVAL)
+# ==============================================================================
+# Ditulis MetricsSnapshotter (metrics.py), dibaca dashboard. ts = epoch ms seperti
+# events; baris lama dibuang retention (metrics_hours).
+SCHEMA_V5 = """
+    CREATE TABLE IF NOT EXISTS metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        labels TEXT,
+        count INTEGER,
+        value REAL,
+        p50 REAL,
+        p95 REAL,
+        p99 REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_metrics_ts ON metrics(ts)
+"""
+
+
+def _migrate_v5(conn):
+    """Tabel metrics masuk schema; tabel ad hoc lama (timestamp TEXT jam lokal) dikonversi ke ts."""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(metrics)")]
+    if "timestamp" in columns:
+        conn.execute("ALTER TABLE metrics RENAME TO metrics_legacy")
+        _execute_script(conn, SCHEMA_V5)
+        conn.execute("""
+            INSERT INTO metrics (id, ts, name, labels, count, value, p50, p95, p99)
+            SELECT id, CAST(strftime('%s', timestamp, 'utc') AS INTEGER) * 1000, name, labels, count, value,
+                   p50, p95, p99
+            FROM metrics_legacy WHERE timestamp IS NOT NULL AND name IS NOT NULL
+        """)
+        conn.execute("DROP TABLE metrics_legacy")
+    else:
+        _execute_script(conn, SCHEMA_V5)
+
+
+# Index ke-i = migrasi ke user_version i+1. Hanya boleh ditambah, jangan diubah.
+MIGRATIONS = [_migrate_v1, _migrate_v2, _migrate_v3, _migrate_v4, _migrate_v5]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def connect(db_file, timeout=5.0):
+    conn = sqlite3.connect(db_file, timeout=timeout, check_same_thread=False)
+    # Hanya berlaku untuk DB baru (sebelum tabel / WAL pertama); DB lama: retention.ensure_incremental_vacuum
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def connect_readonly(db_file, busy_timeout_ms=5000):
+    """
+    Koneksi pembaca (dashboard): mode=ro + query_only, tidak pernah ambil write lock.
+    Dengan WAL pembaca tidak menunggu writer; busy_timeout hanya untuk checkpoint / recovery.
+    """
+    conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True, check_same_thread=False)
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    conn.execute("PRAGMA query_only = 1")
+    return conn
+
+
+class ReadOnlyPool:
+    """Pool kecil koneksi read-only, dipakai bersama thread di satu proses (Streamlit)."""
+
+    def __init__(self, db_file, size=4, busy_timeout_ms=5000):
+        self.db_file = db_file
+        self.busy_timeout_ms = busy_timeout_ms
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def acquire(self, timeout=None):
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("semua koneksi read-only sedang dipakai")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return connect_readonly(self.db_file, self.busy_timeout_ms)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, broken=False):
+        if broken:
+            # Koneksi error (mis. file DB diganti): buang, slot berikutnya buka baru
+            try:
+                conn.close()
+            except Exception:
+                pass
+        else:
+            self._idle.put(conn)
+        self._slots.release()
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        """with pool.connection() as conn: ... (koneksi dibuang kalau ada error sqlite)."""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except sqlite3.Error:
+            self.release(conn, broken=True)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def migrate(conn):
+    """Bawa database ke SCHEMA_VERSION. Return (versi lama, versi baru)."""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    if current > SCHEMA_VERSION:
+        raise RuntimeError(f"database schema v{current} lebih baru dari engine (v{SCHEMA_VERSION})")
+    for version in range(current + 1, SCHEMA_VERSION + 1):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            MIGRATIONS[version - 1](conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return current, SCHEMA_VERSION
+
+
+def start_session(conn, mode):
+    session = conn.execute("INSERT INTO sessions (started_ms, mode, host) VALUES (?, ?, ?)",
+                           (int(time.time() * 1000), mode, socket.gethostname())).lastrowid
+    conn.commit()
+    return session
+
+
+def end_session(db_file, session):
+    try:
+        conn = sqlite3.connect(db_file, timeout=5.0)
+        conn.execute("UPDATE sessions SET ended_ms = ? WHERE id = ?", (int(time.time() * 1000), session))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"[DB ERROR] {e}")
+
+
+def init_db(db_file, mode="live"):
+    """Jalankan migrasi (tidak ada DROP, history antar restart tetap ada) lalu buka sesi baru."""
+    conn = connect(db_file)
+    try:
+        old, new = migrate(conn)
+        if old != new:
+            print(f"[DB] Schema migrated v{old} -> v{new}")
+        return start_session(conn, mode)
+    finally:
+        conn.close()
+
+
+class DictionaryCache:
+    """name -> id untuk event_types / sources. Hanya dipakai dari satu thread (writer)."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.tables = {"event_types": {}, "sources": {}}
+
+    def _lookup(self, table, name):
+        cache = self.tables[table]
+        value = cache.get(name)
+        if value is None:
+            self.conn.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,))
+            value = cache[name] = self.conn.execute(f"SELECT id FROM {table} WHERE name = ?", (name,)).fetchone()[0]
+        return value
+
+    def event(self, name):
+        return self._lookup("event_types", name)
+
+    def source(self, name):
+        return self._lookup("sources", name)
+
+# ==============================================================================
+# BATCHED SQLITE WRITER
+# ==============================================================================
+INSERT_SQL = ("INSERT INTO events (session, ts, event_id, source_id, risk, msg, dread_score, device, "
+              "count, first_ts, last_ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+# Writer memberi id sendiri supaya id bisa langsung di-publish ke event bus setelah commit
+INSERT_WITH_ID_SQL = ("INSERT INTO events (id, session, ts, event_id, source_id, risk, msg, dread_score, device, "
+                      "count, first_ts, last_ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+
+class EventWriter:
+    """
+    Writer SQLite di background thread.
+    Satu koneksi persistent (WAL), diisi lewat queue, commit per batch
+    (batch_size baris atau flush_interval detik, mana yang duluan).
+
+    Row: (ts_ms, event, source, risk, msg, dread_score, device, count, first_ms, last_ms).
+    event / source di-encode ke id kamus di thread writer. Kalau `session` belum
+    di-set (hasil init_db), writer membuka sesi sendiri.
+
+    Writer satu-satunya yang insert ke events, jadi id dibagi sendiri (lanjut dari
+    sqlite_sequence). Setelah commit sukses, on_publish(session, [(id, row), ...])
+    dipanggil di thread writer (event bus).
+    """
+
+    _STOP = object()
+
+    def __init__(self, db_file, batch_size=500, flush_interval=0.05, max_queue=100000, on_commit=None,
+                 session=None, on_publish=None):
+        self.db_file = db_file
+        self.session = session
+        self.on_commit = on_commit  # on_commit(seconds) setelah tiap commit, untuk metrics
+        self.on_publish = on_publish
+        self.next_id = None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+
+        # Counters
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.commits = 0
+        self.commit_time_total = 0.0
+        self.commit_time_max = 0.0
+        self.last_commit_ms = 0.0
+        self.errors = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="EventWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, row):
+        """Masukkan satu baris ke queue. Tidak pernah blocking; baris di-drop kalau queue penuh."""
+        try:
+            self.queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.rows_dropped += 1
+            return False
+
+    def close(self, timeout=5.0):
+        """Flush semua baris yang tersisa lalu tutup koneksi."""
+        if self._thread is None:
+            return
+        self.queue.put(self._STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize(),
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "commits": self.commits,
+            "errors": self.errors,
+            "last_commit_ms": self.last_commit_ms,
+            "max_commit_ms": self.commit_time_max * 1000,
+            "avg_commit_ms": (self.commit_time_total / self.commits * 1000) if self.commits else 0.0,
+        }
+
+    # --------------------------------------------------------------------------
+    def _connect(self):
+        conn = connect(self.db_file)
+        migrate(conn)
+        if self.session is None:
+            self.session = start_session(conn, "writer")
+        self._ids = DictionaryCache(conn)
+        self._load_next_id(conn)
+        return conn
+
+    def _load_next_id(self, conn):
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'events'").fetchone()
+        self.next_id = (row[0] if row else 0) + 1
+
+    def _encode(self, batch):
+        session, ids = self.session, self._ids
+        return [(session, ts, ids.event(event), ids.source(source), risk, msg, dread, device, count, first, last)
+                for ts, event, source, risk, msg, dread, device, count, first, last in batch]
+
+    def _commit(self, conn, batch):
+        t0 = time.perf_counter()
+        try:
+            rows = self._encode(batch)
+            first_id = self.next_id
+            conn.executemany(INSERT_WITH_ID_SQL, ((first_id + i,) + row for i, row in enumerate(rows)))
+            apply_rollups(conn, rows)
+            conn.commit()
+            self.next_id = first_id + len(rows)
+            self.rows_written += len(batch)
+            published = True
+        except Exception as e:
+            published = False
+            self.errors += 1
+            print(f"[DB ERROR] {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            # id kamus yang baru di-insert ikut ter-rollback
+            self._ids = DictionaryCache(conn)
+            self._load_next_id(conn)
+        elapsed = time.perf_counter() - t0
+        self.commits += 1
+        self.commit_time_total += elapsed
+        self.commit_time_max = max(self.commit_time_max, elapsed)
+        self.last_commit_ms = elapsed * 1000
+        if self.on_commit is not None:
+            self.on_commit(elapsed)
+        if published and self.on_publish is not None:
+            try:
+                self.on_publish(self.session, [(first_id + i, row) for i, row in enumerate(batch)])
+            except Exception as e:
+                print(f"[BUS ERROR] {e}")
+
+    def _run(self):
+        conn = self._connect()
+        stopping = False
+        try:
+            while not stopping:
+                item = self.queue.get()
+                if item is self._STOP:
+                    break
+                batch = [item]
+                deadline = time.monotonic() + self.flush_interval
+
+                # Kumpulkan sampai batch penuh atau waktu habis
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is self._STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+
+                self._commit(conn, batch)
+
+            # Shutdown: flush sisa queue
+            leftover = []
+            while True:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not self._STOP:
+                    leftover.append(item)
+            for i in range(0, len(leftover), self.batch_size):
+                self._commit(conn, leftover[i:i + self.batch_size])
+        finally:
+            conn.close()
+
+# ==============================================================================
+# HISTORY PAGE (KEYSET PAGINATION)
+# ==============================================================================
+HISTORY_COLUMNS = ["id", "ts", "timestamp", "device", "event", "source", "risk", "msg", "dread_score", "count"]
+
+
+HISTORY_SQL = """
+    SELECT e.id, e.ts, strftime('%Y-%m-%d %H:%M:%S', e.ts / 1000, 'unixepoch', 'localtime'),
+           e.device, t.name, s.name, e.risk, e.msg, e.dread_score, e.count
+    FROM events e
+    JOIN event_types t ON t.id = e.event_id
+    JOIN sources s ON s.id = e.source_id
+    WHERE {where}
+    ORDER BY e.ts DESC, e.id DESC
+    LIMIT ?
+"""
+
+
+def history_page(conn, start_ms, end_ms, min_risk=0, event=None, before=None, limit=200):
+    """
+    Satu halaman event di [start_ms, end_ms], terbaru dulu (ts DESC, id DESC).
+    before = (ts, id) baris terakhir halaman sebelumnya (keyset, bukan OFFSET), jadi
+    halaman ke-1000 sama murahnya dengan halaman pertama.
+    Index: tanpa filter -> idx_events_ts, filter event -> idx_events_event_ts (v4),
+    filter risk -> range `e.risk >= ?` (idx_events_risk_ts atau idx_events_ts, pilihan
+    planner). Risk tidak dibatasi 0..10 (bridge bisa kirim nilai lain), jadi tidak ada
+    enumerasi per nilai risk.
+    """
+    where = ["e.ts >= ?", "e.ts <= ?"]
+    params = [start_ms, end_ms]
+    if before is not None:
+        where.append("(e.ts < ? OR (e.ts = ? AND e.id < ?))")
+        params.extend((before[0], before[0], before[1]))
+
+    if event is not None:
+        row = conn.execute("SELECT id FROM event_types WHERE name = ?", (event,)).fetchone()
+        if row is None:
+            return []
+        where.append("e.event_id = ?")
+        params.append(row[0])
+    if min_risk:
+        where.append("e.risk >= ?")
+        params.append(min_risk)
+    return conn.execute(HISTORY_SQL.format(where=" AND ".join(where)), params + [limit]).fetchall()
+
+# ==============================================================================
+# CLI
+# ==============================================================================
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="LocShield storage tools")
+    parser.add_argument("command", choices=["migrate", "rebuild-rollups"])
+    parser.add_argument("--db", default="locshield.db", help="file SQLite (default: locshield.db)")
+    parser.add_argument("--archive-dir", default="archive",
+                        help="folder segment archive untuk rebuild-rollups (default: archive)")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    old, new = migrate(conn)
+    print(f"[DB] {args.db}: schema v{old} -> v{new}")
+    if args.command == "rebuild-rollups":
+        t0 = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            archived = rebuild_rollups(conn, args.archive_dir)
+        except RuntimeError as e:
+            conn.rollback()
+            conn.close()
+            raise SystemExit(f"[DB] Rebuild dibatalkan: {e}")
+        conn.commit()
+        rows, total = conn.execute("SELECT rows, total FROM rollup_totals").fetchone()
+        print(f"[DB] Rollups rebuilt from {rows} rows ({archived} archived, {total} events) "
+              f"in {time.perf_counter() - t0:.2f} s")
+    conn.close()
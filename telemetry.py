@@ -0,0 +1,254 @@
+import json
+import queue
+import socket
+import struct
+import threading
+import time
+from datetime import datetime
+
+# ==============================================================================
+# FORMAT DATAGRAM
+# ==============================================================================
+# JSON  : {"v": 1, "seq": N, "count": K, "sent_at": "...", "events": [ {...}, ... ]}
+# Binary: header !4sBBHIQ (magic, version, flags, count, seq, sent_at_ms) lalu K record
+#         !QBBI (ts_ms, risk, dread, repeat) + string !H-length: status, app, device, details
+PROTOCOL_VERSION = 1
+MAGIC_BINARY = b"LSTB"
+HEADER = struct.Struct("!4sBBHIQ")
+RECORD = struct.Struct("!QBBI")
+STRLEN = struct.Struct("!H")
+
+# Aman di bawah MTU ethernet (1500) setelah header IP/UDP
+MAX_DATAGRAM = 1400
+ENCODINGS = ("json", "binary")
+
+
+def event_dict(event):
+    ts_ms, status, app, risk, details, dread, device, count = event
+    return {
+        "timestamp": datetime.fromtimestamp(ts_ms / 1000).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+        "status": status,
+        "app": app,
+        "risk": risk,
+        "details": details,
+        "dread": dread,
+        "device": device,
+        "count": count,
+    }
+
+
+def _pack_str(value, limit):
+    data = (value or "").encode("utf-8")[:limit]
+    return STRLEN.pack(len(data)) + data
+
+
+def encode_binary_event(event, limit=512):
+    ts_ms, status, app, risk, details, dread, device, count = event
+    return (RECORD.pack(ts_ms, max(0, min(risk, 255)), max(0, min(dread, 255)), count)
+            + _pack_str(status, 64) + _pack_str(app, 128) + _pack_str(device, 64)
+            + _pack_str(details, limit))
+
+
+def encode_json_event(event):
+    return json.dumps(event_dict(event), separators=(",", ":"))
+
+
+def decode_datagram(data):
+    """
+    Return (header, events). header berisi seq / count / sent_at (None untuk format lama);
+    events list of dict dengan key sama seperti payload JSON lama (timestamp, status, app,
+    risk, details) plus dread / device / count.
+    """
+    if data[:4] == MAGIC_BINARY:
+        magic, version, flags, count, seq, sent_at = HEADER.unpack_from(data, 0)
+        offset = HEADER.size
+        events = []
+        for _ in range(count):
+            ts_ms, risk, dread, repeat = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            fields = []
+            for _ in range(4):
+                (length,) = STRLEN.unpack_from(data, offset)
+                offset += STRLEN.size
+                fields.append(data[offset:offset + length].decode("utf-8", "replace"))
+                offset += length
+            status, app, device, details = fields
+            events.append(event_dict((ts_ms, status, app, risk, details, dread, device or None, repeat)))
+        return {"seq": seq, "count": count, "sent_at": sent_at, "encoding": "binary"}, events
+
+    payload = json.loads(data.decode("utf-8"))
+    if "events" in payload:
+        header = {"seq": payload.get("seq"), "count": payload.get("count", len(payload["events"])),
+                  "sent_at": payload.get("sent_at"), "encoding": "json"}
+        return header, payload["events"]
+    # Format lama: satu event per datagram, tanpa sequence number
+    return {"seq": None, "count": 1, "sent_at": None, "encoding": "legacy"}, [payload]
+
+
+# ==============================================================================
+# EMITTER
+# ==============================================================================
+class TelemetryEmitter:
+    """
+    Kirim event ke Wireshark / listener lewat UDP dari thread sendiri.
+    Event dikumpulkan jadi datagram sampai MAX_DATAGRAM byte, tiap datagram punya
+    sequence number supaya penerima bisa menghitung paket yang hilang.
+    Thread logcat hanya memanggil send() (queue put, tanpa socket / print).
+    """
+
+    _STOP = object()
+
+    def __init__(self, addr, encoding="json", max_datagram=MAX_DATAGRAM, linger=0.01,
+                 max_queue=50000, report_interval=10.0, quiet=False, on_send=None):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"encoding harus salah satu dari {ENCODINGS}")
+        self.addr = addr
+        self.encoding = encoding
+        self.max_datagram = max_datagram
+        self.linger = linger
+        self.report_interval = report_interval
+        self.quiet = quiet
+        self.on_send = on_send  # on_send(seconds) per datagram, untuk metrics
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.seq = 0
+        self._thread = None
+
+        # Counters
+        self.events_in = 0
+        self.events_sent = 0
+        self.events_dropped = 0
+        self.datagrams_sent = 0
+        self.bytes_sent = 0
+        self.send_errors = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="TelemetryEmitter", daemon=True)
+        self._thread.start()
+
+    def close(self, timeout=2.0):
+        if self._thread is not None:
+            self.queue.put(self._STOP)
+            self._thread.join(timeout)
+            self._thread = None
+        self.sock.close()
+
+    def send(self, status, app, details, risk=0, dread=0, device=None, count=1):
+        """Masukkan satu event ke queue. Tidak pernah blocking; event di-drop kalau queue penuh."""
+        self.events_in += 1
+        try:
+            self.queue.put_nowait((int(time.time() * 1000), status, app, risk, details, dread, device, count))
+        except queue.Full:
+            self.events_dropped += 1
+
+    def stats(self):
+        return {
+            "events_in": self.events_in,
+            "events_sent": self.events_sent,
+            "events_dropped": self.events_dropped,
+            "datagrams_sent": self.datagrams_sent,
+            "bytes_sent": self.bytes_sent,
+            "send_errors": self.send_errors,
+            "events_per_datagram": (self.events_sent / self.datagrams_sent) if self.datagrams_sent else 0.0,
+            "queue_depth": self.queue.qsize(),
+        }
+
+    # --------------------------------------------------------------------------
+    def _encode(self, event):
+        if self.encoding == "binary":
+            return encode_binary_event(event)
+        data = encode_json_event(event).encode("utf-8")
+        if len(data) > self.max_datagram - 128:
+            # Event tunggal yang terlalu besar: potong details
+            ts_ms, status, app, risk, details, dread, device, count = event
+            event = (ts_ms, status, app, risk, details[:self.max_datagram // 2] + "...", dread, device, count)
+            data = encode_json_event(event).encode("utf-8")
+        return data
+
+    def _build(self, encoded):
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        now_ms = int(time.time() * 1000)
+        if self.encoding == "binary":
+            return HEADER.pack(MAGIC_BINARY, PROTOCOL_VERSION, 0, len(encoded), self.seq, now_ms) + b"".join(encoded)
+        head = '{"v":%d,"seq":%d,"count":%d,"sent_at":%d,"events":[' % (
+            PROTOCOL_VERSION, self.seq, len(encoded), now_ms)
+        return head.encode("ascii") + b",".join(encoded) + b"]}"
+
+    def _flush(self, encoded):
+        if not encoded:
+            return
+        datagram = self._build(encoded)
+        t0 = time.perf_counter()
+        try:
+            self.sock.sendto(datagram, self.addr)
+            if self.on_send is not None:
+                self.on_send(time.perf_counter() - t0)
+            self.datagrams_sent += 1
+            self.bytes_sent += len(datagram)
+            self.events_sent += len(encoded)
+        except OSError:
+            self.send_errors += 1
+
+    def _report(self, last):
+        sent, datagrams = self.events_sent - last[0], self.datagrams_sent - last[1]
+        if sent and not self.quiet:
+            print(f"\033[96m[NETWORK] UDP -> {self.addr[0]}:{self.addr[1]} | {sent} events in "
+                  f"{datagrams} datagrams (seq {self.seq}, dropped {self.events_dropped})\033[0m")
+        return self.events_sent, self.datagrams_sent
+
+    def _run(self):
+        # Overhead header JSON / binary dihitung kasar supaya aman di bawah MTU
+        budget = self.max_datagram - 96
+        last = (0, 0)
+        next_report = time.monotonic() + self.report_interval
+        stopping = False
+        while not stopping:
+            try:
+                item = self.queue.get(timeout=self.report_interval)
+            except queue.Empty:
+                item = None
+            if item is self._STOP:
+                break
+
+            encoded, size = [], 0
+            deadline = time.monotonic() + self.linger
+            while item is not None:
+                data = self._encode(item)
+                if encoded and size + len(data) + 1 > budget:
+                    self._flush(encoded)
+                    encoded, size = [], 0
+                encoded.append(data)
+                size += len(data) + 1
+                try:
+                    remaining = deadline - time.monotonic()
+                    item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    item = None
+                if item is self._STOP:
+                    stopping = True
+                    item = None
+            self._flush(encoded)
+
+            if time.monotonic() >= next_report:
+                last = self._report(last)
+                next_report = time.monotonic() + self.report_interval
+
+        # Shutdown: kirim sisa queue
+        encoded, size = [], 0
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is self._STOP:
+                continue
+            data = self._encode(item)
+            if encoded and size + len(data) + 1 > budget:
+                self._flush(encoded)
+                encoded, size = [], 0
+            encoded.append(data)
+            size += len(data) + 1
+        self._flush(encoded)
+        self._report(last)
@@ -0,0 +1,200 @@
+import subprocess
+import threading
+import time
+import re
+
+# ==============================================================================
+# PROCESS TRACKER (PENGGANTI `adb shell ps -A` PER CEK)
+# ==============================================================================
+PS_END_MARKER = "__LOCSHIELD_PS_END__"
+
+# Marker lifecycle proses dari ActivityManager
+RE_PROC_START = re.compile(r"Start proc (\d+):([\w.]+)")
+RE_PROC_DIED = re.compile(r"Process ([\w.]+)(?::\w+)? \(pid (\d+)\) has died")
+RE_PROC_KILL = re.compile(r"Killing (\d+):([\w.]+)")
+
+
+class ProcessTracker:
+    """
+    Menyimpan tabel pid -> package untuk aplikasi di watchlist.
+
+    Satu sesi `adb shell` dibuka terus; tiap poll_interval detik kita kirim
+    `ps -A` lewat stdin yang sama (tanpa spawn proses baru). Tabel juga
+    di-update dari marker "Start proc" / "has died" di logcat lewat observe().
+    is_running() hanya membaca tabel di memori.
+
+    Kalau adb_path None, tracker jalan di mode logcat-only (dipakai replay).
+    """
+
+    def __init__(self, adb_path, packages, serial=None, poll_interval=1.0, ttl=5.0, poll_timeout=3.0):
+        self.adb_path = adb_path
+        self.packages = frozenset(p.lower() for p in packages)
+        self.serial = serial
+        self.poll_interval = poll_interval
+        self.ttl = ttl
+        self.poll_timeout = poll_timeout
+
+        self.table = {}                 # pid -> [package, seen_at]
+        self.last_poll_ok = 0.0         # monotonic waktu snapshot ps terakhir yang lengkap
+        self._lock = threading.Lock()
+        self._snapshot_done = threading.Event()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._shell = None
+        self._threads = []
+
+        # Counters
+        self.polls = 0
+        self.poll_timeouts = 0
+        self.shell_restarts = 0
+
+    # --------------------------------------------------------------------------
+    # LIFECYCLE
+    # --------------------------------------------------------------------------
+    def start(self):
+        if self.adb_path is None or self._threads:
+            return
+        t = threading.Thread(target=self._poll_loop, name="ProcessTracker", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def stop(self):
+        self._stop.set()
+        self._kill_shell()
+        for t in self._threads:
+            t.join(1.0)
+        self._threads = []
+
+    def wait_ready(self, timeout=3.0):
+        """Tunggu snapshot ps pertama. Return False kalau belum ada dalam timeout."""
+        if self.adb_path is None:
+            return True
+        return self._ready.wait(timeout)
+
+    # --------------------------------------------------------------------------
+    # QUERY (HOT PATH)
+    # --------------------------------------------------------------------------
+    def is_running(self):
+        """
+        True  -> ada proses watchlist yang hidup
+        False -> snapshot masih fresh dan tidak ada proses watchlist
+        None  -> data basi (shell macet/mati), jangan ambil keputusan dari sini
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self.adb_path is None:
+                return bool(self.table)
+            for package, seen_at in self.table.values():
+                if now - seen_at <= self.ttl:
+                    return True
+            if now - self.last_poll_ok <= self.ttl:
+                return False
+        return None
+
+    def running_packages(self):
+        with self._lock:
+            return sorted({package for package, _ in self.table.values()})
+
+    def observe(self, record):
+        """Update tabel dari LogRecord ActivityManager (start / died / killing)."""
+        if record.tag != "ActivityManager":
+            return
+        message = record.message
+        m = RE_PROC_START.search(message)
+        if m:
+            package = self._watched(m.group(2))
+            if package:
+                with self._lock:
+                    self.table[int(m.group(1))] = [package, time.monotonic()]
+            return
+        m = RE_PROC_DIED.search(message)
+        if m:
+            pid = int(m.group(2))
+        else:
+            m = RE_PROC_KILL.search(message)
+            if not m:
+                return
+            pid = int(m.group(1))
+        with self._lock:
+            self.table.pop(pid, None)
+
+    # --------------------------------------------------------------------------
+    # INTERNAL
+    # --------------------------------------------------------------------------
+    def _watched(self, name):
+        package = name.lower().split(":", 1)[0]
+        return package if package in self.packages else None
+
+    def _spawn_shell(self):
+        cmd = [self.adb_path]
+        if self.serial:
+            cmd += ["-s", self.serial]
+        cmd.append("shell")
+        self._shell = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                       stderr=subprocess.DEVNULL, text=True, encoding="utf-8",
+                                       errors="ignore", bufsize=1)
+        t = threading.Thread(target=self._read_loop, args=(self._shell,), name="ProcessTrackerReader",
+                             daemon=True)
+        t.start()
+
+    def _kill_shell(self):
+        shell, self._shell = self._shell, None
+        if shell is not None:
+            try:
+                shell.kill()
+            except Exception:
+                pass
+
+    def _read_loop(self, shell):
+        snapshot = {}
+        for line in iter(shell.stdout.readline, ""):
+            line = line.strip()
+            if line == PS_END_MARKER:
+                now = time.monotonic()
+                with self._lock:
+                    # ps adalah sumber kebenaran: entry lama diganti total
+                    self.table = {pid: [package, now] for pid, package in snapshot.items()}
+                    self.last_poll_ok = now
+                snapshot = {}
+                self._snapshot_done.set()
+                self._ready.set()
+                continue
+            cols = line.split()
+            # USER PID PPID VSZ RSS WCHAN ADDR S NAME
+            if len(cols) < 2 or not cols[1].isdigit():
+                continue
+            package = self._watched(cols[-1])
+            if package:
+                snapshot[int(cols[1])] = package
+
+    def _poll_loop(self):
+        while not self._stop.is_set():
+            if self._shell is None or self._shell.poll() is not None:
+                try:
+                    if self._shell is not None:
+                        self.shell_restarts += 1
+                    self._spawn_shell()
+                except Exception as e:
+                    print(f"[TRACKER ERROR] {e}")
+                    self._shell = None
+                    self._stop.wait(self.poll_interval)
+                    continue
+
+            self._snapshot_done.clear()
+            try:
+                self._shell.stdin.write(f"ps -A; echo {PS_END_MARKER}\n")
+                self._shell.stdin.flush()
+            except Exception:
+                # adb shell langsung mati (BrokenPipe): tunggu dulu, jangan respawn dalam loop rapat
+                self.shell_restarts += 1
+                self._kill_shell()
+                self._stop.wait(self.poll_interval)
+                continue
+
+            self.polls += 1
+            if not self._snapshot_done.wait(self.poll_timeout):
+                # Shell macet: buang dan buka ulang, tabel lama dibiarkan kadaluarsa lewat TTL
+                self.poll_timeouts += 1
+                self._kill_shell()
+                continue
+            self._stop.wait(self.poll_interval)